@@ -0,0 +1,304 @@
+# Command line entry point for the sharpcap sequence parsers
+#   ssp.py generate --rig towa                 interactive prompts, same as ssp_towa.py
+#   ssp.py generate plan.json -o night.scs     generate from a plan file
+#   ssp.py generate plan.json --cache plan.blocks   only re-render targets that changed
+#   ssp.py lookup m101 ngc7000
+#   ssp.py search sh2-1
+#   ssp.py plan new plan.json --rig c6h --temperature -5 --start 21:30
+#   ssp.py plan new plan.json --rig towa --start 21:30 --site backyard --date 2026-10-19
+#   ssp.py plan add plan.json m101 --filter LPRO --hours 2
+#   ssp.py budget carbonstar RED GREEN BLUE --hours 3 --autofocus
+#   ssp.py lint _save
+#   ssp.py manifest ingest night.manifest.jsonl D:/SharpCap/Captures
+#   ssp.py moon --site backyard --date 2026-10-19 m31 m42
+#   ssp.py resume night.scs D:/SharpCap/Captures --rig towa --until 5:45
+#   ssp.py projects tonight --rig towa --site backyard --date 2026-10-20 --start 21:00 --hours 8 -o tonight.json
+#   ssp.py multirig pool.json -o night          one sequence per rig from a shared target pool
+#   ssp.py import club_list.csv --rig towa -o club.json    plan from a CSV, TSV or VOTable list
+#   ssp.py build-catalog
+#   ssp.py bench --quick
+#   ssp.py serve --lat 52.0 --lon -1.5
+#
+# Only argparse is imported up front, each subcommand imports what it needs when it runs.
+
+import sys
+import argparse
+
+RIG_CHOICES = ["towa", "c6h", "carbonstar"]
+
+def format_coords(coords) -> str:
+    return coords[0] + " " + coords[1] + " " + coords[2] + ", " + coords[3] + " " + coords[4] + " " + coords[5]
+
+def run_generate(args) -> int:
+    if args.plan is None:
+        #Interactive session using the rig's own prompts
+        if args.rig is None:
+            print("generate needs --rig or a plan file")
+            return 2
+        import ssp_plan
+        module = ssp_plan.rig_module(args.rig)
+        module.main(profile_argv(args))
+        return 0
+
+    import json
+    import ssp_plan
+    import ssp_profile
+    import ssp_manifest
+    try:
+        plan = ssp_plan.load_plan(args.plan)
+    except (ssp_plan.PlanError, FileNotFoundError, json.JSONDecodeError) as e:
+        print("Plan error: " + str(e))
+        return 1
+    if args.rig is not None:
+        plan.rig = args.rig
+    output = args.output
+    if output is None:
+        output = args.plan.rsplit(".", 1)[0] + ".scs"
+    cache = ssp_plan.BlockCache.load(args.cache) if args.cache else None
+    ssp_profile.start_from_args(args)
+    try:
+        ssp_plan.generate_file(plan, output, cache=cache)
+        with ssp_profile.stage("manifest"):
+            ssp_manifest.write_manifest(output, plan.rig)
+    except ssp_plan.PlanError as e:
+        print("Plan error: " + str(e))
+        return 1
+    finally:
+        ssp_profile.finish_from_args(args)
+    if cache is not None:
+        cache.save(args.cache)
+    print("Sequence file generated!")
+    return 0
+
+def run_lookup(args) -> int:
+    import ssp_catalog
+    import ssp_aliases
+    missing = 0
+    for name in args.names:
+        coords = ssp_catalog.find(name)
+        if coords is None:
+            print(name + ": not found")
+            missing += 1
+        else:
+            aliases = ssp_aliases.aliases(name)
+            print(name + ": " + format_coords(coords) + (" (also " + ", ".join(aliases) + ")" if aliases else ""))
+    return 1 if missing else 0
+
+def run_search(args) -> int:
+    import ssp_catalog
+    for name, coords in ssp_catalog.search(args.text, args.limit):
+        print(name.ljust(16) + format_coords(coords))
+    return 0
+
+def run_plan(args) -> int:
+    import ssp_plan
+    if args.action == "new":
+        ssp_plan.save_plan(ssp_plan.Plan(args.rig, [], args.temperature, args.start, args.dithers_per_hour, args.site, args.date), args.plan)
+        return 0
+
+    plan = ssp_plan.load_plan(args.plan)
+    if args.action == "add":
+        import ssp_aliases
+        coords = tuple(args.coords) if args.coords else None
+        same = ssp_aliases.canonical(args.name)
+        for target in plan.targets:
+            if target.name != args.name and ssp_aliases.canonical(target.name) == same and target.filter_name == args.filter:
+                print("Note: " + args.name + " is the same object as " + target.name + ", already planned in " + args.filter)
+        plan.targets.append(ssp_plan.PlanTarget(args.name, args.filter, args.hours, coords, args.focus))
+        ssp_plan.save_plan(plan, args.plan)
+    else:
+        start = plan.start if plan.start else "now"
+        dithers = "" if plan.dithers_per_hour is None else ", " + str(plan.dithers_per_hour) + " dithers/h"
+        place = "" if plan.site is None else ", " + plan.site + (" on " + plan.date if plan.date else "")
+        print(plan.rig + ", cooler " + str(plan.temperature) + ", start " + start + dithers + place)
+        for n, target in enumerate(plan.targets, 1):
+            print(str(n).rjust(3) + " " + target.name.ljust(16) + target.filter_name.ljust(10) + str(target.hours) + " h")
+    return 0
+
+def run_lint(argv) -> int:
+    import ssp_lint
+    #ssp_lint has its own lint and diff commands, "ssp.py lint" means the lint one
+    if not argv or argv[0] not in ("lint", "diff", "-h", "--help"):
+        argv = ["lint"] + argv
+    ssp_lint.main(argv)
+    return 0
+
+def run_budget(args) -> int:
+    import json
+    import ssp_plan
+    import ssp_budget
+    try:
+        dither_every = args.dither_every
+        dither_seconds = args.dither_seconds
+        if args.dithers_per_hour is not None:
+            #Charge the calibrated dither the generator would
+            if dither_seconds is None:
+                dither_seconds = ssp_budget.settled_dither(ssp_plan.rig_module(args.rig))
+            dither_every = tuple((name, ssp_budget.dither_interval(args.rig, name, args.dithers_per_hour, dither_seconds)) for name in args.filters)
+        budget = ssp_budget.budget(args.rig, tuple(args.filters), args.hours, args.autofocus, dither_every, dither_seconds, args.interleave)
+    except ssp_plan.PlanError as e:
+        print("Budget error: " + str(e))
+        return 1
+    print(json.dumps(budget.as_dict(), indent=2))
+    return 0
+
+def run_build_catalog(args) -> int:
+    import ssp_catalog
+    import ssp_aliases
+    count = ssp_catalog.build_index()
+    print("Indexed " + str(count) + " catalog objects into " + str(ssp_catalog.index_catalog))
+    groups, names = ssp_aliases.build_aliases()
+    print("Matched " + str(names) + " names into " + str(groups) + " objects listed more than once, see " + str(ssp_aliases.alias_catalog))
+    return 0
+
+def run_bench(argv) -> int:
+    import ssp_bench
+    ssp_bench.main(argv)
+    return 0
+
+def run_manifest(argv) -> int:
+    import ssp_manifest
+    ssp_manifest.main(argv)
+    return 0
+
+def run_moon(argv) -> int:
+    import ssp_moon
+    ssp_moon.main(argv)
+    return 0
+
+def run_resume(argv) -> int:
+    import ssp_resume
+    ssp_resume.main(argv)
+    return 0
+
+def run_projects(argv) -> int:
+    import ssp_projects
+    ssp_projects.main(argv)
+    return 0
+
+def run_multirig(argv) -> int:
+    import ssp_multirig
+    ssp_multirig.main(argv)
+    return 0
+
+def run_import(argv) -> int:
+    import ssp_import
+    ssp_import.main(argv)
+    return 0
+
+def run_serve(argv) -> int:
+    import ssp_server
+    ssp_server.main(argv)
+    return 0
+
+def profile_argv(args) -> list:
+    #Hand the profiling options on to a rig's own main()
+    argv = []
+    if args.profile:
+        argv += ["--profile", args.profile]
+    if args.cprofile:
+        argv += ["--cprofile", args.cprofile]
+    if args.tracemalloc:
+        argv.append("--tracemalloc")
+    return argv
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="ssp.py", description="SharpCap sequence tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="write a sequence interactively or from a plan")
+    generate.add_argument("plan", nargs="?", help="plan file (.json), omit for the interactive prompts")
+    generate.add_argument("--rig", choices=RIG_CHOICES)
+    generate.add_argument("-o", "--output", help="sequence file to write (default: plan name with .scs)")
+    generate.add_argument("--cache", metavar="PATH", help="keep rendered target blocks here and reuse the unchanged ones")
+    #Same options as ssp_profile.add_arguments(), repeated so parsing stays import free
+    generate.add_argument("--profile", metavar="REPORT", help="write per stage timings to a .json or .csv report")
+    generate.add_argument("--cprofile", metavar="PATH", help="also dump cProfile stats for the run")
+    generate.add_argument("--tracemalloc", action="store_true", help="also record allocations per stage")
+    generate.set_defaults(run=run_generate)
+
+    lookup = commands.add_parser("lookup", help="print catalog coordinates")
+    lookup.add_argument("names", nargs="+")
+    lookup.set_defaults(run=run_lookup)
+
+    search = commands.add_parser("search", help="list catalog names starting with some text")
+    search.add_argument("text")
+    search.add_argument("--limit", type=int, default=20)
+    search.set_defaults(run=run_search)
+
+    plan = commands.add_parser("plan", help="create, extend or show a plan file")
+    actions = plan.add_subparsers(dest="action", required=True)
+    new = actions.add_parser("new")
+    new.add_argument("plan")
+    new.add_argument("--rig", choices=RIG_CHOICES, required=True)
+    new.add_argument("--temperature", type=int, default=100)
+    new.add_argument("--start", help="local start time as HH:MM")
+    new.add_argument("--dithers-per-hour", type=float, help="pick each filter's dither cadence from this rate")
+    new.add_argument("--site", help="site in sites/, with --date and --start splits captures at meridian flips")
+    new.add_argument("--date", help="night the plan starts on as YYYY-MM-DD")
+    add = actions.add_parser("add")
+    add.add_argument("plan")
+    add.add_argument("name")
+    add.add_argument("--filter", required=True)
+    add.add_argument("--hours", type=float, required=True)
+    add.add_argument("--coords", nargs=6, metavar=("RA_H", "RA_M", "RA_S", "DEC_D", "DEC_M", "DEC_S"))
+    add.add_argument("--focus", type=int, default=-1)
+    show = actions.add_parser("show")
+    show.add_argument("plan")
+    plan.set_defaults(run=run_plan)
+
+    budget = commands.add_parser("budget", help="frames per filter and overheads for some hours of capture")
+    budget.add_argument("rig", choices=RIG_CHOICES)
+    budget.add_argument("filters", nargs="+")
+    budget.add_argument("--hours", type=float, required=True)
+    budget.add_argument("--autofocus", action="store_true")
+    budget.add_argument("--dither-every", type=int, help="frames between dithers (default: the rig's table)")
+    budget.add_argument("--dithers-per-hour", type=float, help="pick each filter's dither cadence from this rate")
+    budget.add_argument("--dither-seconds", type=float, help="measured settle time per dither (default: the rig's SETTLE table)")
+    budget.add_argument("--interleave", type=int, default=0, help="frames per filter before switching (0 captures each filter in one go)")
+    budget.set_defaults(run=run_budget)
+
+    #Listed for --help only, main() hands their arguments straight to the module's own parser
+    commands.add_parser("lint", help="check .scs files (see ssp_lint.py)", add_help=False)
+
+    build = commands.add_parser("build-catalog", help="index catalogs/master.csv for fast lookups and match its duplicates")
+    build.set_defaults(run=run_build_catalog)
+
+    commands.add_parser("bench", help="run the benchmarks (see ssp_bench.py)", add_help=False)
+    commands.add_parser("serve", help="run the local plan server (see ssp_server.py)", add_help=False)
+    commands.add_parser("manifest", help="write sequence manifests or compare them with FITS files (see ssp_manifest.py)", add_help=False)
+    commands.add_parser("moon", help="Moon separation and broadband or narrowband advice for targets (see ssp_moon.py)", add_help=False)
+    commands.add_parser("resume", help="write the rest of a sequence from the frames already captured (see ssp_resume.py)", add_help=False)
+    commands.add_parser("projects", help="track integration across nights and plan tonight (see ssp_projects.py)", add_help=False)
+    commands.add_parser("multirig", help="share a target pool between the rigs and write a sequence for each (see ssp_multirig.py)", add_help=False)
+    commands.add_parser("import", help="turn a CSV, TSV or VOTable observing list into a plan (see ssp_import.py)", add_help=False)
+
+    return parser
+
+#Commands taking the argument list of another module's main()
+PASSTHROUGH = {
+    "lint": run_lint,
+    "bench": run_bench,
+    "serve": run_serve,
+    "manifest": run_manifest,
+    "moon": run_moon,
+    "resume": run_resume,
+    "projects": run_projects,
+    "multirig": run_multirig,
+    "import": run_import
+}
+
+def main(argv=None) -> None:
+    if argv is None:
+        argv = sys.argv[1:]
+    if argv and argv[0] in PASSTHROUGH:
+        sys.exit(PASSTHROUGH[argv[0]](argv[1:]))
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    #Same check as ssp_profile.check_arguments(), kept here so parsing stays import free
+    if args.command == "generate" and args.tracemalloc and not args.profile:
+        parser.error("--tracemalloc needs --profile to report the allocations in")
+    sys.exit(args.run(args))
+
+if __name__ == "__main__":
+    main()
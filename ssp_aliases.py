@@ -0,0 +1,235 @@
+# Cross catalog duplicates, so M42, NGC1976, LBN974 and Sh2-281 count as one target
+#   ssp.py build-catalog          writes catalogs/aliases.csv along with the index
+#
+# master.csv merges a dozen catalogs and the brighter objects turn up in several of them
+# under different names. build_aliases() finds them by position:
+#   every catalog has a match radius for how precise its positions are
+#   two objects can be the same one when they're within the larger of their radii and their
+#     catalogs list the same kind of object, a dark nebula is never a galaxy
+#   the nebula catalogs put their positions somewhere in a big cloud, and Messier and
+#     Caldwell anywhere on an NGC object, so against those an object with a size in OpenNGC
+#     reaches out to half of it
+#   pairs are joined closest first and a group never takes two names from one catalog, so a
+#     big galaxy doesn't swallow its neighbours and nothing swallows a whole galaxy cluster,
+#     nor two objects with precise positions further apart than their plain radii
+# Candidate pairs come from a SkyGrid and each object only searches out to its own radius,
+# so the whole catalog takes a few seconds rather than comparing every pair.
+#
+# aliases.csv holds one group per line with the canonical name first, the name from the
+# earliest catalog in CATALOG_ORDER, so Messier beats Caldwell beats NGC and so on.
+
+import re
+import csv
+from pathlib import Path
+
+import ssp_astro
+import ssp_catalog
+import ssp_profile
+
+alias_catalog = Path("catalogs") / "aliases.csv"
+size_catalogs = (Path("catalogs") / "original" / "NGC.csv", Path("catalogs") / "original" / "IC.csv")
+
+#Name prefix to (kind of object, match radius in arcmin)
+CATALOGS = {
+    "m": ("any", 5.0),
+    "c": ("any", 5.0),
+    "ngc": ("any", 1.0),
+    "ic": ("any", 1.0),
+    "sh2-": ("nebula", 10.0),
+    "lbn": ("nebula", 10.0),
+    "pk": ("planetary", 1.5),
+    "ldn": ("dark", 10.0),
+    "b": ("dark", 10.0),
+    "pgc": ("galaxy", 1.0),
+    "abell": ("cluster", 0.0),
+}
+#Kinds whose positions are only good to the object's extent
+COARSE_KINDS = ("nebula", "dark")
+#Catalogs of nothing but objects listed elsewhere, whose positions can sit anywhere on them
+CROSS_REFERENCES = ("m", "c")
+CATALOG_ORDER = ("m", "c", "ngc", "ic", "sh2-", "lbn", "pk", "ldn", "b", "pgc", "abell")
+#Largest radius an object's size can give it, arcmin
+MAX_RADIUS = 15.0
+GRID_CELL = 0.5
+
+#Groups of the last alias file loaded, keyed by path and modification time
+_aliases = {}
+
+def catalog_of(name):
+    #The CATALOGS prefix of a master.csv name, None for names from anywhere else
+    for prefix in sorted(CATALOGS, key=len, reverse=True):
+        if name.startswith(prefix) and name[len(prefix):len(prefix) + 1].isdigit():
+            return prefix
+    return None
+
+def compatible(kind, other) -> bool:
+    if kind == "cluster" or other == "cluster":
+        return False
+    if kind == other:
+        return True
+    return (kind == "any" and other != "dark") or (other == "any" and kind != "dark")
+
+def read_sizes(paths=size_catalogs) -> dict:
+    #Major axis in arcmin by master.csv name, from OpenNGC files, their M column gives the
+    #Messier objects theirs too
+    sizes = {}
+    for path in paths:
+        path = Path(path)
+        if not path.exists():
+            continue
+        with path.open("r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f, delimiter=";")
+            header = next(reader, [])
+            if "Name" not in header or "MajAx" not in header:
+                continue
+            name_col = header.index("Name")
+            size_col = header.index("MajAx")
+            messier_col = header.index("M") if "M" in header else None
+            for row in reader:
+                try:
+                    size = float(row[size_col])
+                except (IndexError, ValueError):
+                    continue
+                name = row[name_col].lower()
+                sizes[name] = size
+                #NGC0224 is ngc224 in master.csv, but the lettered ones keep their zeros
+                match = re.match(r"([a-z]+)0+(\d.*)", name)
+                if match:
+                    sizes[match.group(1) + match.group(2)] = size
+                if messier_col is not None and row[messier_col].strip().isdigit():
+                    sizes.setdefault("m" + str(int(row[messier_col])), size)
+    return sizes
+
+def match_radius(name, catalog, sizes) -> float:
+    #Degrees, against a coarse catalog, the same as CATALOGS for objects without a size
+    radius = CATALOGS[catalog][1]
+    size = sizes.get(name)
+    if size is not None:
+        radius = max(radius, min(size / 2, MAX_RADIUS))
+    return radius / 60
+
+def pair_radius(entry, other) -> float:
+    #Degrees two entries of cross_match() can be apart and still be one object
+    _, catalog, kind, radius, _, _ = entry
+    _, other_catalog, other_kind, other_radius, _, _ = other
+    if kind in COARSE_KINDS or other_kind in COARSE_KINDS or catalog in CROSS_REFERENCES or other_catalog in CROSS_REFERENCES:
+        return max(radius, other_radius)
+    #Sizes don't count between two precise positions
+    return max(CATALOGS[catalog][1], CATALOGS[other_catalog][1]) / 60
+
+def sort_key(name) -> tuple:
+    #Catalog order, then number order within a catalog
+    catalog = catalog_of(name)
+    digits = re.match(r"\d+", name[len(catalog):]) if catalog else None
+    return (CATALOG_ORDER.index(catalog) if catalog else len(CATALOG_ORDER), int(digits.group()) if digits else 0, name)
+
+def cross_match(index, sizes=None) -> list:
+    #Groups of names for the same object, each sorted canonical first
+    sizes = sizes or {}
+    entries = []
+    grid = ssp_catalog.SkyGrid(GRID_CELL)
+    for name, coords in index.items():
+        catalog = catalog_of(name)
+        if catalog is None or CATALOGS[catalog][0] == "cluster":
+            continue
+        try:
+            ra, dec = ssp_astro.coords_to_degrees(coords)
+        except ValueError:
+            continue
+        grid.add(len(entries), ra, dec)
+        entries.append((name, catalog, CATALOGS[catalog][0], match_radius(name, catalog, sizes), ra, dec))
+
+    pairs = []
+    for n, (name, catalog, kind, radius, ra, dec) in enumerate(entries):
+        for other, distance in grid.near(ra, dec, radius):
+            _, other_catalog, other_kind, other_radius, _, _ = entries[other]
+            if other_catalog == catalog or not compatible(kind, other_kind):
+                continue
+            #Each pair once, from the side with the larger radius
+            if other_radius > radius or (other_radius == radius and other < n):
+                continue
+            if distance <= pair_radius(entries[n], entries[other]):
+                pairs.append((distance, n, other))
+    pairs.sort()
+
+    parent = list(range(len(entries)))
+    catalogs = {}
+    precise = {}
+    def root(n):
+        while parent[n] != n:
+            parent[n] = parent[parent[n]]
+            n = parent[n]
+        return n
+    def close(n, other) -> bool:
+        a = entries[n]
+        b = entries[other]
+        return ssp_astro.separation(a[4], a[5], b[4], b[5]) <= pair_radius(a, b)
+    for _, a, b in pairs:
+        a = root(a)
+        b = root(b)
+        if a == b:
+            continue
+        a_catalogs = catalogs.get(a) or {entries[a][1]}
+        b_catalogs = catalogs.get(b) or {entries[b][1]}
+        if a_catalogs & b_catalogs:
+            continue
+        #A nebula in between mustn't chain two separate NGC objects together
+        a_precise = precise.get(a) or ([a] if entries[a][2] not in COARSE_KINDS else [])
+        b_precise = precise.get(b) or ([b] if entries[b][2] not in COARSE_KINDS else [])
+        if not all(close(n, other) for n in a_precise for other in b_precise):
+            continue
+        parent[b] = a
+        catalogs[a] = a_catalogs | b_catalogs
+        precise[a] = a_precise + b_precise
+        catalogs.pop(b, None)
+        precise.pop(b, None)
+
+    groups = {}
+    for n in catalogs:
+        groups[n] = []
+    for n, entry in enumerate(entries):
+        top = root(n)
+        if top in groups:
+            groups[top].append(entry[0])
+    return sorted((sorted(group, key=sort_key) for group in groups.values()), key=lambda group: sort_key(group[0]))
+
+def build_aliases(source=ssp_catalog.master_catalog, target=alias_catalog, sizes=size_catalogs) -> tuple:
+    #(groups, names in them) written to target
+    with ssp_profile.stage("catalog_aliases"):
+        groups = cross_match(ssp_catalog.read_catalog(source), read_sizes(sizes))
+        with Path(target).open("w", encoding="utf-8", newline="") as f:
+            csv.writer(f, lineterminator="\n").writerows(groups)
+    return len(groups), sum(len(group) for group in groups)
+
+def read_aliases(path=alias_catalog) -> dict:
+    #Name to the whole group it belongs to
+    groups = {}
+    with Path(path).open("r", encoding="utf-8", newline="") as f:
+        for row in csv.reader(f):
+            group = tuple(name for name in row if name)
+            for name in group:
+                groups[name] = group
+    return groups
+
+def load_aliases(path=alias_catalog, source=ssp_catalog.master_catalog) -> dict:
+    #read_aliases() cached per file version, empty while the file is missing or older than
+    #the catalog it was built from
+    path = Path(path)
+    if not ssp_catalog.index_is_fresh(source, path):
+        return {}
+    key = (str(path), path.stat().st_mtime_ns)
+    if key not in _aliases:
+        groups = read_aliases(path)
+        _aliases.clear()
+        _aliases[key] = groups
+    return _aliases[key]
+
+def canonical(name, groups=None) -> str:
+    #The name a target is tracked under, names without duplicates are their own
+    group = (load_aliases() if groups is None else groups).get(name)
+    return name if group is None else group[0]
+
+def aliases(name, groups=None) -> tuple:
+    #The other names of the same object, canonical first
+    group = (load_aliases() if groups is None else groups).get(name, ())
+    return tuple(other for other in group if other != name)
@@ -0,0 +1,44 @@
+# Astronomy helpers shared by the sharpcap sequence parsers
+
+import math
+
+def ra_to_degrees(ra_h, ra_m, ra_s) -> float:
+    return (float(ra_h) + float(ra_m) / 60 + float(ra_s) / 3600) * 15
+
+def dec_to_degrees(dec_d, dec_m, dec_s) -> float:
+    #Keep the sign of "-0 30 00" style declinations
+    sign = -1 if str(dec_d).strip().startswith("-") else 1
+    return sign * (abs(float(dec_d)) + float(dec_m) / 60 + float(dec_s) / 3600)
+
+def coords_to_degrees(coords) -> tuple:
+    #coords is the (ra_h, ra_m, ra_s, dec_d, dec_m, dec_s) tuple used by the parsers
+    return ra_to_degrees(coords[0], coords[1], coords[2]), dec_to_degrees(coords[3], coords[4], coords[5])
+
+def separation(ra1, dec1, ra2, dec2) -> float:
+    #Angular distance in degrees between two positions given in degrees (haversine)
+    ra1, dec1, ra2, dec2 = map(math.radians, (ra1, dec1, ra2, dec2))
+    hav = math.sin((dec2 - dec1) / 2) ** 2 + math.cos(dec1) * math.cos(dec2) * math.sin((ra2 - ra1) / 2) ** 2
+    return math.degrees(2 * math.asin(min(1.0, math.sqrt(hav))))
+
+def julian_date(when) -> float:
+    #when is a timezone aware datetime
+    return when.timestamp() / 86400 + 2440587.5
+
+def local_sidereal_time(when, longitude) -> float:
+    #Degrees, longitude is east positive
+    days = julian_date(when) - 2451545.0
+    return (280.46061837 + 360.98564736629 * days + longitude) % 360
+
+def alt_az(ra, dec, latitude, lst) -> tuple:
+    #Altitude and azimuth (north through east) in degrees for a position in degrees
+    hour_angle = math.radians((lst - ra) % 360)
+    dec = math.radians(dec)
+    lat = math.radians(latitude)
+    sin_alt = math.sin(dec) * math.sin(lat) + math.cos(dec) * math.cos(lat) * math.cos(hour_angle)
+    alt = math.asin(max(-1.0, min(1.0, sin_alt)))
+    az = math.atan2(-math.sin(hour_angle) * math.cos(dec), math.cos(lat) * math.sin(dec) - math.sin(lat) * math.cos(dec) * math.cos(hour_angle))
+    return math.degrees(alt), math.degrees(az) % 360
+
+def hour_angle(ra, lst) -> float:
+    #Hours in -12 to 12, negative east of the meridian
+    return ((lst - ra + 180) % 360 - 180) / 15
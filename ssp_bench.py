@@ -0,0 +1,257 @@
+# Benchmarks for catalog lookups and sequence generation
+#   ssp_bench.py --output bench.json
+#   ssp_bench.py --output new.json --compare bench.json --threshold 0.15
+#
+# Everything runs offline: catalog benchmarks use catalogs/master.csv (or a synthetic catalog of
+# the same size when it is missing) and generation benchmarks use seeded synthetic plans with
+# explicit coordinates, written to memory so disk speed doesn't leak into the numbers.
+# Each case runs once to warm up, then every repeat loops it for at least MIN_SECONDS and
+# records the time per call, so millisecond cases aren't timer noise.
+
+import io
+import sys
+import json
+import time
+import random
+import fnmatch
+import platform
+import argparse
+import tempfile
+import statistics
+from pathlib import Path
+
+import ssp_plan
+import ssp_catalog
+from ssp_plan import Plan, PlanTarget
+
+SEED = 2026
+CATALOG_SAMPLES = 12
+MIN_SECONDS = 0.05
+
+#Rig, filter choices and whether the plan uses Carbonstar's RGB path
+EMIT_CASES = {
+    "towa": ("towa", ["LUMINANCE", "RED", "GREEN", "BLUE", "SII", "HA", "OIII"]),
+    "c6h": ("c6h", ["UVIR", "LENHANCE", "LPRO", "D1", "D2"]),
+    "carbonstar": ("carbonstar", ["LUMINANCE", "RED", "GREEN", "BLUE", "SII", "HA", "OIII"]),
+    "carbonstar_rgb": ("carbonstar", ["RGB"]),
+}
+
+def synthetic_coords(rng) -> tuple:
+    return (
+        str(rng.randrange(24)), str(rng.randrange(60)), str(round(rng.uniform(0, 60), 1)),
+        str(rng.randrange(-89, 90)), str(rng.randrange(60)), str(round(rng.uniform(0, 60), 1))
+    )
+
+def synthetic_plan(rng, rig, filters, targets) -> Plan:
+    plan_targets = []
+    for n in range(targets):
+        focus = rng.choice([-1, 5000]) if rig == "carbonstar" else -1
+        plan_targets.append(PlanTarget("bench" + str(n), rng.choice(filters), round(rng.uniform(0.5, 4), 2), synthetic_coords(rng), focus))
+    return Plan(rig, plan_targets, rng.choice([100, -10, -5]), "21:30")
+
+def synthetic_catalog(path, rows=95000) -> None:
+    rng = random.Random(SEED)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("name,ra_h,ra_m,ra_s,dec_d,dec_m,dec_s\n")
+        for n in range(rows):
+            f.write("syn" + str(n) + "," + ",".join(synthetic_coords(rng)) + "\n")
+
+def sample_names(path) -> list:
+    #Names spread evenly through the file, from the first row to the last
+    with open(path, "r", encoding="utf-8") as f:
+        names = [line.split(",", 1)[0] for line in f][1:]
+    step = max(1, (len(names) - 1) // (CATALOG_SAMPLES - 1))
+    return [names[min(n * step, len(names) - 1)] for n in range(CATALOG_SAMPLES)]
+
+def measure(function, repeats) -> dict:
+    function()
+    times = []
+    for _ in range(repeats):
+        loops = 0
+        began = time.perf_counter()
+        while True:
+            ops = function()
+            loops += 1
+            elapsed = time.perf_counter() - began
+            if elapsed >= MIN_SECONDS:
+                break
+        times.append(elapsed / loops)
+    return {
+        "median": statistics.median(times),
+        "min": min(times),
+        "repeats": repeats,
+        "loops": loops,
+        "ops": ops
+    }
+
+def selected(name, only) -> bool:
+    #--only is checked before a case runs, so one case doesn't cost the whole suite
+    return not only or fnmatch.fnmatch(name, only)
+
+def catalog_benchmarks(catalog, repeats, only=None) -> dict:
+    cases = ("catalog_scan_cold", "catalog_index_build", "catalog_lookup_warm", "catalog_find_cold", "catalog_find_warm")
+    if not any(selected(name, only) for name in cases):
+        return {}
+    names = sample_names(catalog)
+
+    def cold_scan():
+        for name in names:
+            ssp_catalog.scan(name, catalog)
+        return len(names)
+
+    def index_build():
+        ssp_catalog._index.clear()
+        ssp_catalog.load_index(catalog)
+        return 1
+
+    def warm_lookup():
+        for _ in range(1000):
+            for name in names:
+                ssp_catalog.lookup(name, catalog)
+        return 1000 * len(names)
+
+    def cold_find(index):
+        #find() opens the sorted index for every name, as the interactive scripts do
+        for name in names:
+            ssp_catalog.find(name, catalog, index)
+        return len(names)
+
+    def warm_find(records):
+        #The same binary search through an index that is already open
+        for name in names:
+            records.row(records.first_at_least(name))
+        return len(names)
+
+    results = {}
+    if selected("catalog_scan_cold", only):
+        results["catalog_scan_cold"] = measure(cold_scan, repeats)
+    if selected("catalog_index_build", only):
+        results["catalog_index_build"] = measure(index_build, repeats)
+    if selected("catalog_lookup_warm", only):
+        ssp_catalog.load_index(catalog)
+        results["catalog_lookup_warm"] = measure(warm_lookup, repeats)
+    if selected("catalog_find_cold", only) or selected("catalog_find_warm", only):
+        with tempfile.TemporaryDirectory() as tmp:
+            index = Path(tmp) / "master.idx"
+            ssp_catalog.build_index(catalog, index)
+            if selected("catalog_find_cold", only):
+                results["catalog_find_cold"] = measure(lambda: cold_find(index), repeats)
+            if selected("catalog_find_warm", only):
+                with ssp_catalog.RecordFile(index) as records:
+                    results["catalog_find_warm"] = measure(lambda: warm_find(records), repeats)
+    return results
+
+def emit_benchmarks(repeats, only=None) -> dict:
+    results = {}
+    for case, (rig, filters) in EMIT_CASES.items():
+        for targets in (1, 50):
+            if not selected("emit_" + case + "_" + str(targets), only):
+                continue
+            plan = synthetic_plan(random.Random(SEED), rig, filters, targets)
+
+            def emit(plan=plan):
+                ssp_plan.generate(plan, io.StringIO())
+                return len(plan.targets)
+
+            results["emit_" + case + "_" + str(targets)] = measure(emit, repeats)
+
+        #Regenerating a cached 50 target plan after changing the hours of one target
+        if not selected("regenerate_" + case + "_50", only):
+            continue
+        plan = synthetic_plan(random.Random(SEED), rig, filters, 50)
+        cache = ssp_plan.BlockCache()
+        ssp_plan.generate(plan, io.StringIO(), cache=cache)
+
+        def regenerate(plan=plan, cache=cache):
+            plan.targets[25].hours += 0.25
+            ssp_plan.generate(plan, io.StringIO(), cache=cache)
+            return 1
+
+        results["regenerate_" + case + "_50"] = measure(regenerate, repeats)
+    return results
+
+def bulk_benchmarks(repeats, plans, only=None) -> dict:
+    if not selected("bulk_" + str(plans) + "_plans", only):
+        return {}
+    rng = random.Random(SEED)
+    cases = list(EMIT_CASES.values())
+    bulk = []
+    for _ in range(plans):
+        rig, filters = rng.choice(cases)
+        bulk.append(synthetic_plan(rng, rig, filters, rng.randrange(1, 4)))
+
+    def generate_all():
+        for plan in bulk:
+            ssp_plan.generate(plan, io.StringIO())
+        return len(bulk)
+
+    return {"bulk_" + str(plans) + "_plans": measure(generate_all, repeats)}
+
+def run(catalog, repeats, plans, only=None) -> dict:
+    results = {}
+    results.update(catalog_benchmarks(catalog, repeats, only))
+    results.update(emit_benchmarks(repeats, only))
+    results.update(bulk_benchmarks(max(1, repeats // 3), plans, only))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "catalog": str(catalog),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": results
+    }
+
+def compare(old, new, threshold) -> list:
+    #Benchmarks whose median grew by more than the threshold
+    regressions = []
+    for name, result in new["results"].items():
+        if name not in old["results"]:
+            continue
+        before = old["results"][name]["median"]
+        ratio = result["median"] / before if before > 0 else 1.0
+        if ratio > 1 + threshold:
+            regressions.append((name, before, result["median"], ratio))
+    return regressions
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark catalog lookups and sequence generation")
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--compare", metavar="BASELINE", help="flag regressions against an earlier results file")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before flagging (default 0.10)")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--plans", type=int, default=10000, help="plans in the bulk generation benchmark")
+    parser.add_argument("--quick", action="store_true", help="fewer repeats and 1000 bulk plans")
+    parser.add_argument("--only", metavar="PATTERN", help="keep benchmarks matching a glob, e.g. 'emit_*'")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.repeats = 3
+        args.plans = 1000
+
+    catalog = ssp_catalog.master_catalog
+    with tempfile.TemporaryDirectory() as tmp:
+        if not catalog.exists():
+            catalog = Path(tmp) / "synthetic.csv"
+            synthetic_catalog(catalog)
+        report = run(catalog, args.repeats, args.plans, args.only)
+
+    for name, result in report["results"].items():
+        print(name.ljust(28) + ("%10.3f ms" % (result["median"] * 1000)) + ("  (%d ops)" % result["ops"]))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        for name, before, after, ratio in regressions:
+            print("REGRESSION " + name + ": " + ("%.3f ms -> %.3f ms (x%.2f)" % (before * 1000, after * 1000, ratio)))
+        if regressions:
+            sys.exit(1)
+        print("No regressions beyond " + str(int(args.threshold * 100)) + "%")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# Capture budgets: how many frames of each filter fit in the hours given to a target
+#
+#     ssp_budget.budget("carbonstar", ("RED", "GREEN", "BLUE"), 3.0, autofocus=True)
+#
+# Frame counts follow the rig scripts: a frame costs the rig's TIMEDIV seconds (exposure plus
+# download and the usual dither), an autofocus run gives up AUTOFOCUS_ALLOWANCE seconds of
+# exposure, and a filter set splits the frames evenly between its filters. On top of that a
+# budget can charge the wheel moves of an interleaved capture.
+#
+# TIMEDIV has one dither every DITHER frames baked in, costing the rig's SETTLE dither time.
+# A budget given another cadence or a measured dither time takes that share back out of
+# TIMEDIV and charges the new one instead. dither_interval() picks the cadence that gives a
+# number of dithers per hour, so short broadband exposures stop dithering every minute, and
+# settled_dither() is the dither time from the rig's settle model to charge for it.
+#
+# Results are cached per configuration, so schedulers and bulk generation can ask freely.
+
+import math
+from functools import lru_cache
+
+import ssp_plan
+from ssp_settle import Operation, load_settle_model
+
+#Seconds of exposure Carbonstar has always set aside for an autofocus run
+AUTOFOCUS_ALLOWANCE = 1440
+
+class CaptureBudget:
+    def __init__(self, rig, hours, frames, exposures, dither_every, overhead):
+        self.rig = rig
+        self.hours = hours
+        #(filter name, frames) in capture order
+        self.frames = frames
+        self.exposures = exposures
+        self.dither_every = dither_every
+        #Seconds lost per cause: per_frame (download and guiding time in TIMEDIV), autofocus,
+        #dither and interleave
+        self.overhead = overhead
+
+    def frames_for(self, filter_name) -> int:
+        for name, count in self.frames:
+            if name == filter_name:
+                return count
+        raise KeyError(filter_name)
+
+    def exposure_seconds(self) -> float:
+        return sum(count * self.exposures[name] for name, count in self.frames)
+
+    def as_dict(self) -> dict:
+        return {
+            "rig": self.rig,
+            "hours": self.hours,
+            "frames": dict(self.frames),
+            "exposure_seconds": round(self.exposure_seconds(), 3),
+            "dither_every": dict(self.dither_every),
+            "overhead_seconds": {cause: round(seconds, 3) for cause, seconds in self.overhead.items()},
+            "idle_seconds": round(self.hours * 3600 - self.exposure_seconds() - sum(self.overhead.values()), 3)
+        }
+
+def capture_values(module, filter_name) -> tuple:
+    #(exposure, timediv, dither) from the rig's tables
+    try:
+        filter_type = module.Filters[filter_name]
+    except KeyError:
+        raise ssp_plan.PlanError("rig " + module.RIG + " has no filter " + filter_name)
+    telescope = module.RIG_TELESCOPE
+    return module.EXPOSURE[telescope][filter_type], module.TIMEDIV[telescope][filter_type], module.DITHER[telescope][filter_type]
+
+def frame_cost(exposure, timediv, table_every, baked, every, dither_seconds) -> float:
+    #Seconds per frame with a dither every `every` frames costing dither_seconds each
+    if every == table_every and dither_seconds == baked:
+        return timediv
+    base = max(exposure, timediv - baked / table_every)
+    return base + dither_seconds / every
+
+def baked_dither(module) -> float:
+    return module.SETTLE[module.RIG_TELESCOPE][Operation.DITHER]
+
+def settled_dither(module) -> float:
+    #The dither time the generators charge, calibrated when the rig has a settle file
+    return load_settle_model(module.RIG, module.SETTLE[module.RIG_TELESCOPE]).delay(Operation.DITHER)
+
+@lru_cache(maxsize=1024)
+def dither_interval(rig, filter_name, dithers_per_hour, dither_seconds) -> int:
+    #Frames between dithers so a filter dithers about dithers_per_hour times an hour
+    module = ssp_plan.rig_module(rig)
+    exposure, timediv, table_every = capture_values(module, filter_name)
+    base = max(exposure, timediv - baked_dither(module) / table_every)
+    #Each hour holds dithers_per_hour dithers and the frames between them
+    capture = 3600 - dithers_per_hour * dither_seconds
+    if dithers_per_hour <= 0 or capture <= 0:
+        return 1
+    return max(1, round(capture / (dithers_per_hour * base)))
+
+def filter_frames(seconds, frame_cost, autofocus_frames, filters) -> int:
+    #Same order of operations as the rig scripts, so the counts match them exactly
+    frame_qty = seconds / frame_cost
+    frame_qty = frame_qty - autofocus_frames
+    frame_qty = frame_qty / filters
+    return max(0, math.floor(frame_qty))
+
+#Budgets are shared between callers through the cache, treat them as read only
+@lru_cache(maxsize=4096)
+def budget(rig, filters, hours, autofocus=False, dither_every=None, dither_seconds=None, interleave=0, switch_seconds=None) -> CaptureBudget:
+    #filters is a tuple of filter names. dither_every overrides the rig's cadence, either one
+    #number for every filter or a tuple of (filter, frames) pairs, and dither_seconds the
+    #rig's dither settle time. interleave is the frames per filter before moving on to the
+    #next one (0 for capturing each filter in one go)
+    module = ssp_plan.rig_module(rig)
+    filters = tuple(filters)
+    if not filters:
+        raise ssp_plan.PlanError("a capture budget needs at least one filter")
+    if switch_seconds is None:
+        switch_seconds = module.SETTLE[module.RIG_TELESCOPE][Operation.WHEEL]
+    baked = baked_dither(module)
+    if dither_seconds is None:
+        dither_seconds = baked
+    cadence = dict(dither_every) if isinstance(dither_every, tuple) else {}
+    seconds = float(hours) * 3600
+
+    #exposure, seconds per frame and dither cadence of each filter
+    values = {}
+    for name in filters:
+        exposure, timediv, table_every = capture_values(module, name)
+        every = cadence.get(name, table_every) if isinstance(dither_every, tuple) or dither_every is None else dither_every
+        values[name] = (exposure, frame_cost(exposure, timediv, table_every, baked, every, dither_seconds), every)
+
+    def counts(available):
+        result = []
+        for name in filters:
+            exposure, cost, every = values[name]
+            autofocus_frames = AUTOFOCUS_ALLOWANCE / exposure if autofocus else 0
+            result.append((name, filter_frames(available, cost, autofocus_frames, len(filters))))
+        return result
+
+    #An interleaved capture moves the wheel once per block of frames rather than once per
+    #filter, the extra moves come out of the capture time
+    interleave_seconds = 0.0
+    frames = counts(seconds)
+    if interleave > 0 and len(filters) > 1:
+        blocks = max(math.ceil(count / interleave) for _, count in frames)
+        interleave_seconds = max(0, blocks * len(filters) - len(filters)) * switch_seconds
+        frames = counts(seconds - interleave_seconds)
+
+    overhead = {"per_frame": 0.0, "autofocus": 0.0, "dither": 0.0, "interleave": interleave_seconds}
+    for name, count in frames:
+        exposure, cost, every = values[name]
+        dither_share = dither_seconds / every
+        overhead["per_frame"] += count * (cost - exposure - dither_share)
+        overhead["dither"] += count * dither_share
+        if autofocus:
+            overhead["autofocus"] += AUTOFOCUS_ALLOWANCE / exposure * cost / len(filters)
+    return CaptureBudget(rig, float(hours), tuple(frames), {name: values[name][0] for name in filters}, tuple((name, values[name][2]) for name in filters), overhead)
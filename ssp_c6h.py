@@ -1,13 +1,17 @@
 # Parser for the sharpcap sequencer
 # Designed for an ASI533MC Pro mounted to a C6 with a Hyperstar
 
-import sys
-import math
+import io
+import argparse
 from enum import Enum
-from enum import auto
-import csv
 from pathlib import Path
-from typing import Optional
+
+import ssp_profile
+import ssp_budget
+import ssp_manifest
+import ssp_meridian
+import ssp_catalog
+from ssp_settle import Operation, load_settle_model, slew_distance, wheel_distance
 
 class Telescope(Enum):
     C6_HYPER = 3
@@ -71,6 +75,43 @@ DITHER = {
     Telescope.C6_HYPER: DITHER_C6_HYPER
 }
 
+# Settle delay after each operation (seconds), used when the rig has no settle calibration
+# The dither entry is the settle time already counted in TIMEDIV
+SETTLE_C6_HYPER = {
+    Operation.GOTO: 10,
+    Operation.WHEEL: 10,
+    Operation.SOLVE: 10,
+    Operation.GUIDE_STOP: 5,
+    Operation.GUIDE_START: 10,
+    Operation.DITHER: 10
+}
+SETTLE = {
+    Telescope.C6_HYPER: SETTLE_C6_HYPER
+}
+
+# Cooler ramp rate (degrees per minute), the fastest the camera is cooled
+COOLER_RATE = {
+    Telescope.C6_HYPER: 8
+}
+# Tolerance of the cooldown started at unpark, wide enough that SharpCap moves straight on
+# while the cooler ramps through the slew and solves
+COOLER_START_TOLERANCE = 50
+
+RIG = "c6h"
+RIG_TELESCOPE = Telescope.C6_HYPER
+WHEEL_SLOTS = 5
+
+# Filters for plan targets with filter AUTO, broadband under a dark sky and narrowband when
+# the Moon is bright and close (see ssp_moon.py)
+DARK_FILTER = Filters.UVIR
+MOON_FILTER = Filters.D1
+
+# Field of view of the imaging camera (width, height) in arcmin, for sharing targets between
+# rigs by how well each one frames them (see ssp_multirig.py)
+FIELD_OF_VIEW = {
+    Telescope.C6_HYPER: (188, 125)
+}
+
 ra_h = ""
 ra_m = ""
 ra_s = ""
@@ -112,37 +153,25 @@ def coords_catalog() -> None:
     
     #Show users the available catalogs
     print("Available catalogs:\n")
-    with list_catalog.open("r", encoding="utf-8") as f:
-        contents = f.read()
-    print(contents)
+    print(ssp_catalog.available_catalogs(list_catalog))
     
     catalog_search = input("\nEnter catalog name (Ex. m101):\n")
     
     try:
-        with master_catalog.open(mode="r", encoding="utf-8", newline="") as f:
-            reader = csv.reader(f)
-
-            for row in reader:
-                # Skip empty or short rows
-                if len(row) < 7:
-                    continue
-
-                if row[0] == catalog_search:
-                    ra_h = row[1]
-                    ra_m = row[2]
-                    ra_s = row[3]
-                    dec_d = row[4]
-                    dec_m = row[5]
-                    dec_s = row[6]
-                    catalog_used = True
-                    return
-            #If you got here, then the item wasn't found
-            print("Catalog object not found, please enter in coordinates manually\n")
-            coords_direct()
-
+        coords = ssp_catalog.find(catalog_search, master_catalog)
     except FileNotFoundError:
         print("Catalog file not found, please enter in coordinates manually\n")
         coords_direct()
+        return
+
+    if coords is None:
+        #If you got here, then the item wasn't found
+        print("Catalog object not found, please enter in coordinates manually\n")
+        coords_direct()
+        return
+
+    ra_h, ra_m, ra_s, dec_d, dec_m, dec_s = coords
+    catalog_used = True
 
 class Session:
     def __init__(
@@ -156,27 +185,62 @@ class Session:
         self.timediv = timediv
         self.dither = dither
         self.plate_exposure_time = plate_exposure_time
+        with ssp_profile.stage("settle_load"):
+            self.settle = load_settle_model(RIG, SETTLE[telescope_type])
+        self.mount_coords = None
+        self.wheel_slot = None
+        #Cooler setpoint last sent, and the setpoint a COOL DOWN has already waited for
+        self.cooler_temp = None
+        self.cooler_settled = None
+        #Dithers per hour to aim for, None keeps the DITHER table
+        self.dithers_per_hour = None
+        #(capture number, frames before the flip, seconds per frame) when ssp_plan expects a
+        #capture of the next target to cross the meridian, and the captures written so far
+        self.meridian_flip = None
+        self.captures = 0
     
     def start_time(self) -> None:
         #Set start time
-        self.outfile.write("SEQUENCE\n")
-    
+        hour = None
+        minute = None
         if input("Set a start time? (y/n)\n") == 'y':
             hour = input("Enter hour start (24h)\n")
             minute = input("Enter minute start\n")
-            if int(minute) < 10:
-                minute = "0" + minute
-            if int(hour) < 12:
-                self.outfile.write("    WAIT UNTIL LOCALTIME \"" + hour + ":" + minute + " AM\"\n")
-            else:
-                hour = str(int(hour) - 12);
-                self.outfile.write("    WAIT UNTIL LOCALTIME \"" + hour + ":" + minute + " PM\"\n")
+        self.write_start_time(hour, minute)
+
+    def write_start_time(self, hour, minute) -> None:
+        self.outfile.write("SEQUENCE\n")
+        if hour is None:
+            return
+        if int(minute) < 10:
+            minute = "0" + minute
+        if int(hour) < 12:
+            self.outfile.write("    WAIT UNTIL LOCALTIME \"" + hour + ":" + minute + " AM\"\n")
+        else:
+            hour = str(int(hour) - 12);
+            self.outfile.write("    WAIT UNTIL LOCALTIME \"" + hour + ":" + minute + " PM\"\n")
                 
     def unpark(self) -> None:
+        self.start_cooler()
         self.outfile.write("    DELAY 1\n")
         self.outfile.write("    MOUNT UNPARK\n")
         self.outfile.write("    MOUNT UNPARK\n")
     
+    def start_cooler(self) -> None:
+        #Begin the ramp without waiting, cool_down() waits for whatever is left before the lights
+        if int(self.temperature) == 100 or self.cooler_temp == self.temperature:
+            return
+        self.outfile.write("    COOL DOWN TO " + self.temperature + " RATE " + str(COOLER_RATE[self.telescope_type]) + " TOLERANCE " + str(COOLER_START_TOLERANCE) + "\n")
+        self.cooler_temp = self.temperature
+
+    def cool_down(self) -> None:
+        #Later targets at the same setpoint find the cooler already there
+        if int(self.temperature) == 100 or self.cooler_settled == self.temperature:
+            return
+        self.outfile.write("    COOL DOWN TO " + self.temperature + " RATE " + str(COOLER_RATE[self.telescope_type]) + " TOLERANCE 1\n")
+        self.cooler_temp = self.temperature
+        self.cooler_settled = self.temperature
+
     def set_temp(self) -> None:
         #Set cooler temperature
         self.temperature = input("Set cooler temp C (100 to disable)\n")
@@ -193,7 +257,74 @@ class Session:
         self.plate_exposure_time = PLATE_EXPOSURE[self.telescope_type][self.filter_type]
         self.timediv = TIMEDIV[self.telescope_type][self.filter_type]
         self.dither = DITHER[self.telescope_type][self.filter_type]
+        if self.dithers_per_hour is not None:
+            self.dither = ssp_budget.dither_interval(RIG, self.filter_type.name, self.dithers_per_hour, self.settle.delay(Operation.DITHER))
+
+    def capture_budget(self, filters, frame_duration, autofocus=False) -> ssp_budget.CaptureBudget:
+        #Frame counts for the current filter settings and dither cadence
+        if self.dithers_per_hour is None:
+            return ssp_budget.budget(RIG, filters, float(frame_duration), autofocus)
+        return ssp_budget.budget(RIG, filters, float(frame_duration), autofocus, self.dither, self.settle.delay(Operation.DITHER))
         
+    def delay(self, operation, units=0) -> None:
+        #Wait the settle time of the operation, skipped entirely when nothing needs to settle
+        seconds = self.settle.delay(operation, units)
+        if seconds > 0:
+            self.outfile.write("    DELAY " + str(seconds) + "\n")
+
+    def goto(self, coords, distance=None) -> None:
+        #distance overrides the slew worked out from the coordinates, for a meridian flip
+        self.outfile.write("    MOUNT GOTO \"" + coords[0] + " " + coords[1] + " " + coords[2] + ", " + coords[3] + " " + coords[4] + " " + coords[5] + "\"\n")
+        self.delay(Operation.GOTO, slew_distance(self.mount_coords, coords) if distance is None else distance)
+        self.mount_coords = coords
+
+    def wheel_move(self, slot) -> None:
+        self.outfile.write("    WHEEL MOVE TO " + str(slot) + "\n")
+        self.delay(Operation.WHEEL, wheel_distance(self.wheel_slot, slot, WHEEL_SLOTS))
+        self.wheel_slot = slot
+
+    def capture(self, coords, frame_qty) -> None:
+        #Lights inside the open PRESERVE, split around a meridian flip when ssp_plan expects one
+        number = self.captures
+        self.captures += 1
+        if self.meridian_flip is None or self.meridian_flip[0] != number:
+            self.outfile.write("        CAPTURE " + str(frame_qty) + " FRAMES REQUIREGUIDING True\n")
+            return
+        _, before, frame_seconds = self.meridian_flip
+        if before > 0:
+            self.outfile.write("        CAPTURE " + str(before) + " FRAMES REQUIREGUIDING True\n")
+        self.outfile.write("        GUIDING DITHER EVERY STOP\n")
+        self.outfile.write("    END PRESERVE\n")
+        outfile = self.outfile
+        self.outfile = io.StringIO()
+        try:
+            self.flip(coords)
+            flip_text = self.outfile.getvalue()
+        finally:
+            self.outfile = outfile
+        self.outfile.write(flip_text)
+        self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
+        self.outfile.write("        FRAMETYPE Light\n")
+        self.outfile.write("        GUIDING DITHER EVERY " + str(self.dither) + " FRAMES\n")
+        frame_qty = ssp_meridian.frames_after(frame_qty, before, flip_text, frame_seconds)
+        self.outfile.write("        CAPTURE " + str(frame_qty) + " FRAMES REQUIREGUIDING True\n")
+
+    def flip(self, coords) -> None:
+        #Wait for the target to clear the meridian, GOTO so the mount flips, solve and guide again
+        self.outfile.write("    GUIDING STOP\n")
+        self.delay(Operation.GUIDE_STOP)
+        self.outfile.write("    DELAY " + str(ssp_meridian.FLIP_WAIT) + "\n")
+        self.goto(coords, ssp_meridian.FLIP_SLEW)
+        self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
+        self.outfile.write("        SET EXPOSURE TO " + str(self.plate_exposure_time) + "\n")
+        self.outfile.write("        SET GAIN TO 100\n")
+        self.outfile.write("        MOUNT SOLVEANDSYNC\n")
+        self.outfile.write("    END PRESERVE\n")
+        self.delay(Operation.SOLVE)
+        self.goto(coords)
+        self.outfile.write("    GUIDING START\n")
+        self.delay(Operation.GUIDE_START)
+
     def preset(self) -> None:
         if self.filter_type in [Filters.UVIR, Filters.LENHANCE, Filters.LPRO]:
             preset_val = Presets.C6H_OSC
@@ -202,6 +333,31 @@ class Session:
         self.outfile.write(f"    LOAD PROFILE \"{preset_val.value}\"\n")
 
     def create_target(self) -> None:
+        #Configure target
+        if input("Lookup catalog target? (y/n)\n") == 'y':
+            coords_catalog()
+        else:
+            coords_direct()
+
+        #Set target name
+        if(catalog_used):
+            target_name = catalog_search
+        else:
+            target_name = input("Enter target name\n")
+
+        frame_duration = input("Enter number of hours to capture data\n")
+        self.write_target(target_name, (ra_h, ra_m, ra_s, dec_d, dec_m, dec_s), frame_duration)
+
+    def write_plan_target(self, target_name, filter_name, coords, frame_duration, rough_focus=-1) -> None:
+        #Non interactive entry point used by ssp_plan, C6H has no autofocuser
+        self.filter_type = Filters[filter_name]
+        self.calc_capture_vals()
+        self.write_target(target_name, coords, frame_duration)
+
+    def write_target(self, target_name, coords, frame_duration) -> None:
+        self.captures = 0
+        ra_h, ra_m, ra_s, dec_d, dec_m, dec_s = coords
+
         #Setup
         self.outfile.write("    DELAY 1\n")
         self.outfile.write("    STILL MODE\n")
@@ -214,18 +370,7 @@ class Session:
             
         self.outfile.write("    MOUNT CONNECT\n")
         
-        #Configure target
-        if input("Lookup catalog target? (y/n)\n") == 'y':
-            coords_catalog()
-        else:
-            coords_direct()
-
         #Set target name
-        if(catalog_used):
-            target_name = catalog_search
-        else:
-            target_name = input("Enter target name\n")
-        
         if self.filter_type in [Filters.UVIR]:
             self.outfile.write("    TARGETNAME \"" + target_name + "_uvir\"\n")
         elif self.filter_type in [Filters.LPRO]:
@@ -240,41 +385,38 @@ class Session:
             self.outfile.write("    TARGETNAME \"" + target_name + "\"\n")
             
         #Platesolve and correct position
-        self.outfile.write("    MOUNT GOTO \"" + ra_h + " " + ra_m + " " + ra_s + ", " + dec_d + " " + dec_m + " " + dec_s + "\"\n")
-        self.outfile.write("    DELAY 10\n")
+        self.goto((ra_h, ra_m, ra_s, dec_d, dec_m, dec_s))
         self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
         self.outfile.write("        SET EXPOSURE TO " + str(self.plate_exposure_time) + "\n")
         self.outfile.write("        SET GAIN TO 100\n")
         self.outfile.write("        MOUNT SOLVEANDSYNC\n")
         self.outfile.write("    END PRESERVE\n")
-        self.outfile.write("    DELAY 10\n")
+        self.delay(Operation.SOLVE)
         
         #Set guiding
         self.outfile.write("    GUIDING CONNECT ABORT False\n")
         self.outfile.write("    GUIDING STOP\n")
-        self.outfile.write("    DELAY 5\n")
+        self.delay(Operation.GUIDE_STOP)
         self.outfile.write("    GUIDING START\n")
-        self.outfile.write("    DELAY 10\n")
+        self.delay(Operation.GUIDE_START)
         
         #Set cooler temperature
-        if int(self.temperature) != 100:
-            self.outfile.write("    COOL DOWN TO " + self.temperature + " RATE 8 TOLERANCE 1\n")
+        self.cool_down()
         
         #Set exposure
         self.outfile.write("    SET EXPOSURE TO " + str(self.exposure_time) + "\n")
         
-        #Set frame capture
-        self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
-        self.outfile.write("        FRAMETYPE Light\n")
-        self.outfile.write("        GUIDING DITHER EVERY " + str(self.dither) + " FRAMES\n")
-        frame_duration = input("Enter number of hours to capture data\n")
-        frame_qty = (float(frame_duration) * 3600) / self.timediv
-        frame_qty = math.floor(frame_qty)
-            
-        frame_qty_s = str(frame_qty)
-        self.outfile.write("        CAPTURE " + frame_qty_s + " FRAMES REQUIREGUIDING True\n")
-        self.outfile.write("        GUIDING DITHER EVERY STOP\n")
-        self.outfile.write("    END PRESERVE\n")
+        #Set frame capture, none at all when the time doesn't fit a single frame
+        frame_qty = self.capture_budget((self.filter_type.name,), frame_duration).frames_for(self.filter_type.name)
+        if frame_qty == 0:
+            print("No frames fit in " + str(frame_duration) + " hours for " + target_name + ", skipping its capture\n")
+        else:
+            self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
+            self.outfile.write("        FRAMETYPE Light\n")
+            self.outfile.write("        GUIDING DITHER EVERY " + str(self.dither) + " FRAMES\n")
+            self.capture(coords, frame_qty)
+            self.outfile.write("        GUIDING DITHER EVERY STOP\n")
+            self.outfile.write("    END PRESERVE\n")
         self.outfile.write("    GUIDING STOP\n")
         self.outfile.write("    GUIDING DISCONNECT\n\n")
         
@@ -284,13 +426,18 @@ class Session:
         if int(self.temperature) != 100:
             self.outfile.write("    SET COOLER OFF\n")
         self.outfile.write("END SEQUENCE\n")
-        self.outfile.close()
+        with ssp_profile.stage("file_flush"):
+            self.outfile.close()
+
+def open_session(outfile) -> Session:
+    return Session(outfile, 100, Filters.UVIR, Telescope.C6_HYPER, 0, 0, 0, 0)
 
-def main() -> None:
-    if len(sys.argv) != 1:
-        print('Formatting error!')
-        print('Example: sharp_sequence_parser.py')
-        quit()
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a sharpcap sequence for the C6 Hyperstar rig")
+    ssp_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+    ssp_profile.check_arguments(parser, args)
+    ssp_profile.start_from_args(args)
 
     #Prompt for filename and create file
     filename = ""
@@ -298,7 +445,7 @@ def main() -> None:
     filename += ".scs"
     fileout = open(filename, "w+")
 
-    session = Session(fileout, 100, Filters.UVIR, Telescope.C6_HYPER, 0, 0, 0, 0)
+    session = open_session(fileout)
 
     session.start_time()
     
@@ -312,13 +459,18 @@ def main() -> None:
     
     session.unpark()
 
-    session.create_target()
+    with ssp_profile.stage("target_emission"):
+        session.create_target()
 
     #Insert additional targets
     while input("Enter additional target? (y/n)") == 'y':
-        session.create_target()
+        with ssp_profile.stage("target_emission"):
+            session.create_target()
 
     session.shutdown()
+    with ssp_profile.stage("manifest"):
+        ssp_manifest.write_manifest(filename, RIG)
+    ssp_profile.finish_from_args(args)
 
     print("Sequence file generated!\n")
 
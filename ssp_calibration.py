@@ -0,0 +1,183 @@
+# Calibration planner for the sharpcap sequencer
+#
+# Scans generated .scs files (or directories of them) for the light frame settings they use
+# and writes one deduplicated calibration sequence with flat, dark and bias blocks.
+#   ssp_calibration.py calibration.scs _save "Original Samples"
+#
+# Flats are grouped per (temperature, camera settings, filter), darks per (temperature,
+# camera settings, exposure) and bias per (temperature, camera settings). Flats run first with
+# temperatures warmest to coldest, darks and bias follow coldest to warmest, so the cooler only
+# walks the temperature range twice and the wheel sweeps its slots in one direction at a time.
+# Bias frames set their own shortest exposure rather than keeping the last dark's.
+
+import argparse
+
+import ssp_scs
+from ssp_scs import format_number
+
+class CaptureSet:
+    def __init__(self, exposure, temperature, cool_rate, gain, profile, colour_space, wheel_slot):
+        self.exposure = exposure
+        self.temperature = temperature
+        self.cool_rate = cool_rate
+        self.gain = gain
+        self.profile = profile
+        self.colour_space = colour_space
+        self.wheel_slot = wheel_slot
+
+    def camera(self) -> tuple:
+        return (self.profile, self.colour_space, self.gain)
+
+def light_sets(commands) -> list:
+    sets = []
+    for command, state in ssp_scs.walk(commands):
+        if command.keyword != "CAPTURE" or state.frame_type.lower() != "light":
+            continue
+        sets.append(CaptureSet(
+            state.exposure, state.temperature, state.cool_rate, state.gain,
+            state.profile, state.colour_space, state.wheel_slot
+        ))
+    return sets
+
+def scan_light_sets(paths) -> list:
+    sets = []
+    for path in ssp_scs.sequence_files(paths):
+        sets += light_sets(ssp_scs.read_sequence(path))
+    return sets
+
+def temperature_order(temperature) -> float:
+    #Uncooled captures sort as the warmest
+    if temperature is None:
+        return float("inf")
+    return temperature
+
+def camera_order(camera) -> tuple:
+    return tuple("" if value is None else str(value) for value in camera)
+
+class CalibrationPlan:
+    def __init__(self, sets):
+        self.rates = {}
+        self.flats = {}
+        self.darks = {}
+        self.bias = set()
+        for capture in sets:
+            if capture.temperature is not None and capture.temperature not in self.rates:
+                self.rates[capture.temperature] = capture.cool_rate
+            camera = capture.camera()
+            self.flats.setdefault((capture.temperature, camera), set()).add(capture.wheel_slot)
+            if capture.exposure is not None:
+                self.darks.setdefault((capture.temperature, camera), set()).add(capture.exposure)
+            self.bias.add((capture.temperature, camera))
+
+    def temperatures(self) -> list:
+        return sorted(set(key[0] for key in self.flats), key=temperature_order, reverse=True)
+
+class CalibrationWriter:
+    def __init__(self, outfile, flat_exposure, flat_frames, dark_frames, bias_frames, bias_exposure=0.001):
+        self.outfile = outfile
+        self.flat_exposure = flat_exposure
+        self.bias_exposure = bias_exposure
+        self.flat_frames = flat_frames
+        self.dark_frames = dark_frames
+        self.bias_frames = bias_frames
+        self.temperature = None
+        self.camera = None
+        self.wheel_slot = None
+
+    def cool(self, temperature, rate) -> None:
+        if temperature == self.temperature:
+            return
+        if temperature is None:
+            self.outfile.write("    SET COOLER OFF\n")
+            self.temperature = None
+            return
+        if rate is None:
+            rate = 25
+        self.outfile.write("    COOL DOWN TO " + format_number(temperature) + " RATE " + format_number(rate) + " TOLERANCE 1\n")
+        self.temperature = temperature
+
+    def set_camera(self, camera) -> None:
+        if camera == self.camera:
+            return
+        profile, colour_space, gain = camera
+        if profile is not None:
+            self.outfile.write("    LOAD PROFILE \"" + profile + "\"\n")
+        if colour_space is not None:
+            self.outfile.write("    SET COLOUR SPACE TO " + colour_space + "\n")
+        self.camera = camera
+
+    def capture(self, frame_type, exposure, gain, frames) -> None:
+        self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
+        self.outfile.write("        FRAMETYPE " + frame_type + "\n")
+        if exposure is not None:
+            self.outfile.write("        SET EXPOSURE TO " + format_number(exposure) + "\n")
+        if gain is not None:
+            self.outfile.write("        SET GAIN TO " + format_number(gain) + "\n")
+        self.outfile.write("        CAPTURE " + str(frames) + " FRAMES\n")
+        self.outfile.write("    END PRESERVE\n")
+
+    def write(self, plan) -> None:
+        self.outfile.write("SEQUENCE\n")
+        self.outfile.write("    STILL MODE\n")
+        self.outfile.write("    SET OUTPUT FORMAT TO \"FITS files (*.fits)\"\n")
+
+        temperatures = plan.temperatures()
+        ascending = True
+
+        #Flats, light panel on, wheel sweeps alternate directions per group
+        for temperature in temperatures:
+            self.cool(temperature, plan.rates.get(temperature))
+            for key in sorted([key for key in plan.flats if key[0] == temperature], key=lambda key: camera_order(key[1])):
+                self.set_camera(key[1])
+                slots = sorted(slot for slot in plan.flats[key] if slot is not None)
+                if not ascending:
+                    slots.reverse()
+                ascending = not ascending
+                if len(slots) == 0:
+                    slots = [None]
+                for slot in slots:
+                    if slot is not None and slot != self.wheel_slot:
+                        self.outfile.write("    WHEEL MOVE TO " + str(slot) + "\n")
+                        self.wheel_slot = slot
+                    self.capture("Flat", self.flat_exposure, key[1][2], self.flat_frames)
+
+        #Darks and bias, cap on, walking the temperatures back the other way
+        for temperature in reversed(temperatures):
+            self.cool(temperature, plan.rates.get(temperature))
+            for key in sorted([key for key in plan.bias if key[0] == temperature], key=lambda key: camera_order(key[1])):
+                self.set_camera(key[1])
+                for exposure in sorted(plan.darks.get(key, [])):
+                    self.capture("Dark", exposure, key[1][2], self.dark_frames)
+                self.capture("Bias", self.bias_exposure, key[1][2], self.bias_frames)
+
+        if self.temperature is not None:
+            self.outfile.write("    SET COOLER OFF\n")
+        self.outfile.write("END SEQUENCE\n")
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Build a calibration sequence matching the lights in .scs files")
+    parser.add_argument("output", help="calibration sequence to write (.scs is added if missing)")
+    parser.add_argument("inputs", nargs="+", help=".scs files or directories to scan")
+    parser.add_argument("--flat-exposure", type=float, default=1)
+    parser.add_argument("--flat-frames", type=int, default=30)
+    parser.add_argument("--dark-frames", type=int, default=30)
+    parser.add_argument("--bias-frames", type=int, default=50)
+    parser.add_argument("--bias-exposure", type=float, default=0.001, help="bias exposure in seconds, the camera's shortest")
+    args = parser.parse_args(argv)
+
+    sets = scan_light_sets(args.inputs)
+    if len(sets) == 0:
+        print("No light frames found\n")
+        quit()
+
+    filename = args.output
+    if not filename.endswith(".scs"):
+        filename += ".scs"
+    with open(filename, "w") as fileout:
+        writer = CalibrationWriter(fileout, args.flat_exposure, args.flat_frames, args.dark_frames, args.bias_frames, args.bias_exposure)
+        writer.write(CalibrationPlan(sets))
+
+    print("Calibration sequence generated!\n")
+
+if __name__ == "__main__":
+    main()
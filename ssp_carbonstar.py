@@ -1,13 +1,17 @@
 # Parser for the sharpcap sequencer
 # Designed for an Minicam8M mounted to a Carbonstar 150
 
-import sys
-import math
+import io
+import argparse
 from enum import Enum
-from enum import auto
-import csv
 from pathlib import Path
-from typing import Optional
+
+import ssp_profile
+import ssp_budget
+import ssp_manifest
+import ssp_meridian
+import ssp_catalog
+from ssp_settle import Operation, load_settle_model, slew_distance, wheel_distance
 
 class Telescope(Enum):
     CARBON = 2
@@ -91,6 +95,45 @@ DITHER = {
     Telescope.CARBON: DITHER_CARBON
 }
 
+# Settle delay after each operation (seconds), used when the rig has no settle calibration
+# The dither entry is the settle time already counted in TIMEDIV
+SETTLE_CARBON = {
+    Operation.GOTO: 10,
+    Operation.WHEEL: 10,
+    Operation.SOLVE: 10,
+    Operation.GUIDE_STOP: 5,
+    Operation.GUIDE_START: 10,
+    Operation.DITHER: 10
+}
+SETTLE = {
+    Telescope.CARBON: SETTLE_CARBON
+}
+
+# Cooler ramp rate (degrees per minute), the fastest the camera is cooled
+COOLER_RATE = {
+    Telescope.CARBON: 25
+}
+# Tolerance of the cooldown started at unpark, wide enough that SharpCap moves straight on
+# while the cooler ramps through the slew and solves
+COOLER_START_TOLERANCE = 50
+
+RIG = "carbonstar"
+RIG_TELESCOPE = Telescope.CARBON
+WHEEL_SLOTS = 8
+#Filters captured in turn for an RGB target
+RGB_FILTERS = ("RED", "GREEN", "BLUE")
+
+# Filters for plan targets with filter AUTO, broadband under a dark sky and narrowband when
+# the Moon is bright and close (see ssp_moon.py)
+DARK_FILTER = Filters.RGB
+MOON_FILTER = Filters.HA
+
+# Field of view of the imaging camera (width, height) in arcmin, for sharing targets between
+# rigs by how well each one frames them (see ssp_multirig.py)
+FIELD_OF_VIEW = {
+    Telescope.CARBON: (58, 44)
+}
+
 rgb_flag = False
 ra_h = ""
 ra_m = ""
@@ -133,37 +176,25 @@ def coords_catalog() -> None:
     
     #Show users the available catalogs
     print("Available catalogs:\n")
-    with list_catalog.open("r", encoding="utf-8") as f:
-        contents = f.read()
-    print(contents)
+    print(ssp_catalog.available_catalogs(list_catalog))
     
     catalog_search = input("\nEnter catalog name (Ex. m101):\n")
     
     try:
-        with master_catalog.open(mode="r", encoding="utf-8", newline="") as f:
-            reader = csv.reader(f)
-
-            for row in reader:
-                # Skip empty or short rows
-                if len(row) < 7:
-                    continue
-
-                if row[0] == catalog_search:
-                    ra_h = row[1]
-                    ra_m = row[2]
-                    ra_s = row[3]
-                    dec_d = row[4]
-                    dec_m = row[5]
-                    dec_s = row[6]
-                    catalog_used = True
-                    return
-            #If you got here, then the item wasn't found
-            print("Catalog object not found, please enter in coordinates manually\n")
-            coords_direct()
-
+        coords = ssp_catalog.find(catalog_search, master_catalog)
     except FileNotFoundError:
         print("Catalog file not found, please enter in coordinates manually\n")
         coords_direct()
+        return
+
+    if coords is None:
+        #If you got here, then the item wasn't found
+        print("Catalog object not found, please enter in coordinates manually\n")
+        coords_direct()
+        return
+
+    ra_h, ra_m, ra_s, dec_d, dec_m, dec_s = coords
+    catalog_used = True
 
 class Session:
     def __init__(
@@ -177,28 +208,63 @@ class Session:
         self.timediv = timediv
         self.dither = dither
         self.plate_exposure_time = plate_exposure_time
+        with ssp_profile.stage("settle_load"):
+            self.settle = load_settle_model(RIG, SETTLE[telescope_type])
+        self.mount_coords = None
+        self.wheel_slot = None
+        #Cooler setpoint last sent, and the setpoint a COOL DOWN has already waited for
+        self.cooler_temp = None
+        self.cooler_settled = None
+        #Dithers per hour to aim for, None keeps the DITHER table
+        self.dithers_per_hour = None
+        #(capture number, frames before the flip, seconds per frame) when ssp_plan expects a
+        #capture of the next target to cross the meridian, and the captures written so far
+        self.meridian_flip = None
+        self.captures = 0
         self.rough_focus = rough_focus
     
     def start_time(self) -> None:
         #Set start time
-        self.outfile.write("SEQUENCE\n")
-    
+        hour = None
+        minute = None
         if input("Set a start time? (y/n)\n") == 'y':
             hour = input("Enter hour start (24h)\n")
             minute = input("Enter minute start\n")
-            if int(minute) < 10:
-                minute = "0" + minute
-            if int(hour) < 12:
-                self.outfile.write("    WAIT UNTIL LOCALTIME \"" + hour + ":" + minute + " AM\"\n")
-            else:
-                hour = str(int(hour) - 12);
-                self.outfile.write("    WAIT UNTIL LOCALTIME \"" + hour + ":" + minute + " PM\"\n")
+        self.write_start_time(hour, minute)
+
+    def write_start_time(self, hour, minute) -> None:
+        self.outfile.write("SEQUENCE\n")
+        if hour is None:
+            return
+        if int(minute) < 10:
+            minute = "0" + minute
+        if int(hour) < 12:
+            self.outfile.write("    WAIT UNTIL LOCALTIME \"" + hour + ":" + minute + " AM\"\n")
+        else:
+            hour = str(int(hour) - 12);
+            self.outfile.write("    WAIT UNTIL LOCALTIME \"" + hour + ":" + minute + " PM\"\n")
                 
     def unpark(self) -> None:
+        self.start_cooler()
         self.outfile.write("    DELAY 1\n")
         self.outfile.write("    MOUNT UNPARK\n")
         self.outfile.write("    MOUNT UNPARK\n")
     
+    def start_cooler(self) -> None:
+        #Begin the ramp without waiting, cool_down() waits for whatever is left before the lights
+        if int(self.temperature) == 100 or self.cooler_temp == self.temperature:
+            return
+        self.outfile.write("    COOL DOWN TO " + self.temperature + " RATE " + str(COOLER_RATE[self.telescope_type]) + " TOLERANCE " + str(COOLER_START_TOLERANCE) + "\n")
+        self.cooler_temp = self.temperature
+
+    def cool_down(self) -> None:
+        #Later targets at the same setpoint find the cooler already there
+        if int(self.temperature) == 100 or self.cooler_settled == self.temperature:
+            return
+        self.outfile.write("    COOL DOWN TO " + self.temperature + " RATE " + str(COOLER_RATE[self.telescope_type]) + " TOLERANCE 1\n")
+        self.cooler_temp = self.temperature
+        self.cooler_settled = self.temperature
+
     def set_temp(self) -> None:
         #Set cooler temperature
         self.temperature = input("Set cooler temp C (100 to disable)\n")
@@ -220,33 +286,89 @@ class Session:
         self.plate_exposure_time = PLATE_EXPOSURE[self.telescope_type][self.filter_type]
         self.timediv = TIMEDIV[self.telescope_type][self.filter_type]
         self.dither = DITHER[self.telescope_type][self.filter_type]
+        if self.dithers_per_hour is not None:
+            self.dither = ssp_budget.dither_interval(RIG, self.filter_type.name, self.dithers_per_hour, self.settle.delay(Operation.DITHER))
+
+    def capture_budget(self, filters, frame_duration, autofocus=False) -> ssp_budget.CaptureBudget:
+        #Frame counts for the current filter settings and dither cadence
+        if self.dithers_per_hour is None:
+            return ssp_budget.budget(RIG, filters, float(frame_duration), autofocus)
+        return ssp_budget.budget(RIG, filters, float(frame_duration), autofocus, self.dither, self.settle.delay(Operation.DITHER))
         
+    def delay(self, operation, units=0) -> None:
+        #Wait the settle time of the operation, skipped entirely when nothing needs to settle
+        seconds = self.settle.delay(operation, units)
+        if seconds > 0:
+            self.outfile.write("    DELAY " + str(seconds) + "\n")
+
+    def goto(self, coords, distance=None) -> None:
+        #distance overrides the slew worked out from the coordinates, for a meridian flip
+        self.outfile.write("    MOUNT GOTO \"" + coords[0] + " " + coords[1] + " " + coords[2] + ", " + coords[3] + " " + coords[4] + " " + coords[5] + "\"\n")
+        self.delay(Operation.GOTO, slew_distance(self.mount_coords, coords) if distance is None else distance)
+        self.mount_coords = coords
+
+    def wheel_move(self, slot) -> None:
+        self.outfile.write("    WHEEL MOVE TO " + str(slot) + "\n")
+        self.delay(Operation.WHEEL, wheel_distance(self.wheel_slot, slot, WHEEL_SLOTS))
+        self.wheel_slot = slot
+
+    def capture(self, coords, frame_qty) -> None:
+        #Lights inside the open PRESERVE, split around a meridian flip when ssp_plan expects one
+        number = self.captures
+        self.captures += 1
+        if self.meridian_flip is None or self.meridian_flip[0] != number:
+            self.outfile.write("        CAPTURE " + str(frame_qty) + " FRAMES REQUIREGUIDING True\n")
+            return
+        _, before, frame_seconds = self.meridian_flip
+        if before > 0:
+            self.outfile.write("        CAPTURE " + str(before) + " FRAMES REQUIREGUIDING True\n")
+        self.outfile.write("        GUIDING DITHER EVERY STOP\n")
+        self.outfile.write("    END PRESERVE\n")
+        outfile = self.outfile
+        self.outfile = io.StringIO()
+        try:
+            self.flip(coords)
+            flip_text = self.outfile.getvalue()
+        finally:
+            self.outfile = outfile
+        self.outfile.write(flip_text)
+        self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
+        self.outfile.write("        FRAMETYPE Light\n")
+        self.outfile.write("        GUIDING DITHER EVERY " + str(self.dither) + " FRAMES\n")
+        frame_qty = ssp_meridian.frames_after(frame_qty, before, flip_text, frame_seconds)
+        self.outfile.write("        CAPTURE " + str(frame_qty) + " FRAMES REQUIREGUIDING True\n")
+
+    def flip(self, coords) -> None:
+        #Wait for the target to clear the meridian, GOTO so the mount flips, solve and guide again
+        self.outfile.write("    GUIDING STOP\n")
+        self.delay(Operation.GUIDE_STOP)
+        self.outfile.write("    DELAY " + str(ssp_meridian.FLIP_WAIT) + "\n")
+        slot = self.wheel_slot
+        self.wheel_move(1)
+        self.goto(coords, ssp_meridian.FLIP_SLEW)
+        self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
+        self.outfile.write("        SET EXPOSURE TO 2\n")
+        self.outfile.write("        SET GAIN TO 100\n")
+        self.outfile.write("        MOUNT SOLVEANDSYNC\n")
+        self.outfile.write("    END PRESERVE\n")
+        self.delay(Operation.SOLVE)
+        self.goto(coords)
+        self.wheel_move(slot)
+        self.outfile.write("    GUIDING START\n")
+        self.delay(Operation.GUIDE_START)
+
     def preset(self) -> None:
         if self.filter_type in [Filters.LUMINANCE, Filters.RED, Filters.GREEN, Filters.BLUE]:
             preset_val = Presets.CARBON_LRGB
         else:
             preset_val = Presets.CARBON_NB
-        self.outfile.write(f"    LOAD PROFILE {preset_val.value}\n")
+        self.outfile.write(f"    LOAD PROFILE \"{preset_val.value}\"\n")
         
     def autofocus(self) -> None:
         #Set rough target focus point
         self.rough_focus = int(input("Set autofocuser rough focal point (Set to -1 to disable):\n"))
 
     def create_target(self) -> None:
-        frame_subtraction = 0
-        
-        #Setup
-        self.outfile.write("    DELAY 1\n")
-        self.outfile.write("    STILL MODE\n")
-
-        #Configure image formatting
-        self.outfile.write("    SET COLOUR SPACE TO MONO16\n")
-        self.outfile.write("    SET OUTPUT FORMAT TO \"FITS files (*.fits)\"\n")
-        
-        self.preset()
-            
-        self.outfile.write("    MOUNT CONNECT\n")
-        
         #Configure autofocus
         self.autofocus()
 
@@ -261,7 +383,37 @@ class Session:
             target_name = catalog_search
         else:
             target_name = input("Enter target name\n")
+
+        frame_duration = input("Enter number of hours to capture data\n")
+        self.write_target(target_name, (ra_h, ra_m, ra_s, dec_d, dec_m, dec_s), frame_duration)
+
+    def write_plan_target(self, target_name, filter_name, coords, frame_duration, rough_focus=-1) -> None:
+        #Non interactive entry point used by ssp_plan
+        self.filter_type = Filters[filter_name]
+        self.calc_capture_vals()
+        self.rough_focus = rough_focus
+        if self.filter_type in [Filters.RGB]:
+            self.write_rgb_target(target_name, coords, frame_duration)
+        else:
+            self.write_target(target_name, coords, frame_duration)
+
+    def write_target(self, target_name, coords, frame_duration) -> None:
+        self.captures = 0
+        ra_h, ra_m, ra_s, dec_d, dec_m, dec_s = coords
+
+        #Setup
+        self.outfile.write("    DELAY 1\n")
+        self.outfile.write("    STILL MODE\n")
+
+        #Configure image formatting
+        self.outfile.write("    SET COLOUR SPACE TO MONO16\n")
+        self.outfile.write("    SET OUTPUT FORMAT TO \"FITS files (*.fits)\"\n")
         
+        self.preset()
+            
+        self.outfile.write("    MOUNT CONNECT\n")
+
+        #Set target name
         if self.filter_type in [Filters.LUMINANCE]:
             self.outfile.write("    TARGETNAME \"" + target_name + "_l\"\n")
         elif self.filter_type in [Filters.RED]:
@@ -285,93 +437,69 @@ class Session:
             dec_d_offset = dec_d_offset - 3
         else:
             dec_d_offset = dec_d_offset + 3
-        self.outfile.write("    WHEEL MOVE TO 1\n")
-        self.outfile.write("    DELAY 10\n")
-        self.outfile.write("    MOUNT GOTO \"" + ra_h + " " + ra_m + " " + ra_s + ", " + str(dec_d_offset) + " " + dec_m + " " + dec_s + "\"\n")
-        self.outfile.write("    DELAY 10\n")
+        self.wheel_move(1)
+        self.goto((ra_h, ra_m, ra_s, str(dec_d_offset), dec_m, dec_s))
         self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
         self.outfile.write("        SET EXPOSURE TO 2\n")
         self.outfile.write("        SET GAIN TO 100\n")
         self.outfile.write("        MOUNT SOLVEANDSYNC\n")
         self.outfile.write("    END PRESERVE\n")
-        self.outfile.write("    DELAY 10\n")
+        self.delay(Operation.SOLVE)
 
         #Platesolve and correct position twice
-        self.outfile.write("    WHEEL MOVE TO 1\n")
-        self.outfile.write("    DELAY 10\n")
-        self.outfile.write("    MOUNT GOTO \"" + ra_h + " " + ra_m + " " + ra_s + ", " + dec_d + " " + dec_m + " " + dec_s + "\"\n")
-        self.outfile.write("    DELAY 10\n")
+        self.wheel_move(1)
+        self.goto((ra_h, ra_m, ra_s, dec_d, dec_m, dec_s))
         self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
         self.outfile.write("        SET EXPOSURE TO 2\n")
         self.outfile.write("        SET GAIN TO 100\n")
         self.outfile.write("        MOUNT SOLVEANDSYNC\n")
         self.outfile.write("    END PRESERVE\n")
-        self.outfile.write("    DELAY 10\n")
-        self.outfile.write("    MOUNT GOTO \"" + ra_h + " " + ra_m + " " + ra_s + ", " + dec_d + " " + dec_m + " " + dec_s + "\"\n")
-        self.outfile.write("    DELAY 10\n")
+        self.delay(Operation.SOLVE)
+        self.goto((ra_h, ra_m, ra_s, dec_d, dec_m, dec_s))
         self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
         self.outfile.write("        SET EXPOSURE TO 2\n")
         self.outfile.write("        SET GAIN TO 100\n")
         self.outfile.write("        MOUNT SOLVEANDSYNC\n")
         self.outfile.write("    END PRESERVE\n")
-        self.outfile.write("    DELAY 10\n")
+        self.delay(Operation.SOLVE)
         
         #Autofocus
         if(self.rough_focus != -1):
             self.outfile.write("    SET EXPOSURE TO 4\n")
             self.outfile.write("    AUTOFOCUS FROM " + str(self.rough_focus - 100) + " TO " + str(self.rough_focus + 100) + " STEP COUNT 21\n")
-            #Remove 12 minutes from frame time for autofocus
-            frame_subtraction = 1440 / self.exposure_time
+            #ssp_budget removes the autofocus time from the frame count
         
         #Set filter
-        self.outfile.write("    WHEEL MOVE TO " + str(self.filter_type.value) + "\n")
-        self.outfile.write("    DELAY 10\n")
+        self.wheel_move(self.filter_type.value)
 
         #Set guiding
         self.outfile.write("    GUIDING CONNECT ABORT False\n")
         self.outfile.write("    GUIDING STOP\n")
-        self.outfile.write("    DELAY 5\n")
+        self.delay(Operation.GUIDE_STOP)
         self.outfile.write("    GUIDING START\n")
-        self.outfile.write("    DELAY 10\n")
+        self.delay(Operation.GUIDE_START)
         
         #Set cooler temperature
-        if int(self.temperature) != 100:
-            self.outfile.write("    COOL DOWN TO " + self.temperature + " RATE 25 TOLERANCE 1\n")
+        self.cool_down()
             
         #Set exposure
         self.outfile.write("    SET EXPOSURE TO " + str(self.exposure_time) + "\n")
         
-        #Set frame capture
-        self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
-        self.outfile.write("        FRAMETYPE Light\n")
-        self.outfile.write("        GUIDING DITHER EVERY " + str(self.dither) + " FRAMES\n")
-        frame_duration = input("Enter number of hours to capture data\n")
-        frame_qty = (float(frame_duration) * 3600) / self.timediv
-        frame_qty = frame_qty - frame_subtraction
-        frame_qty = math.floor(frame_qty)
-            
-        frame_qty_s = str(frame_qty)
-        self.outfile.write("        CAPTURE " + frame_qty_s + " FRAMES REQUIREGUIDING True\n")
-        self.outfile.write("        GUIDING DITHER EVERY STOP\n")
-        self.outfile.write("    END PRESERVE\n")
+        #Set frame capture, none at all when the time doesn't fit a single frame
+        frame_qty = self.capture_budget((self.filter_type.name,), frame_duration, self.rough_focus != -1).frames_for(self.filter_type.name)
+        if frame_qty == 0:
+            print("No frames fit in " + str(frame_duration) + " hours for " + target_name + ", skipping its capture\n")
+        else:
+            self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
+            self.outfile.write("        FRAMETYPE Light\n")
+            self.outfile.write("        GUIDING DITHER EVERY " + str(self.dither) + " FRAMES\n")
+            self.capture(coords, frame_qty)
+            self.outfile.write("        GUIDING DITHER EVERY STOP\n")
+            self.outfile.write("    END PRESERVE\n")
         self.outfile.write("    GUIDING STOP\n")
         self.outfile.write("    GUIDING DISCONNECT\n\n")
     
     def create_rgb_target(self) -> None:
-        frame_subtraction = 0
-        
-        #Setup
-        self.outfile.write("    DELAY 1\n")
-        self.outfile.write("    STILL MODE\n")
-
-        #Configure image formatting
-        self.outfile.write("    SET COLOUR SPACE TO MONO16\n")
-        self.outfile.write("    SET OUTPUT FORMAT TO \"FITS files (*.fits)\"\n")
-        
-        self.preset()
-            
-        self.outfile.write("    MOUNT CONNECT\n")
-        
         #Configure autofocus
         self.autofocus()
 
@@ -380,15 +508,35 @@ class Session:
             coords_catalog()
         else:
             coords_direct()
-        
-        # Image RED
 
         #Set target name
         if(catalog_used):
             target_name = catalog_search
         else:
             target_name = input("Enter RGB target name\n")
+
+        frame_duration = input("Enter number of hours to capture data\n")
+        self.write_rgb_target(target_name, (ra_h, ra_m, ra_s, dec_d, dec_m, dec_s), frame_duration)
+
+    def write_rgb_target(self, target_name, coords, frame_duration) -> None:
+        self.captures = 0
+        ra_h, ra_m, ra_s, dec_d, dec_m, dec_s = coords
+
+        #Setup
+        self.outfile.write("    DELAY 1\n")
+        self.outfile.write("    STILL MODE\n")
+
+        #Configure image formatting
+        self.outfile.write("    SET COLOUR SPACE TO MONO16\n")
+        self.outfile.write("    SET OUTPUT FORMAT TO \"FITS files (*.fits)\"\n")
         
+        self.preset()
+            
+        self.outfile.write("    MOUNT CONNECT\n")
+        
+        # Image RED
+
+        #Set target name
         self.outfile.write("    TARGETNAME \"" + target_name + "_r\"\n")
         
         #Slew and plate solve to a position 3 degrees off of target (Towards north, unless within 85 degrees) to get a rough platesolve
@@ -397,98 +545,85 @@ class Session:
             dec_d_offset = dec_d_offset - 3
         else:
             dec_d_offset = dec_d_offset + 3
-        self.outfile.write("    WHEEL MOVE TO 1\n")
-        self.outfile.write("    DELAY 10\n")
-        self.outfile.write("    MOUNT GOTO \"" + ra_h + " " + ra_m + " " + ra_s + ", " + str(dec_d_offset) + " " + dec_m + " " + dec_s + "\"\n")
-        self.outfile.write("    DELAY 10\n")
+        self.wheel_move(1)
+        self.goto((ra_h, ra_m, ra_s, str(dec_d_offset), dec_m, dec_s))
         self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
         self.outfile.write("        SET EXPOSURE TO 2\n")
         self.outfile.write("        SET GAIN TO 100\n")
         self.outfile.write("        MOUNT SOLVEANDSYNC\n")
         self.outfile.write("    END PRESERVE\n")
-        self.outfile.write("    DELAY 10\n")
+        self.delay(Operation.SOLVE)
 
         #Platesolve and correct position twice
-        self.outfile.write("    WHEEL MOVE TO 1\n")
-        self.outfile.write("    DELAY 10\n")
-        self.outfile.write("    MOUNT GOTO \"" + ra_h + " " + ra_m + " " + ra_s + ", " + dec_d + " " + dec_m + " " + dec_s + "\"\n")
-        self.outfile.write("    DELAY 10\n")
+        self.wheel_move(1)
+        self.goto((ra_h, ra_m, ra_s, dec_d, dec_m, dec_s))
         self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
         self.outfile.write("        SET EXPOSURE TO 2\n")
         self.outfile.write("        SET GAIN TO 100\n")
         self.outfile.write("        MOUNT SOLVEANDSYNC\n")
         self.outfile.write("    END PRESERVE\n")
-        self.outfile.write("    DELAY 10\n")
-        self.outfile.write("    MOUNT GOTO \"" + ra_h + " " + ra_m + " " + ra_s + ", " + dec_d + " " + dec_m + " " + dec_s + "\"\n")
-        self.outfile.write("    DELAY 10\n")
+        self.delay(Operation.SOLVE)
+        self.goto((ra_h, ra_m, ra_s, dec_d, dec_m, dec_s))
         self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
         self.outfile.write("        SET EXPOSURE TO 2\n")
         self.outfile.write("        SET GAIN TO 100\n")
         self.outfile.write("        MOUNT SOLVEANDSYNC\n")
         self.outfile.write("    END PRESERVE\n")
-        self.outfile.write("    DELAY 10\n")
+        self.delay(Operation.SOLVE)
         
         #Autofocus
         if(self.rough_focus != -1):
             self.outfile.write("    SET EXPOSURE TO 4\n")
             self.outfile.write("    AUTOFOCUS FROM " + str(self.rough_focus - 100) + " TO " + str(self.rough_focus + 100) + " STEP COUNT 21\n")
-            #Remove 12 minutes from frame time for autofocus
-            frame_subtraction = 1440 / self.exposure_time
+            #ssp_budget removes the autofocus time from the frame count
         
         #Set filter
-        self.outfile.write("    WHEEL MOVE TO " + str(Filters.RED.value) + "\n")
-        self.outfile.write("    DELAY 10\n")
+        self.wheel_move(Filters.RED.value)
 
         #Set guiding
         self.outfile.write("    GUIDING CONNECT ABORT False\n")
         self.outfile.write("    GUIDING STOP\n")
-        self.outfile.write("    DELAY 5\n")
+        self.delay(Operation.GUIDE_STOP)
         self.outfile.write("    GUIDING START\n")
-        self.outfile.write("    DELAY 10\n")
+        self.delay(Operation.GUIDE_START)
         
         #Set cooler temperature
-        if int(self.temperature) != 100:
-            self.outfile.write("    COOL DOWN TO " + self.temperature + " RATE 25 TOLERANCE 1\n")
+        self.cool_down()
             
         #Set exposure
         self.outfile.write("    SET EXPOSURE TO " + str(self.exposure_time) + "\n")
         
-        #Set frame capture
-        self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
-        self.outfile.write("        FRAMETYPE Light\n")
-        self.outfile.write("        GUIDING DITHER EVERY " + str(self.dither) + " FRAMES\n")
-        frame_duration = input("Enter number of hours to capture data\n")
-        frame_qty = (float(frame_duration) * 3600) / self.timediv
-        frame_qty = frame_qty - frame_subtraction
-        frame_qty = frame_qty / 3
-        frame_qty = math.floor(frame_qty)
-            
-        frame_qty_s = str(frame_qty)
-        self.outfile.write("        CAPTURE " + frame_qty_s + " FRAMES REQUIREGUIDING True\n")
-        self.outfile.write("        GUIDING DITHER EVERY STOP\n")
-        self.outfile.write("    END PRESERVE\n")
-        
-        #Image GREEN
-        self.outfile.write("    TARGETNAME \"" + target_name + "_g\"\n")
-        self.outfile.write("    WHEEL MOVE TO " + str(Filters.GREEN.value) + "\n")
-        self.outfile.write("    DELAY 10\n")
-        self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
-        self.outfile.write("        FRAMETYPE Light\n")
-        self.outfile.write("        GUIDING DITHER EVERY " + str(self.dither) + " FRAMES\n")
-        self.outfile.write("        CAPTURE " + frame_qty_s + " FRAMES REQUIREGUIDING True\n")
-        self.outfile.write("        GUIDING DITHER EVERY STOP\n")
-        self.outfile.write("    END PRESERVE\n")
-        
-        #Image BLUE
-        self.outfile.write("    TARGETNAME \"" + target_name + "_b\"\n")
-        self.outfile.write("    WHEEL MOVE TO " + str(Filters.BLUE.value) + "\n")
-        self.outfile.write("    DELAY 10\n")
-        self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
-        self.outfile.write("        FRAMETYPE Light\n")
-        self.outfile.write("        GUIDING DITHER EVERY " + str(self.dither) + " FRAMES\n")
-        self.outfile.write("        CAPTURE " + frame_qty_s + " FRAMES REQUIREGUIDING True\n")
-        self.outfile.write("        GUIDING DITHER EVERY STOP\n")
-        self.outfile.write("    END PRESERVE\n")
+        #Set frame capture, none at all when the time doesn't fit a single frame per filter
+        frame_qty = self.capture_budget(RGB_FILTERS, frame_duration, self.rough_focus != -1).frames_for(Filters.RED.name)
+        if frame_qty == 0:
+            print("No frames fit in " + str(frame_duration) + " hours for " + target_name + ", skipping its capture\n")
+        else:
+            self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
+            self.outfile.write("        FRAMETYPE Light\n")
+            self.outfile.write("        GUIDING DITHER EVERY " + str(self.dither) + " FRAMES\n")
+            self.capture(coords, frame_qty)
+            self.outfile.write("        GUIDING DITHER EVERY STOP\n")
+            self.outfile.write("    END PRESERVE\n")
+
+            #Image GREEN
+            self.outfile.write("    TARGETNAME \"" + target_name + "_g\"\n")
+            self.wheel_move(Filters.GREEN.value)
+            self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
+            self.outfile.write("        FRAMETYPE Light\n")
+            self.outfile.write("        GUIDING DITHER EVERY " + str(self.dither) + " FRAMES\n")
+            self.capture(coords, frame_qty)
+            self.outfile.write("        GUIDING DITHER EVERY STOP\n")
+            self.outfile.write("    END PRESERVE\n")
+
+            #Image BLUE
+            self.outfile.write("    TARGETNAME \"" + target_name + "_b\"\n")
+            self.wheel_move(Filters.BLUE.value)
+            self.outfile.write("    PRESERVE CAMERA SETTINGS\n")
+            self.outfile.write("        FRAMETYPE Light\n")
+            self.outfile.write("        GUIDING DITHER EVERY " + str(self.dither) + " FRAMES\n")
+            self.capture(coords, frame_qty)
+            self.outfile.write("        GUIDING DITHER EVERY STOP\n")
+            self.outfile.write("    END PRESERVE\n")
         
         #Finish target
         self.outfile.write("    GUIDING STOP\n")
@@ -501,13 +636,18 @@ class Session:
             self.outfile.write("    SET COOLER OFF\n")
         self.outfile.write("    WHEEL MOVE TO 1\n")
         self.outfile.write("END SEQUENCE\n")
-        self.outfile.close()
+        with ssp_profile.stage("file_flush"):
+            self.outfile.close()
+
+def open_session(outfile) -> Session:
+    return Session(outfile, 100, Filters.LUMINANCE, Telescope.CARBON, 0, 0, 0, 0, -1)
 
-def main() -> None:
-    if len(sys.argv) != 1:
-        print('Formatting error!')
-        print('Example: ssp_towa.py')
-        quit()
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a sharpcap sequence for the Carbonstar rig")
+    ssp_profile.add_arguments(parser)
+    args = parser.parse_args(argv)
+    ssp_profile.check_arguments(parser, args)
+    ssp_profile.start_from_args(args)
 
     #Prompt for filename and create file
     filename = ""
@@ -515,7 +655,7 @@ def main() -> None:
     filename += ".scs"
     fileout = open(filename, "w+")
 
-    session = Session(fileout, 100, Filters.LUMINANCE, Telescope.CARBON, 0, 0, 0, 0, -1)
+    session = open_session(fileout)
 
     session.start_time()
     
@@ -529,21 +669,26 @@ def main() -> None:
     
     session.unpark()
 
-    if (rgb_flag == True):
-        session.create_rgb_target()
-    else:
-        session.create_target()
+    with ssp_profile.stage("target_emission"):
+        if (rgb_flag == True):
+            session.create_rgb_target()
+        else:
+            session.create_target()
 
     #Insert additional targets
     while input("Enter additional target? (y/n)") == 'y':
         session.set_filter()
         session.calc_capture_vals()
-        if (rgb_flag == True):
-            session.create_rgb_target()
-        else:
-            session.create_target()
+        with ssp_profile.stage("target_emission"):
+            if (rgb_flag == True):
+                session.create_rgb_target()
+            else:
+                session.create_target()
 
     session.shutdown()
+    with ssp_profile.stage("manifest"):
+        ssp_manifest.write_manifest(filename, RIG)
+    ssp_profile.finish_from_args(args)
 
     print("Sequence file generated!\n")
 
@@ -0,0 +1,239 @@
+# Catalog lookups against catalogs/master.csv
+#
+# scan() reads the csv until it finds the name, the way the parsers always have.
+# lookup() answers from an in memory index that is built once per file version and
+# reused for every later lookup in the same process.
+# find() and search() binary search the sorted record file written by build_index(), so a
+# fresh process can answer without reading the whole catalog. They fall back to scanning
+# master.csv while that file is missing or older than the catalog.
+# find_many() answers a whole batch of names in one ordered pass over the same file, falling
+# back to the in memory index.
+# SkyGrid answers "what is near this position" by bucketing objects into cells of sky.
+
+import csv
+import math
+from pathlib import Path
+from typing import Optional
+
+import ssp_astro
+import ssp_profile
+
+master_catalog = Path("catalogs") / "master.csv"
+list_catalog = Path("catalogs") / "available_catalogs.txt"
+index_catalog = Path("catalogs") / "master.idx"
+
+INDEX_MAGIC = "SSPIDX1"
+
+#Index of the last catalog loaded, keyed by path and modification time
+_index = {}
+
+def row_coords(row) -> tuple:
+    return (row[1], row[2], row[3], row[4], row[5], row[6])
+
+def scan(name, path=master_catalog) -> Optional[tuple]:
+    ssp_profile.count("catalog_lookups")
+    with ssp_profile.stage("catalog_lookup"), Path(path).open(mode="r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        for row in reader:
+            # Skip empty or short rows
+            if len(row) < 7:
+                continue
+            if row[0] == name:
+                ssp_profile.count("catalog_rows_scanned", reader.line_num)
+                return row_coords(row)
+        ssp_profile.count("catalog_rows_scanned", reader.line_num)
+    return None
+
+def read_catalog(path=master_catalog) -> dict:
+    #Name to coords for every row, without touching the cached index
+    index = {}
+    with ssp_profile.stage("catalog_load"), Path(path).open(mode="r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            #First entry wins, matching scan()
+            if len(row) >= 7 and row[0] not in index:
+                index[row[0]] = row_coords(row)
+    return index
+
+def load_index(path=master_catalog) -> dict:
+    path = Path(path)
+    key = (str(path), path.stat().st_mtime_ns)
+    if key not in _index:
+        index = read_catalog(path)
+        _index.clear()
+        _index[key] = index
+    return _index[key]
+
+def lookup(name, path=master_catalog) -> Optional[tuple]:
+    ssp_profile.count("catalog_lookups")
+    with ssp_profile.stage("catalog_lookup"):
+        return load_index(path).get(name)
+
+def available_catalogs(path=list_catalog) -> str:
+    with ssp_profile.stage("catalog_load"), Path(path).open("r", encoding="utf-8") as f:
+        return f.read()
+
+def build_index(source=master_catalog, target=index_catalog) -> int:
+    #Fixed width records sorted by name, the first record is a header holding the width
+    rows = {}
+    with Path(source).open(mode="r", encoding="utf-8", newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)
+        for row in reader:
+            if len(row) >= 7 and row[0] not in rows:
+                rows[row[0]] = ",".join(row[:7])
+    width = max([len(line.encode("utf-8")) for line in rows.values()] + [32]) + 1
+    with Path(target).open("wb") as f:
+        f.write((INDEX_MAGIC + " " + str(width) + " " + str(len(rows))).ljust(width - 1).encode("utf-8") + b"\n")
+        for name in sorted(rows, key=lambda name: name.encode("utf-8")):
+            f.write(rows[name].encode("utf-8").ljust(width - 1) + b"\n")
+    return len(rows)
+
+def index_is_fresh(source=master_catalog, target=index_catalog) -> bool:
+    try:
+        return Path(target).stat().st_mtime_ns >= Path(source).stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+class RecordFile:
+    def __init__(self, path):
+        self.f = Path(path).open("rb")
+        header = self.f.readline().decode("utf-8").split()
+        if len(header) != 3 or header[0] != INDEX_MAGIC:
+            self.f.close()
+            raise ValueError(str(path) + " is not a catalog index")
+        self.width = int(header[1])
+        self.count = int(header[2])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.f.close()
+
+    def row(self, n) -> list:
+        self.f.seek((n + 1) * self.width)
+        return self.f.read(self.width).decode("utf-8").rstrip().split(",")
+
+    def key(self, n) -> bytes:
+        #Just the name of record n, still encoded
+        self.f.seek((n + 1) * self.width)
+        return self.f.read(self.width).split(b",", 1)[0]
+
+    def first_at_least(self, key, lo=0, hi=None) -> int:
+        key = key.encode("utf-8")
+        hi = self.count if hi is None else hi
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def next_at_least(self, key, lo) -> int:
+        #first_at_least() for a key known to sort at or after record lo, galloping out from lo
+        #so keys that are close together cost a few reads each
+        encoded = key.encode("utf-8")
+        step = 1
+        while lo + step < self.count and self.key(lo + step) < encoded:
+            lo += step
+            step *= 2
+        return self.first_at_least(key, lo, min(lo + step, self.count))
+
+def find(name, source=master_catalog, index=index_catalog) -> Optional[tuple]:
+    if not index_is_fresh(source, index):
+        return scan(name, source)
+    ssp_profile.count("catalog_lookups")
+    with ssp_profile.stage("catalog_lookup"), RecordFile(index) as records:
+        n = records.first_at_least(name)
+        if n < records.count:
+            row = records.row(n)
+            if row[0] == name:
+                return row_coords(row)
+    return None
+
+def find_many(names, source=master_catalog, index=index_catalog) -> dict:
+    #find() for a batch of names in one ordered pass over the index, names not found are left out
+    keys = sorted(set(names), key=lambda name: name.encode("utf-8"))
+    if not index_is_fresh(source, index):
+        catalog = load_index(source)
+        return {name: catalog[name] for name in keys if name in catalog}
+    found = {}
+    ssp_profile.count("catalog_lookups", len(keys))
+    with ssp_profile.stage("catalog_lookup"), RecordFile(index) as records:
+        n = 0
+        for name in keys:
+            n = records.next_at_least(name, n)
+            if n >= records.count:
+                break
+            row = records.row(n)
+            if row[0] == name:
+                found[name] = row_coords(row)
+    return found
+
+def search(text, limit=20, source=master_catalog, index=index_catalog) -> list:
+    #Names starting with text, in name order
+    found = []
+    if not index_is_fresh(source, index):
+        for name, coords in load_index(source).items():
+            if name.startswith(text):
+                found.append((name, coords))
+        return sorted(found, key=lambda item: item[0].encode("utf-8"))[:limit]
+    with RecordFile(index) as records:
+        n = records.first_at_least(text)
+        while n < records.count and len(found) < limit:
+            row = records.row(n)
+            if not row[0].startswith(text):
+                break
+            found.append((row[0], row_coords(row)))
+            n += 1
+    return found
+
+class SkyGrid:
+    #Objects bucketed by declination band and right ascension column, cell degrees on a side
+    def __init__(self, cell=1.0):
+        self.cell = cell
+        self.columns = math.ceil(360 / cell)
+        self.cells = {}
+
+    def key(self, ra, dec) -> tuple:
+        return int(ra % 360 // self.cell) % self.columns, int((dec + 90) // self.cell)
+
+    def add(self, name, ra, dec) -> None:
+        self.cells.setdefault(self.key(ra, dec), []).append((name, ra, dec))
+
+    def columns_near(self, ra, dec, radius) -> range:
+        #Columns widen towards the poles, a query touching a pole needs every column
+        edge = min(90.0, abs(dec) + radius)
+        if edge >= 89.9:
+            return range(self.columns)
+        span = radius / math.cos(math.radians(edge))
+        if span >= 180:
+            return range(self.columns)
+        return range(int((ra - span) // self.cell), int((ra + span) // self.cell) + 1)
+
+    def near(self, ra, dec, radius) -> list:
+        #(name, separation) within radius degrees, closest first
+        found = []
+        low = int((max(-90.0, dec - radius) + 90) // self.cell)
+        high = int((min(90.0, dec + radius) + 90) // self.cell)
+        columns = set(column % self.columns for column in self.columns_near(ra, dec, radius))
+        for band in range(low, high + 1):
+            for column in columns:
+                for name, other_ra, other_dec in self.cells.get((column, band), ()):
+                    distance = ssp_astro.separation(ra, dec, other_ra, other_dec)
+                    if distance <= radius:
+                        found.append((name, distance))
+        return sorted(found, key=lambda item: item[1])
+
+def sky_grid(index, cell=1.0) -> SkyGrid:
+    grid = SkyGrid(cell)
+    for name, coords in index.items():
+        try:
+            ra, dec = ssp_astro.coords_to_degrees(coords)
+        except ValueError:
+            continue
+        grid.add(name, ra, dec)
+    return grid
@@ -0,0 +1,93 @@
+# FITS header reading for matching captured frames back to sequences
+#
+# Only the primary header is read, in 2880 byte blocks up to the END card, so scanning a night
+# of frames touches a few kilobytes per file rather than the image data.
+
+from datetime import datetime
+from pathlib import Path
+
+BLOCK = 2880
+CARD = 80
+FITS_SUFFIXES = (".fits", ".fit", ".fts")
+#Folders SharpCap keeps calibration frames in
+CALIBRATION_FOLDERS = {"dark", "darks", "flat", "flats", "bias", "biases", "darkflat", "darkflats"}
+
+def parse_value(text):
+    text = text.strip()
+    if text.startswith("'"):
+        #Strings are quoted with '' for a literal quote, trailing spaces aren't significant
+        end = 1
+        while True:
+            end = text.find("'", end)
+            if end == -1:
+                return text[1:].rstrip()
+            if text[end + 1:end + 2] == "'":
+                end += 2
+                continue
+            return text[1:end].replace("''", "'").rstrip()
+    value = text.split("/", 1)[0].strip()
+    if value == "T":
+        return True
+    if value == "F":
+        return False
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+def read_header(path) -> dict:
+    header = {}
+    with Path(path).open("rb") as f:
+        while True:
+            block = f.read(BLOCK)
+            if len(block) < BLOCK:
+                raise ValueError(str(path) + " ends before the END of its header")
+            for n in range(0, BLOCK, CARD):
+                card = block[n:n + CARD].decode("ascii", errors="replace")
+                keyword = card[:8].strip()
+                if keyword == "END":
+                    return header
+                if card[8:10] == "= " and keyword not in header:
+                    header[keyword] = parse_value(card[10:])
+
+def fits_files(paths) -> list:
+    #FITS files named directly or found under the given directories, in path order
+    files = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            files += [found for found in path.rglob("*") if found.suffix.lower() in FITS_SUFFIXES]
+        else:
+            files.append(path)
+    return sorted(files)
+
+def observed_at(header):
+    #DATE-OBS as a datetime, None when missing or unreadable
+    value = header.get("DATE-OBS")
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.strip().rstrip("Z"))
+    except ValueError:
+        return None
+
+def exposure_of(header):
+    for keyword in ("EXPTIME", "EXPOSURE"):
+        value = header.get(keyword)
+        if isinstance(value, (int, float)):
+            return float(value)
+    return None
+
+def in_calibration_folder(path) -> bool:
+    return any(part.lower() in CALIBRATION_FOLDERS for part in Path(path).parts[:-1])
+
+def is_light(header, path) -> bool:
+    #IMAGETYP when the camera wrote one, otherwise anything outside a calibration folder
+    frame_type = header.get("IMAGETYP", header.get("FRAMETYP"))
+    if isinstance(frame_type, str):
+        return "light" in frame_type.lower()
+    return not in_calibration_folder(path)
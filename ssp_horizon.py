@@ -0,0 +1,120 @@
+# Sites and their horizon masks
+#
+# A site lives in sites/<name>.json:
+#     {"latitude": 52.0, "longitude": -1.5, "utc_offset": 0}
+# utc_offset is the hours SharpCap's LOCALTIME is ahead of UTC, without it the site is taken
+# to share this computer's timezone.
+# with its horizon, when it has one, in sites/<name>.hzn as azimuth and minimum altitude
+# pairs in degrees, one per line, the format most planetarium and capture tools export:
+#     # az alt
+#     0 12
+#     95 30
+#     180 8
+# Altitudes between the listed azimuths are interpolated linearly, wrapping through north.
+#
+# The mask is precomputed into a table of TABLE_SIZE altitudes, so checking an azimuth is
+# a single index and mask() can run over a whole catalog's alt/az lists in one pass.
+
+import json
+import math
+from array import array
+from pathlib import Path
+
+import ssp_astro
+
+site_dir = Path("sites")
+
+#Table entries per degree of azimuth
+TABLE_STEP = 10
+TABLE_SIZE = 360 * TABLE_STEP
+
+class Horizon:
+    def __init__(self, points=()):
+        #points are (azimuth, altitude) pairs, no points is a flat horizon at 0
+        points = sorted((az % 360, alt) for az, alt in points)
+        self.points = points
+        self.table = array("d", [0.0]) * TABLE_SIZE
+        if not points:
+            return
+        if len(points) == 1:
+            for n in range(TABLE_SIZE):
+                self.table[n] = points[0][1]
+            return
+        #Wrap the last point round before north and the first after it
+        wrapped = [(points[-1][0] - 360, points[-1][1])] + points + [(points[0][0] + 360, points[0][1])]
+        segment = 0
+        for n in range(TABLE_SIZE):
+            az = n / TABLE_STEP
+            while wrapped[segment + 1][0] < az:
+                segment += 1
+            (az1, alt1), (az2, alt2) = wrapped[segment], wrapped[segment + 1]
+            if az2 == az1:
+                self.table[n] = max(alt1, alt2)
+            else:
+                self.table[n] = alt1 + (alt2 - alt1) * (az - az1) / (az2 - az1)
+
+    def altitude(self, az) -> float:
+        #Lowest altitude clear of obstructions at this azimuth
+        return self.table[int(az * TABLE_STEP) % TABLE_SIZE]
+
+    def clear(self, alt, az, min_alt=0.0) -> bool:
+        return alt >= min_alt and alt >= self.table[int(az * TABLE_STEP) % TABLE_SIZE]
+
+    def mask(self, alts, azs, min_alt=0.0) -> list:
+        #clear() over parallel lists of altitudes and azimuths
+        table = self.table
+        return [alt >= min_alt and alt >= table[int(az * TABLE_STEP) % TABLE_SIZE] for alt, az in zip(alts, azs)]
+
+class Site:
+    def __init__(self, name, latitude, longitude, horizon=None, utc_offset=None):
+        self.name = name
+        self.latitude = latitude
+        self.longitude = longitude
+        self.horizon = horizon if horizon is not None else Horizon()
+        self.utc_offset = utc_offset
+
+    def alt_az(self, ra, dec, when) -> tuple:
+        return ssp_astro.alt_az(ra, dec, self.latitude, ssp_astro.local_sidereal_time(when, self.longitude))
+
+    def visible(self, ra, dec, when, min_alt=0.0) -> bool:
+        alt, az = self.alt_az(ra, dec, when)
+        return self.horizon.clear(alt, az, min_alt)
+
+def read_horizon(path) -> Horizon:
+    points = []
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].replace(",", " ").split()
+            if len(line) < 2:
+                continue
+            try:
+                points.append((float(line[0]), float(line[1])))
+            except ValueError:
+                #Header rows such as "az alt"
+                continue
+    return Horizon(points)
+
+def load_site(name) -> Site:
+    with (site_dir / (name + ".json")).open("r", encoding="utf-8") as f:
+        data = json.load(f)
+    horizon_path = site_dir / (name + ".hzn")
+    horizon = read_horizon(horizon_path) if horizon_path.exists() else Horizon()
+    utc_offset = data.get("utc_offset")
+    return Site(name, float(data["latitude"]), float(data["longitude"]), horizon, None if utc_offset is None else float(utc_offset))
+
+def catalog_alt_az(positions, latitude, lst) -> tuple:
+    #Altitude and azimuth lists for (ra, dec) positions in degrees, all at one sidereal time
+    sin_lat = math.sin(math.radians(latitude))
+    cos_lat = math.cos(math.radians(latitude))
+    alts = []
+    azs = []
+    for ra, dec in positions:
+        hour_angle = math.radians(lst - ra)
+        dec = math.radians(dec)
+        sin_dec = math.sin(dec)
+        cos_dec = math.cos(dec)
+        cos_ha = math.cos(hour_angle)
+        sin_alt = sin_dec * sin_lat + cos_dec * cos_lat * cos_ha
+        alts.append(math.degrees(math.asin(max(-1.0, min(1.0, sin_alt)))))
+        azs.append(math.degrees(math.atan2(-math.sin(hour_angle) * cos_dec, cos_lat * sin_dec - sin_lat * cos_dec * cos_ha)) % 360)
+    return alts, azs
@@ -0,0 +1,395 @@
+# Bulk import of observing lists into a plan
+#   ssp_import.py club_list.csv --rig towa -o club.json
+#   ssp_import.py survey.vot --rig c6h --filter D1 --hours 1.5 --start 21:00 -o survey.json
+#
+# Reads CSV, TSV and VOTable files (TABLEDATA or VizieR's CSV serialization) one row at a
+# time. The names of each batch of BATCH_SIZE rows are resolved together in one ordered pass
+# over the catalog index (see ssp_catalog.find_many), and the plan and the report are
+# written as each batch is done. Memory stays the same however long the list is.
+#
+# Names are normalized before the lookup:
+#   case, spaces and leading zeros: "NGC 0224" is ngc224, "IC 186A" is ic0186a
+#   long forms: "Messier 42", "Caldwell 14", "Sharpless 281", "Sh 2-281", "Barnard 33", "LEDA 2557"
+# A name that still isn't in the catalog falls back to the row's RA and Dec columns,
+# sexagesimal with spaces or colons or else decimal degrees, or the ra_h ... dec_s columns of
+# master.csv. Rows with neither go to the unresolved report (<plan>.unresolved.csv) with the
+# reason. An object already in the plan under another name (see ssp_aliases.py) is skipped.
+#
+# Hours and filter columns, when the list has them, override --hours and --filter per row.
+
+import re
+import csv
+import json
+import argparse
+import itertools
+from pathlib import Path
+from xml.etree import ElementTree
+
+import ssp_plan
+import ssp_catalog
+import ssp_aliases
+
+#Rows resolved per pass over the catalog index
+BATCH_SIZE = 2000
+
+#Header cells with everything but letters and digits taken out
+NAME_COLUMNS = ("name", "object", "objectname", "target", "designation", "mainid", "ident", "identifier", "id")
+RA_COLUMNS = ("ra", "raj2000", "ra2000", "raicrs", "rightascension")
+DEC_COLUMNS = ("dec", "dej2000", "decj2000", "de", "dec2000", "deicrs", "declination")
+SPLIT_COLUMNS = ("rah", "ram", "ras", "decd", "decm", "decs")
+HOURS_COLUMNS = ("hours", "hrs", "integration")
+FILTER_COLUMNS = ("filter",)
+
+#Spellings of catalog prefixes to the ones master.csv uses
+PREFIXES = {
+    "messier": "m",
+    "m": "m",
+    "caldwell": "c",
+    "c": "c",
+    "ngc": "ngc",
+    "ic": "ic",
+    "sharpless": "sh2-",
+    "sh2": "sh2-",
+    "sh 2": "sh2-",
+    "lbn": "lbn",
+    "ldn": "ldn",
+    "barnard": "b",
+    "b": "b",
+    "pgc": "pgc",
+    "leda": "pgc",
+    "pk": "pk",
+    "abell": "abell",
+    "aco": "abell",
+}
+NAME_PATTERN = re.compile(r"^(" + "|".join(sorted((re.escape(prefix) for prefix in PREFIXES), key=len, reverse=True)) + r")\s*-?\s*(\d.*)$")
+
+def column_key(text) -> str:
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+def find_column(header, names):
+    keys = [column_key(cell) for cell in header]
+    for name in names:
+        if name in keys:
+            return keys.index(name)
+    return None
+
+def name_candidates(name) -> list:
+    #master.csv spellings a list's name could stand for, most likely first
+    text = " ".join(name.strip().lower().split())
+    match = NAME_PATTERN.match(text)
+    if match is None:
+        return [text.replace(" ", "")] if text else []
+    prefix = PREFIXES[match.group(1)]
+    rest = match.group(2)
+    if prefix == "pk":
+        return [prefix + rest.replace(" ", "")]
+    number = re.match(r"0*(\d+)\s*(.*)$", rest)
+    digits, suffix = number.group(1), number.group(2)
+    candidates = [prefix + digits + suffix.replace(" ", "")]
+    if suffix:
+        #Lettered NGC and IC objects keep four digits, NED components a space as well
+        candidates.append(prefix + digits.zfill(4) + suffix.replace(" ", ""))
+        candidates.append(prefix + digits.zfill(4) + " " + suffix)
+    return candidates
+
+def split_sexagesimal(text) -> list:
+    return [part for part in re.split(r"[\s:hmsd°'\"]+", text.strip().lstrip("+-")) if part]
+
+def parse_ra(text):
+    #(h, m, s) strings, or None when text isn't a right ascension
+    parts = split_sexagesimal(text)
+    try:
+        if len(parts) == 1:
+            seconds = round(float(parts[0]) % 360 / 15 * 3600, 2)
+            hours, seconds = divmod(seconds, 3600)
+            minutes, seconds = divmod(seconds, 60)
+            parts = [str(int(hours)), str(int(minutes)), str(round(seconds, 2))]
+        if len(parts) == 2:
+            parts.append("0")
+        if len(parts) != 3 or not 0 <= float(parts[0]) < 24 or not 0 <= float(parts[1]) < 60 or not 0 <= float(parts[2]) < 60:
+            return None
+    except ValueError:
+        return None
+    return tuple(parts)
+
+def parse_dec(text):
+    #(d, m, s) strings keeping the sign on d, or None when text isn't a declination
+    sign = "-" if text.strip().startswith("-") else ""
+    parts = split_sexagesimal(text)
+    try:
+        if len(parts) == 1:
+            seconds = round(abs(float(parts[0])) * 3600, 1)
+            degrees, seconds = divmod(seconds, 3600)
+            minutes, seconds = divmod(seconds, 60)
+            parts = [str(int(degrees)), str(int(minutes)), str(round(seconds, 1))]
+        if len(parts) == 2:
+            parts.append("0")
+        if len(parts) != 3 or not 0 <= float(parts[0]) <= 90 or not 0 <= float(parts[1]) < 60 or not 0 <= float(parts[2]) < 60:
+            return None
+    except ValueError:
+        return None
+    return (sign + parts[0], parts[1], parts[2])
+
+def is_rule(cells) -> bool:
+    #VizieR's ---- lines under the header
+    return all(re.fullmatch(r"[\s\-=]*", cell) for cell in cells)
+
+def csv_rows(path, delimiter=None):
+    #The header, then every row, lines starting with # left out
+    path = Path(path)
+    with path.open("r", encoding="utf-8-sig", newline="") as f:
+        lines = (line for line in f if not line.startswith("#") and line.strip())
+        if delimiter is None:
+            first = next(lines, "")
+            if path.suffix.lower() in (".tsv", ".tab"):
+                delimiter = "\t"
+            else:
+                try:
+                    delimiter = csv.Sniffer().sniff(first, delimiters=",;\t|").delimiter
+                except csv.Error:
+                    delimiter = ","
+            lines = itertools.chain([first], lines)
+        yield from table_rows(csv.reader(lines, delimiter=delimiter))
+
+def table_rows(rows):
+    #The header and rows with VizieR's units line and rule under the header taken out
+    header = next(rows, None)
+    if header is None:
+        return
+    yield header
+    head = [row for row in (next(rows, None), next(rows, None)) if row is not None]
+    if len(head) == 2 and is_rule(head[1]):
+        head = []
+    for row in itertools.chain(head, rows):
+        if not is_rule(row):
+            yield row
+
+def votable_rows(path):
+    #The FIELD names, then every row, without loading the table
+    fields = []
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line in f:
+            fields += re.findall(r"<FIELD\b[^>]*?\bname=\"([^\"]*)\"", line)
+            serialization = re.search(r"<CSV\b([^>]*)>", line)
+            if serialization is not None:
+                yield from votable_csv(f, line, serialization.group(1), fields)
+                return
+            if "<TABLEDATA" in line:
+                break
+    if not fields:
+        return
+    yield fields
+    table = None
+    for event, element in ElementTree.iterparse(str(path), events=("start", "end")):
+        tag = element.tag.rsplit("}", 1)[-1]
+        if event == "start" and tag == "TABLEDATA":
+            table = element
+        elif event == "end" and tag == "TR":
+            yield [cell.text or "" for cell in element]
+            element.clear()
+            if table is not None:
+                table.remove(element)
+
+def votable_csv(f, line, attributes, fields):
+    #VizieR's <CSV headlines="3" colsep=";"><![CDATA[ ... ]]></CSV>, the first headline is the header
+    headlines = re.search(r"headlines=\"(\d+)\"", attributes)
+    headlines = int(headlines.group(1)) if headlines else 0
+    colsep = re.search(r"colsep=\"([^\"]*)\"", attributes)
+    colsep = colsep.group(1) if colsep else ","
+    def lines():
+        rest = line.split("<![CDATA[", 1)[1] if "<![CDATA[" in line else ""
+        if rest.strip():
+            yield rest
+        for text in f:
+            if "]]>" in text:
+                text = text.split("]]>", 1)[0]
+                if text.strip():
+                    yield text
+                return
+            yield text
+    rows = csv.reader(lines(), delimiter=colsep)
+    if headlines:
+        header = next(rows, fields)
+        for _ in range(headlines - 1):
+            next(rows, None)
+    else:
+        header = fields
+    yield [cell.strip() for cell in header]
+    for row in rows:
+        yield row
+
+def read_rows(path, table_format=None):
+    #The header, then every row of a CSV, TSV or VOTable file
+    path = Path(path)
+    if table_format is None:
+        with path.open("r", encoding="utf-8-sig", errors="replace") as f:
+            start = f.read(512).lstrip()
+        table_format = "votable" if start.startswith("<?xml") or start.startswith("<VOTABLE") else "csv"
+    if table_format == "votable":
+        return votable_rows(path)
+    return csv_rows(path, "\t" if table_format == "tsv" else None)
+
+def target_name(name, row_number) -> str:
+    #TARGETNAME for a row placed by its coordinates
+    name = re.sub(r"[^A-Za-z0-9+\-.]+", "_", name.strip()).strip("_")
+    return name if name else "row" + str(row_number)
+
+class PlanWriter:
+    #A plan file written a target at a time, the same JSON load_plan() reads
+    def __init__(self, path, plan):
+        self.f = Path(path).open("w", encoding="utf-8")
+        data = plan.as_dict()
+        del data["targets"]
+        self.f.write(json.dumps(data)[:-1] + ", \"targets\": [")
+        self.count = 0
+
+    def add(self, target) -> None:
+        self.f.write(("," if self.count else "") + "\n  " + json.dumps(target.as_dict()))
+        self.count += 1
+
+    def close(self) -> None:
+        self.f.write("\n]}\n")
+        self.f.close()
+
+class ImportReport:
+    def __init__(self, path):
+        self.f = Path(path).open("w", encoding="utf-8", newline="")
+        self.writer = csv.writer(self.f, lineterminator="\n")
+        self.writer.writerow(["row", "name", "ra", "dec", "reason"])
+        self.count = 0
+
+    def add(self, row_number, name, ra, dec, reason) -> None:
+        self.writer.writerow([row_number, name, ra, dec, reason])
+        self.count += 1
+
+    def close(self) -> None:
+        self.f.close()
+
+def import_list(path, plan, output, report_path, hours=1.0, filter_name=None, table_format=None) -> dict:
+    #Streams path into the plan file output, counts of what happened to the rows
+    module = ssp_plan.rig_module(plan.rig)
+    filter_name = (filter_name or module.DARK_FILTER.name).upper()
+    rows = read_rows(path, table_format)
+    header = next(rows, None)
+    if header is None:
+        raise ssp_plan.PlanError(str(path) + " has no header row")
+    columns = {
+        "name": find_column(header, NAME_COLUMNS),
+        "ra": find_column(header, RA_COLUMNS),
+        "dec": find_column(header, DEC_COLUMNS),
+        "hours": find_column(header, HOURS_COLUMNS),
+        "filter": find_column(header, FILTER_COLUMNS),
+    }
+    split = [find_column(header, (name,)) for name in SPLIT_COLUMNS]
+    if columns["name"] is None and (columns["ra"] is None or columns["dec"] is None) and None in split:
+        raise ssp_plan.PlanError(str(path) + " has no name column and no RA and Dec columns")
+
+    def cell(row, column) -> str:
+        return row[column].strip() if column is not None and column < len(row) else ""
+
+    counts = {"rows": 0, "catalog": 0, "coords": 0, "duplicates": 0, "unresolved": 0}
+    seen = set()
+    groups = ssp_aliases.load_aliases()
+    writer = PlanWriter(output, plan)
+    report = ImportReport(report_path)
+    try:
+        batch = []
+        def flush() -> None:
+            found = ssp_catalog.find_many(candidate for _, _, candidates in batch for candidate in candidates)
+            for row_number, row, candidates in batch:
+                name = cell(row, columns["name"])
+                ra = cell(row, columns["ra"])
+                dec = cell(row, columns["dec"])
+                try:
+                    row_hours = float(cell(row, columns["hours"]) or hours)
+                except ValueError:
+                    report.add(row_number, name, ra, dec, "hours is not a number")
+                    continue
+                #The same rule as ssp_projects.add_project(), NaN included
+                if not row_hours > 0:
+                    report.add(row_number, name, ra, dec, "hours must be more than 0")
+                    continue
+                row_filter = cell(row, columns["filter"]).upper() or filter_name
+                if row_filter != ssp_plan.AUTO_FILTER and row_filter not in module.Filters.__members__:
+                    report.add(row_number, name, ra, dec, "rig " + plan.rig + " has no filter " + row_filter)
+                    continue
+                match = next((candidate for candidate in candidates if candidate in found), None)
+                if match is not None:
+                    key = ssp_aliases.canonical(match, groups)
+                    if key in seen:
+                        counts["duplicates"] += 1
+                        continue
+                    seen.add(key)
+                    writer.add(ssp_plan.PlanTarget(match, row_filter, row_hours))
+                    counts["catalog"] += 1
+                    continue
+                if None not in split:
+                    ra_parts = parse_ra(" ".join(cell(row, column) for column in split[:3]))
+                    dec_parts = parse_dec(" ".join(cell(row, column) for column in split[3:]))
+                else:
+                    ra_parts = parse_ra(ra) if ra else None
+                    dec_parts = parse_dec(dec) if dec else None
+                if ra_parts is None or dec_parts is None:
+                    if ra or dec:
+                        reason = "not in the catalog and its coordinates can't be read"
+                    else:
+                        reason = "not in the catalog and no coordinates"
+                    report.add(row_number, name, ra, dec, reason)
+                    continue
+                #Rows placed by coordinates are the same target when name and position agree
+                key = (target_name(name, row_number), ra_parts + dec_parts)
+                if key in seen:
+                    counts["duplicates"] += 1
+                    continue
+                seen.add(key)
+                writer.add(ssp_plan.PlanTarget(key[0], row_filter, row_hours, key[1]))
+                counts["coords"] += 1
+            batch.clear()
+
+        for row in rows:
+            if not any(value.strip() for value in row):
+                continue
+            counts["rows"] += 1
+            batch.append((counts["rows"], row, name_candidates(cell(row, columns["name"]))))
+            if len(batch) >= BATCH_SIZE:
+                flush()
+        flush()
+    finally:
+        writer.close()
+        report.close()
+    counts["unresolved"] = report.count
+    return counts
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Turn a CSV, TSV or VOTable observing list into a plan")
+    parser.add_argument("list", help="the observing list")
+    parser.add_argument("--rig", choices=sorted(ssp_plan.RIGS), required=True)
+    parser.add_argument("-o", "--output", required=True, help="plan file to write (.json)")
+    parser.add_argument("--report", help="unresolved rows (default: plan name with .unresolved.csv)")
+    parser.add_argument("--format", choices=("csv", "tsv", "votable"), help="list format (default: from the contents)")
+    parser.add_argument("--filter", help="filter for rows without one (default: the rig's broadband filter)")
+    parser.add_argument("--hours", type=float, default=1.0, help="hours for rows without any")
+    parser.add_argument("--temperature", type=int, default=100)
+    parser.add_argument("--start", help="local start time as HH:MM")
+    parser.add_argument("--site", help="site in sites/ for meridian flips and AUTO filters")
+    parser.add_argument("--date", help="night as YYYY-MM-DD")
+    args = parser.parse_args(argv)
+
+    output = Path(args.output)
+    report = Path(args.report) if args.report else output.with_name(output.stem + ".unresolved.csv")
+    plan = ssp_plan.Plan(args.rig, [], args.temperature, args.start, None, args.site, args.date)
+    try:
+        counts = import_list(args.list, plan, output, report, args.hours, args.filter, args.format)
+    except ssp_plan.PlanError as e:
+        print("Import error: " + str(e))
+        raise SystemExit(1)
+    print(
+        str(counts["rows"]) + " rows: " + str(counts["catalog"]) + " from the catalog, " + str(counts["coords"]) + " from their coordinates, "
+        + str(counts["duplicates"]) + " duplicates skipped, " + str(counts["unresolved"]) + " unresolved"
+    )
+    print("Plan written to " + str(output))
+    if counts["unresolved"]:
+        print("Unresolved rows written to " + str(report))
+
+if __name__ == "__main__":
+    main()
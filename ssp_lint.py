@@ -0,0 +1,159 @@
+# Lint and diff tool for sharpcap sequence (.scs) files
+#   ssp_lint.py lint _save "Original Samples" --rig towa --json report.json
+#   ssp_lint.py diff old.scs new.scs
+#
+# Lint runs the files across worker processes and reports one Finding per problem.
+
+import sys
+import json
+import argparse
+import difflib
+from concurrent.futures import ProcessPoolExecutor
+
+import ssp_scs
+import ssp_plan
+
+class Finding:
+    def __init__(self, path, line_no, code, severity, message):
+        self.path = path
+        self.line_no = line_no
+        self.code = code
+        self.severity = severity
+        self.message = message
+
+    def as_dict(self) -> dict:
+        return {
+            "file": self.path,
+            "line": self.line_no,
+            "code": self.code,
+            "severity": self.severity,
+            "message": self.message
+        }
+
+    def __str__(self) -> str:
+        return self.path + ":" + str(self.line_no) + ": " + self.code + " " + self.severity + ": " + self.message
+
+def wheel_slots(rig=None) -> int:
+    #Slots on the rig's wheel, sequences without a rig are checked against the largest wheel
+    if rig is not None:
+        return ssp_plan.rig_module(rig).WHEEL_SLOTS
+    return max(ssp_plan.rig_module(name).WHEEL_SLOTS for name in ssp_plan.RIGS)
+
+def lint_commands(path, commands, rig=None) -> list:
+    findings = []
+    slots = wheel_slots(rig)
+    open_preserves = []
+    cooler_line = None
+    ended = False
+
+    for command, state in ssp_scs.walk(commands):
+        keyword = command.keyword
+        if keyword == "PRESERVE CAMERA SETTINGS":
+            open_preserves.append(command.line_no)
+        elif keyword == "END PRESERVE":
+            if open_preserves:
+                open_preserves.pop()
+            else:
+                findings.append(Finding(path, command.line_no, "SCS002", "error", "END PRESERVE without a matching PRESERVE CAMERA SETTINGS"))
+        elif keyword == "COOL DOWN TO":
+            cooler_line = command.line_no
+        elif keyword == "SET COOLER OFF":
+            cooler_line = None
+        elif keyword == "CAPTURE":
+            frames = ssp_scs.parse_capture(command.args)
+            if frames is None:
+                findings.append(Finding(path, command.line_no, "SCS004", "error", "CAPTURE has no frame count"))
+            elif frames <= 0:
+                findings.append(Finding(path, command.line_no, "SCS004", "error", "CAPTURE " + str(frames) + " FRAMES captures nothing"))
+        elif keyword == "WHEEL MOVE TO":
+            if state.wheel_slot is None or state.wheel_slot < 1 or state.wheel_slot > slots:
+                findings.append(Finding(path, command.line_no, "SCS005", "error", "wheel slot " + command.args + " is outside 1-" + str(slots)))
+        elif keyword == "LOAD PROFILE":
+            profile = command.args.strip()
+            if not (profile.startswith("\"") and profile.endswith("\"")):
+                findings.append(Finding(path, command.line_no, "SCS006", "warning", "profile name " + profile + " is not quoted"))
+        elif keyword == "END SEQUENCE":
+            ended = True
+
+    for line_no in open_preserves:
+        findings.append(Finding(path, line_no, "SCS001", "error", "PRESERVE CAMERA SETTINGS is never closed with END PRESERVE"))
+    if cooler_line is not None:
+        findings.append(Finding(path, cooler_line, "SCS003", "warning", "COOL DOWN without a later SET COOLER OFF"))
+    if not ended:
+        last_line = commands[-1].line_no if commands else 0
+        findings.append(Finding(path, last_line, "SCS007", "error", "sequence has no END SEQUENCE"))
+
+    return findings
+
+def lint_file(path, rig=None) -> list:
+    try:
+        commands = ssp_scs.read_sequence(path)
+    except OSError as e:
+        return [Finding(str(path), 0, "SCS000", "error", "cannot read file: " + str(e))]
+    return lint_commands(str(path), commands, rig)
+
+def lint_paths(paths, rig=None, jobs=None) -> list:
+    files = ssp_scs.sequence_files(paths)
+    findings = []
+    #Small batches aren't worth the process startup
+    if len(files) < 64 or jobs == 1:
+        for path in files:
+            findings += lint_file(path, rig)
+        return findings
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        for found in pool.map(lint_file, files, [rig] * len(files), chunksize=32):
+            findings += found
+    return findings
+
+def report(findings, files) -> dict:
+    return {
+        "files": files,
+        "errors": sum(1 for finding in findings if finding.severity == "error"),
+        "warnings": sum(1 for finding in findings if finding.severity == "warning"),
+        "findings": [finding.as_dict() for finding in findings]
+    }
+
+def diff_sequences(old_path, new_path) -> list:
+    #Compare normalized commands so indentation and tab differences don't show up
+    old = [command.text() for command in ssp_scs.read_sequence(old_path)]
+    new = [command.text() for command in ssp_scs.read_sequence(new_path)]
+    return list(difflib.unified_diff(old, new, str(old_path), str(new_path), lineterm=""))
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Check and compare sharpcap sequence files")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    lint_parser = commands.add_parser("lint", help="check .scs files or directories")
+    lint_parser.add_argument("paths", nargs="+")
+    lint_parser.add_argument("--rig", choices=sorted(ssp_plan.RIGS))
+    lint_parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: one per CPU)")
+    lint_parser.add_argument("--json", dest="json_path", help="write the report as JSON ('-' for stdout)")
+
+    diff_parser = commands.add_parser("diff", help="compare two .scs files command by command")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "diff":
+        lines = diff_sequences(args.old, args.new)
+        for line in lines:
+            print(line)
+        sys.exit(1 if lines else 0)
+
+    files = len(ssp_scs.sequence_files(args.paths))
+    findings = lint_paths(args.paths, args.rig, args.jobs)
+    summary = report(findings, files)
+    if args.json_path == "-":
+        print(json.dumps(summary, indent=2))
+    else:
+        for finding in findings:
+            print(finding)
+        print(str(files) + " files, " + str(summary["errors"]) + " errors, " + str(summary["warnings"]) + " warnings")
+        if args.json_path:
+            with open(args.json_path, "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2)
+    sys.exit(1 if summary["errors"] else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+# Manifests recording what a generated sequence means to capture, and the tool that
+# compares them with the frames that came back
+#   ssp_manifest.py write night.scs --rig towa
+#   ssp_manifest.py ingest night.manifest.jsonl D:/SharpCap/Captures --json report.json
+#
+# The generators write night.manifest.jsonl next to night.scs, one JSON object per line:
+#   {"type": "sequence", "rig": "towa", "sequence": "night.scs", "start": "21:30", ...}
+#   {"type": "block", "index": 0, "target": "m81", "filter": "HA", "exposure": 180,
+#    "frames": 37, "dither_every": 3, "start": 412.0, "end": 7472.3, "frame_seconds": 190.82,
+#    "overhead": {"lead_in": 412.0, "per_frame": 153.5, "dither": 246.7}, ...}
+# There is one block per CAPTURE. Start and end are estimated seconds after the sequence
+# starts (after its WAIT UNTIL when it has one), the header's "seconds" is the whole run.
+# Captures cost their frame time from ssp_budget, DELAYs their length and solves and
+# autofocus runs the estimates below.
+#
+# Ingest matches FITS files to blocks by target (OBJECT header or a folder named after the
+# TARGETNAME) and filter, lights only, then reports planned against actual frames and seconds per frame
+# for each block and for each rig and filter, the numbers to tune TIMEDIV and DITHER with.
+
+import json
+import time
+import argparse
+from pathlib import Path
+
+import ssp_scs
+import ssp_fits
+import ssp_plan
+import ssp_budget
+
+#Rough seconds for commands that have no DELAY after them
+ESTIMATED_SECONDS = {
+    "MOUNT SOLVEANDSYNC": 15,
+    "MOUNT UNPARK": 5,
+    "AUTOFOCUS": ssp_budget.AUTOFOCUS_ALLOWANCE
+}
+
+def command_seconds(command) -> float:
+    if command.keyword == "DELAY":
+        return ssp_scs.number(command.args) or 0
+    return ESTIMATED_SECONDS.get(command.keyword, 0)
+
+def estimate_seconds(commands) -> float:
+    #Running time of commands that capture nothing, a meridian flip or a solve
+    return sum(command_seconds(command) for command in commands)
+
+def manifest_path(sequence_path) -> Path:
+    return Path(sequence_path).with_suffix(".manifest.jsonl")
+
+def wait_until(args):
+    #"9:30 PM" style LOCALTIME to 24 hour "21:30"
+    text = ssp_scs.unquote(args).strip().upper()
+    try:
+        clock, half = text.split()
+        hour, minute = clock.split(":")
+        hour = int(hour) % 12 + (12 if half == "PM" else 0)
+        return str(hour).zfill(2) + ":" + minute.zfill(2)
+    except ValueError:
+        return None
+
+def filter_name(module, slot, target):
+    #The wheel slot, or for C6H's drawer filters the _lpro style suffix of the target name
+    if slot is not None:
+        try:
+            return module.Filters(slot).name
+        except ValueError:
+            return None
+    if target is None or "_" not in target:
+        return None
+    suffix = target.rsplit("_", 1)[1].upper()
+    for filter_type in module.Filters:
+        if filter_type.name.startswith(suffix):
+            return filter_type.name
+    return None
+
+def build_manifest(commands, rig, sequence=None) -> list:
+    module = ssp_plan.rig_module(rig)
+    telescope = module.RIG_TELESCOPE
+    #The same dither time the generator charged, calibrated when the rig has a settle file
+    dither_seconds = ssp_budget.settled_dither(module)
+    baked = ssp_budget.baked_dither(module)
+
+    header = {"type": "sequence", "rig": rig, "sequence": None if sequence is None else str(sequence), "start": None, "generated": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    blocks = []
+    clock = 0.0
+    last_end = 0.0
+    for command, state in ssp_scs.walk(commands):
+        keyword = command.keyword
+        if keyword == "WAIT UNTIL LOCALTIME":
+            header["start"] = wait_until(command.args)
+            clock = 0.0
+            last_end = 0.0
+        elif keyword == "CAPTURE":
+            frames = ssp_scs.parse_capture(command.args) or 0
+            name = filter_name(module, state.wheel_slot, state.target)
+            exposure = state.exposure
+            every = state.dither
+            seconds = exposure or 0
+            if name is not None:
+                table_exposure, timediv, table_every = ssp_budget.capture_values(module, name)
+                exposure = exposure if exposure is not None else table_exposure
+                every = every if every is not None else table_every
+                seconds = ssp_budget.frame_cost(exposure, timediv, table_every, baked, every, dither_seconds)
+            dither_share = dither_seconds / every if every else 0
+            blocks.append({
+                "type": "block",
+                "index": len(blocks),
+                "line": command.line_no,
+                "target": state.target,
+                "filter": name,
+                "slot": state.wheel_slot,
+                "coords": state.coords,
+                "exposure": exposure,
+                "frames": frames,
+                "dither_every": every,
+                "start": round(clock, 1),
+                "end": round(clock + frames * seconds, 1),
+                "frame_seconds": round(seconds, 3),
+                "overhead": {
+                    "lead_in": round(clock - last_end, 1),
+                    "per_frame": round(frames * (seconds - (exposure or 0) - dither_share), 1),
+                    "dither": round(frames * dither_share, 1)
+                }
+            })
+            clock += frames * seconds
+            last_end = clock
+        else:
+            clock += command_seconds(command)
+    header["seconds"] = round(clock, 1)
+    return [header] + blocks
+
+def write_manifest(sequence_path, rig) -> Path:
+    path = manifest_path(sequence_path)
+    records = build_manifest(ssp_scs.read_sequence(sequence_path), rig, Path(sequence_path).name)
+    with path.open("w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    return path
+
+def read_manifest(path) -> tuple:
+    header = None
+    blocks = []
+    with Path(path).open("r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("type") == "sequence":
+                header = record
+            elif record.get("type") == "block":
+                blocks.append(record)
+    return header, blocks
+
+def match_block(blocks, header, path):
+    #Block a frame belongs to: same target, then same filter, then same exposure
+    names = set(part.lower() for part in Path(path).parts)
+    target = header.get("OBJECT")
+    candidates = [
+        block for block in blocks
+        if block["target"] is not None and (
+            (isinstance(target, str) and target.lower() == block["target"].lower()) or block["target"].lower() in names
+        )
+    ]
+    frame_filter = header.get("FILTER")
+    if isinstance(frame_filter, str):
+        narrowed = [block for block in candidates if block["filter"] is not None and block["filter"].lower() == frame_filter.strip().lower()]
+        candidates = narrowed or candidates
+    exposure = ssp_fits.exposure_of(header)
+    if exposure is not None:
+        narrowed = [block for block in candidates if block["exposure"] is not None and abs(block["exposure"] - exposure) < 0.01]
+        candidates = narrowed or candidates
+    return candidates[0] if candidates else None
+
+def ingest(manifest, fits_paths) -> dict:
+    sequence, blocks = read_manifest(manifest)
+    rig = sequence["rig"] if sequence else None
+    frames = {block["index"]: [] for block in blocks}
+    unmatched = 0
+    for path in ssp_fits.fits_files(fits_paths):
+        try:
+            header = ssp_fits.read_header(path)
+        except (OSError, ValueError):
+            unmatched += 1
+            continue
+        #Flats and darks shot into the same folders aren't frames of any block
+        if not ssp_fits.is_light(header, path):
+            continue
+        block = match_block(blocks, header, path)
+        if block is None:
+            unmatched += 1
+            continue
+        frames[block["index"]].append(ssp_fits.observed_at(header))
+
+    results = []
+    totals = {}
+    for block in blocks:
+        times = sorted(when for when in frames[block["index"]] if when is not None)
+        actual = len(frames[block["index"]])
+        cadence = None
+        if len(times) > 1:
+            cadence = (times[-1] - times[0]).total_seconds() / (len(times) - 1)
+        results.append({
+            "index": block["index"],
+            "target": block["target"],
+            "filter": block["filter"],
+            "planned_frames": block["frames"],
+            "actual_frames": actual,
+            "planned_frame_seconds": block["frame_seconds"],
+            "actual_frame_seconds": None if cadence is None else round(cadence, 3)
+        })
+        total = totals.setdefault((rig, block["filter"]), {"planned_frames": 0, "actual_frames": 0, "planned_seconds": 0.0, "timed_frames": 0, "timed_seconds": 0.0})
+        total["planned_frames"] += block["frames"]
+        total["actual_frames"] += actual
+        total["planned_seconds"] += block["frames"] * block["frame_seconds"]
+        if cadence is not None:
+            total["timed_frames"] += len(times) - 1
+            total["timed_seconds"] += cadence * (len(times) - 1)
+
+    summary = []
+    for (rig_name, name), total in totals.items():
+        planned = total["planned_seconds"] / total["planned_frames"] if total["planned_frames"] else None
+        actual = total["timed_seconds"] / total["timed_frames"] if total["timed_frames"] else None
+        summary.append({
+            "rig": rig_name,
+            "filter": name,
+            "planned_frames": total["planned_frames"],
+            "actual_frames": total["actual_frames"],
+            "planned_frame_seconds": None if planned is None else round(planned, 3),
+            "actual_frame_seconds": None if actual is None else round(actual, 3)
+        })
+    return {"manifest": str(manifest), "rig": rig, "unmatched_files": unmatched, "blocks": results, "filters": summary}
+
+def format_seconds(value) -> str:
+    return "-" if value is None else "%.2f" % value
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Write sequence manifests and compare them with captured frames")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    write_parser = commands.add_parser("write", help="write the manifest of an existing .scs file")
+    write_parser.add_argument("sequence")
+    write_parser.add_argument("--rig", choices=sorted(ssp_plan.RIGS), required=True)
+
+    ingest_parser = commands.add_parser("ingest", help="match FITS files to a manifest")
+    ingest_parser.add_argument("manifest")
+    ingest_parser.add_argument("fits", nargs="+", help="FITS files or directories")
+    ingest_parser.add_argument("--json", dest="json_path", help="write the report as JSON ('-' for stdout)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "write":
+        print("Manifest written to " + str(write_manifest(args.sequence, args.rig)))
+        return
+
+    report = ingest(args.manifest, args.fits)
+    if args.json_path == "-":
+        print(json.dumps(report, indent=2))
+        return
+    for block in report["blocks"]:
+        print(
+            str(block["index"]).rjust(3) + " " + str(block["target"]).ljust(20) + str(block["filter"]).ljust(10)
+            + (str(block["actual_frames"]) + "/" + str(block["planned_frames"])).rjust(10)
+            + "  s/frame " + format_seconds(block["actual_frame_seconds"]) + " (planned " + format_seconds(block["planned_frame_seconds"]) + ")"
+        )
+    for total in report["filters"]:
+        print(
+            str(total["rig"]) + " " + str(total["filter"]).ljust(10) + (str(total["actual_frames"]) + "/" + str(total["planned_frames"])).rjust(10)
+            + " frames, s/frame " + format_seconds(total["actual_frame_seconds"]) + " (planned " + format_seconds(total["planned_frame_seconds"]) + ")"
+        )
+    print(str(report["unmatched_files"]) + " files matched no block")
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+# Meridian flip prediction for plans with a site and date
+#
+# A German equatorial mount has to flip when a target crosses the meridian, and guiding is
+# lost for the rest of any CAPTURE running at the time. When a plan names its site and the
+# date of the night, ssp_plan walks the estimated timeline of the sequence (the same
+# estimate as the manifest, see ssp_manifest.py) and, for a capture that would cross the
+# meridian, asks the rig to stop capturing at the meridian, wait FLIP_WAIT seconds for the
+# target to be clearly past it, GOTO so the mount flips, solve again and restart guiding
+# before capturing the rest. The frames the flip costs come off the second half.
+
+import math
+from datetime import datetime, timedelta, timezone
+
+import ssp_scs
+import ssp_astro
+import ssp_manifest
+
+#Seconds to wait after the meridian before the GOTO, so the mount takes the other side
+FLIP_WAIT = 300
+#Degrees the mount swings through when it flips, for the settle after the GOTO
+FLIP_SLEW = 180
+SIDEREAL_DAY = 86164.0905
+
+def night_start(date, start, site) -> datetime:
+    #The plan's HH:MM start on the night of date (YYYY-MM-DD), morning times are the next day
+    hour, minute = (int(value) for value in start.split(":"))
+    when = datetime.strptime(date, "%Y-%m-%d").replace(hour=hour, minute=minute)
+    if hour < 12:
+        when += timedelta(days=1)
+    if site.utc_offset is None:
+        return when.astimezone()
+    return when.replace(tzinfo=timezone(timedelta(hours=site.utc_offset)))
+
+def seconds_to_meridian(ra, longitude, when) -> float:
+    #Seconds until a position in degrees next crosses the meridian, 0 when it's on it
+    hour_angle = ssp_astro.hour_angle(ra, ssp_astro.local_sidereal_time(when, longitude))
+    return (-hour_angle % 24) / 24 * SIDEREAL_DAY
+
+def find_flip(text, rig, coords, site, start):
+    #(capture number within the block, frames before the flip, seconds per frame) for the
+    #first capture of a rendered target block that crosses the meridian, or None
+    ra, _ = ssp_astro.coords_to_degrees(coords)
+    records = ssp_manifest.build_manifest(ssp_scs.parse_sequence(text.splitlines()), rig)
+    for number, block in enumerate(records[1:]):
+        if block["frames"] <= 0 or block["frame_seconds"] <= 0:
+            continue
+        crossing = seconds_to_meridian(ra, site.longitude, start + timedelta(seconds=block["start"]))
+        if crossing < block["end"] - block["start"]:
+            return number, math.floor(crossing / block["frame_seconds"]), block["frame_seconds"]
+    return None
+
+def block_seconds(text, rig) -> float:
+    #Estimated running time of a rendered target block
+    return ssp_manifest.build_manifest(ssp_scs.parse_sequence(text.splitlines()), rig)[0]["seconds"]
+
+def frames_after(frame_qty, before, flip_text, frame_seconds) -> int:
+    #What's left of a capture once the frames before the flip and the flip itself are taken out
+    lost = math.ceil(ssp_manifest.estimate_seconds(ssp_scs.parse_sequence(flip_text.splitlines())) / frame_seconds)
+    return max(0, frame_qty - before - lost)
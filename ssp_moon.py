@@ -0,0 +1,169 @@
+# Moon position, phase and glare for choosing between broadband and narrowband filters
+#   ssp_moon.py --site backyard --date 2026-10-19 --start 21:00 --hours 8 m31 m42 ngc7000
+#
+# Positions use the Astronomical Almanac's low precision series (a few tenths of a degree,
+# plenty for avoidance), the phase comes from the Moon's elongation from the Sun.
+#
+# The Moon is worked out once per step of the night's time grid and the targets are kept
+# as unit vectors, so a separation is one dot product and a whole candidate list against
+# the whole night is a single pass over the grid.
+#
+# Glare at a moment is the illuminated fraction scaled by how close the Moon is:
+#     illumination * (1 - separation / 180), 0 while the Moon is down
+# A target whose mean glare over its window reaches NARROWBAND_GLARE is better spent on
+# narrowband, the rig's MOON_FILTER, and on a darker sky on broadband, its DARK_FILTER. A
+# plan target with filter "AUTO" gets whichever suits its window (see ssp_plan.py).
+
+import math
+import argparse
+from datetime import timedelta
+
+import ssp_astro
+
+#Minutes between grid points
+GRID_STEP = 30
+#Mean glare from which narrowband gets more useful signal per hour than broadband
+NARROWBAND_GLARE = 0.25
+
+def centuries(when) -> float:
+    return (ssp_astro.julian_date(when) - 2451545.0) / 36525
+
+def sin_deg(degrees) -> float:
+    return math.sin(math.radians(degrees))
+
+def cos_deg(degrees) -> float:
+    return math.cos(math.radians(degrees))
+
+def ecliptic_to_equatorial(longitude, latitude, t) -> tuple:
+    obliquity = math.radians(23.4393 - 0.013 * t)
+    lon = math.radians(longitude)
+    lat = math.radians(latitude)
+    x = math.cos(lat) * math.cos(lon)
+    y = math.cos(obliquity) * math.cos(lat) * math.sin(lon) - math.sin(obliquity) * math.sin(lat)
+    z = math.sin(obliquity) * math.cos(lat) * math.sin(lon) + math.cos(obliquity) * math.sin(lat)
+    return math.degrees(math.atan2(y, x)) % 360, math.degrees(math.asin(max(-1.0, min(1.0, z))))
+
+def moon_position(when) -> tuple:
+    #Geocentric (ra, dec, horizontal parallax) in degrees
+    t = centuries(when)
+    longitude = (
+        218.32 + 481267.881 * t
+        + 6.29 * sin_deg(135.0 + 477198.87 * t) - 1.27 * sin_deg(259.3 - 413335.36 * t)
+        + 0.66 * sin_deg(235.7 + 890534.22 * t) + 0.21 * sin_deg(269.9 + 954397.74 * t)
+        - 0.19 * sin_deg(357.5 + 35999.05 * t) - 0.11 * sin_deg(186.5 + 966404.03 * t)
+    )
+    latitude = (
+        5.13 * sin_deg(93.3 + 483202.02 * t) + 0.28 * sin_deg(228.2 + 960400.89 * t)
+        - 0.28 * sin_deg(318.3 + 6003.15 * t) - 0.17 * sin_deg(217.6 - 407332.21 * t)
+    )
+    parallax = (
+        0.9508 + 0.0518 * cos_deg(135.0 + 477198.87 * t) + 0.0095 * cos_deg(259.3 - 413335.36 * t)
+        + 0.0078 * cos_deg(235.7 + 890534.22 * t) + 0.0028 * cos_deg(269.9 + 954397.74 * t)
+    )
+    ra, dec = ecliptic_to_equatorial(longitude, latitude, t)
+    return ra, dec, parallax
+
+def sun_position(when) -> tuple:
+    #Geocentric (ra, dec) in degrees
+    t = centuries(when)
+    days = t * 36525
+    mean_longitude = 280.460 + 0.9856474 * days
+    anomaly = 357.528 + 0.9856003 * days
+    return ecliptic_to_equatorial(mean_longitude + 1.915 * sin_deg(anomaly) + 0.020 * sin_deg(2 * anomaly), 0.0, t)
+
+def unit_vector(ra, dec) -> tuple:
+    ra = math.radians(ra)
+    dec = math.radians(dec)
+    return math.cos(dec) * math.cos(ra), math.cos(dec) * math.sin(ra), math.sin(dec)
+
+def angle(a, b) -> float:
+    return math.degrees(math.acos(max(-1.0, min(1.0, a[0] * b[0] + a[1] * b[1] + a[2] * b[2]))))
+
+def illumination(when) -> float:
+    #Illuminated fraction of the disc, 0 new to 1 full
+    moon_ra, moon_dec, _ = moon_position(when)
+    elongation = angle(unit_vector(moon_ra, moon_dec), unit_vector(*sun_position(when)))
+    return (1 - cos_deg(elongation)) / 2
+
+def night_grid(start, hours, step=GRID_STEP) -> list:
+    #Times from start across the hours, both ends included
+    steps = max(1, math.ceil(hours * 60 / step))
+    return [start + timedelta(minutes=min(n * step, hours * 60)) for n in range(steps + 1)]
+
+class MoonTrack:
+    #The Moon at every point of a time grid, seen from one site
+    def __init__(self, times, site):
+        self.times = times
+        self.vectors = []
+        self.altitudes = []
+        self.illumination = []
+        for when in times:
+            ra, dec, parallax = moon_position(when)
+            alt, _ = ssp_astro.alt_az(ra, dec, site.latitude, ssp_astro.local_sidereal_time(when, site.longitude))
+            self.vectors.append(unit_vector(ra, dec))
+            #Seen from the ground rather than the Earth's centre the Moon sits lower
+            self.altitudes.append(alt - parallax * cos_deg(alt))
+            sun = unit_vector(*sun_position(when))
+            self.illumination.append((1 - cos_deg(angle(self.vectors[-1], sun))) / 2)
+
+    def separations(self, positions) -> list:
+        #Degrees from each (ra, dec) position to the Moon, one row per position, one column per time
+        return [[angle(target, moon) for moon in self.vectors] for target in (unit_vector(ra, dec) for ra, dec in positions)]
+
+    def glare(self, row) -> list:
+        #Glare at each time for one row of separations
+        return [
+            illumination * (1 - separation / 180) if altitude > 0 else 0.0
+            for illumination, separation, altitude in zip(self.illumination, row, self.altitudes)
+        ]
+
+def mean_glare(track, row) -> float:
+    values = track.glare(row)
+    return sum(values) / len(values)
+
+def prefers_narrowband(glare) -> bool:
+    return glare >= NARROWBAND_GLARE
+
+def auto_filter(module, ra, dec, site, start, hours) -> str:
+    #Filter name for an AUTO plan target captured from start for hours
+    track = MoonTrack(night_grid(start, hours), site)
+    glare = mean_glare(track, track.separations([(ra, dec)])[0])
+    return (module.MOON_FILTER if prefers_narrowband(glare) else module.DARK_FILTER).name
+
+def main(argv=None) -> None:
+    import ssp_plan
+    import ssp_horizon
+    import ssp_meridian
+
+    parser = argparse.ArgumentParser(description="Moon separation and filter advice for targets over a night")
+    parser.add_argument("names", nargs="+", help="catalog names")
+    parser.add_argument("--site", required=True, help="site in " + str(ssp_horizon.site_dir))
+    parser.add_argument("--date", required=True, help="night as YYYY-MM-DD")
+    parser.add_argument("--start", default="21:00", help="local start time as HH:MM")
+    parser.add_argument("--hours", type=float, default=8.0)
+    args = parser.parse_args(argv)
+
+    try:
+        try:
+            site = ssp_horizon.load_site(args.site)
+        except FileNotFoundError:
+            raise ssp_plan.PlanError("no site " + args.site + " in " + str(ssp_horizon.site_dir))
+        start = ssp_meridian.night_start(ssp_plan.check_date(args.date), ssp_plan.check_start(args.start), site)
+        positions = [ssp_astro.coords_to_degrees(ssp_plan.resolve_coords(ssp_plan.PlanTarget(name, None, 0))) for name in args.names]
+    except ssp_plan.PlanError as e:
+        print("Plan error: " + str(e))
+        raise SystemExit(1)
+
+    track = MoonTrack(night_grid(start, args.hours), site)
+    up = sum(1 for altitude in track.altitudes if altitude > 0) / len(track.altitudes)
+    print("Moon " + str(round(100 * max(track.illumination))) + "% lit, up " + str(round(100 * up)) + "% of the night")
+
+    for name, row in zip(args.names, track.separations(positions)):
+        glare = mean_glare(track, row)
+        print(
+            name.ljust(16) + "closest " + str(round(min(row))).rjust(3) + " deg, glare " + "%.2f" % glare
+            + ", " + ("narrowband" if prefers_narrowband(glare) else "broadband")
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+# One night shared between the rigs running side by side
+#   ssp_multirig.py pool.json -o night          night_towa.scs, night_c6h.scs and night_carbonstar.scs
+#   ssp_multirig.py pool.json -o night --rig towa --rig carbonstar
+#
+# A pool file lists the targets wanted tonight and the night itself:
+#     {"start": "21:00", "hours": 8, "temperature": -10, "site": "backyard", "date": "2026-10-19",
+#      "rigs": {"c6h": {"hours": 6}},
+#      "targets": [
+#          {"name": "m31", "hours": 4},
+#          {"name": "ngc7000", "hours": 6, "filter": "narrowband"},
+#          {"name": "m42", "hours": 2, "filter": "HA", "copies": 2}
+#      ]}
+# A target's filter is "broadband" (the default, each rig's DARK_FILTER), "narrowband" (its
+# MOON_FILTER), AUTO (see ssp_moon.py) or a filter name, which leaves it to the rigs that have
+# that filter. Each target goes to one rig unless copies says more can shoot it. Names that are
+# the same object (see ssp_aliases.py) are merged before anything is shared out. "rigs" is
+# optional and changes hours or temperature for one rig.
+#
+# Useful integration from an hour of a rig on a target is the hour times
+#     exposure / TIMEDIV     the share of each frame's time spent exposing with that filter
+#     framing                1 when the target fits the rig's FIELD_OF_VIEW, less for one that
+#                            spills out of the field or only fills a corner of it
+# Sizes come from the target's "size" in arcmin or else OpenNGC, targets without one are
+# taken to fit every rig. With a site and date a target only gets the hours it spends above
+# min_alt (30 unless the pool says).
+#
+# solve() hands targets out best useful integration per hour first, the targets that would
+# lose most on their next best rig first among equals, then moves targets to another rig
+# while that frees time for more integration than it costs. A few hundred targets take a
+# few milliseconds.
+#
+# Each rig gets a plan file next to its sequence, and the sequences are generated in
+# parallel processes.
+
+import json
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import ssp_plan
+import ssp_astro
+import ssp_aliases
+import ssp_manifest
+
+#Shortest share of the night worth slewing to a target for
+MIN_HOURS = 0.5
+#A target filling less of the short side of the field than this loses detail in proportion
+MIN_FILL = 0.15
+BROADBAND = "broadband"
+NARROWBAND = "narrowband"
+#Improvements smaller than this, in useful hours, aren't worth another pass
+EPSILON = 1e-6
+
+class Candidate:
+    def __init__(self, name, hours, filter_name=BROADBAND, copies=1, size=None, coords=None):
+        self.name = name
+        self.hours = hours
+        self.filter_name = filter_name
+        self.copies = copies
+        self.size = size
+        self.coords = coords
+
+    @classmethod
+    def from_dict(cls, data):
+        coords = data.get("coords")
+        if coords is not None:
+            coords = tuple(str(value) for value in coords)
+        size = data.get("size")
+        return cls(
+            data["name"], float(data["hours"]), data.get("filter", BROADBAND), int(data.get("copies", 1)),
+            None if size is None else float(size), coords
+        )
+
+class RigProfile:
+    def __init__(self, rig, hours, temperature):
+        self.rig = rig
+        self.hours = hours
+        self.temperature = temperature
+        self.module = ssp_plan.rig_module(rig)
+        self.field = self.module.FIELD_OF_VIEW[self.module.RIG_TELESCOPE]
+
+    def filter_for(self, filter_name):
+        #The rig's filter for a pool filter, None when the rig has nothing like it
+        if filter_name == BROADBAND:
+            return self.module.DARK_FILTER.name
+        if filter_name == NARROWBAND:
+            return self.module.MOON_FILTER.name
+        if filter_name in self.module.Filters.__members__:
+            return filter_name
+        return None
+
+    def efficiency(self, filter_name) -> float:
+        telescope = self.module.RIG_TELESCOPE
+        filter_type = self.module.Filters[filter_name]
+        return self.module.EXPOSURE[telescope][filter_type] / self.module.TIMEDIV[telescope][filter_type]
+
+    def framing(self, size) -> float:
+        if size is None:
+            return 1.0
+        short = min(self.field)
+        if size > short:
+            return (short / size) ** 2
+        return min(1.0, size / short / MIN_FILL)
+
+def useful_rate(profile, filter_name, size) -> float:
+    #Useful hours per hour of the rig
+    return profile.efficiency(filter_name) * profile.framing(size)
+
+def merge_aliases(candidates) -> list:
+    #One candidate per object, the most hours and copies asked for under any of its names
+    merged = {}
+    for candidate in candidates:
+        key = ssp_aliases.canonical(candidate.name)
+        first = merged.get(key)
+        if first is None:
+            merged[key] = candidate
+            continue
+        print("Note: " + candidate.name + " is the same object as " + first.name + ", planned once")
+        first.hours = max(first.hours, candidate.hours)
+        first.copies = max(first.copies, candidate.copies)
+        if first.size is None:
+            first.size = candidate.size
+    return list(merged.values())
+
+def target_size(candidate, sizes):
+    if candidate.size is not None:
+        return candidate.size
+    for name in (candidate.name,) + ssp_aliases.aliases(candidate.name):
+        if name in sizes:
+            return sizes[name]
+    return None
+
+def refill(rig, free, options, used, assigned, skip=None) -> tuple:
+    #(value, [(candidate, hours)]) the best greedy use of free hours on a rig
+    value = 0.0
+    picked = []
+    for rate, c, limit in options[rig]:
+        if free < MIN_HOURS:
+            break
+        if c == skip or (c, rig) in assigned or used[c] <= 0:
+            continue
+        share = min(limit, free)
+        if share >= MIN_HOURS:
+            picked.append((c, share))
+            value += share * rate
+            free -= share
+    return value, picked
+
+def solve(rates, limits, copies, capacity) -> dict:
+    #(candidate, rig) to hours. rates[c] maps each rig that can take candidate c to its useful
+    #rate, limits[c] is the most hours c can use on one rig and capacity[rig] the rig's night
+    assigned = {}
+    used = list(copies)
+    left = dict(capacity)
+    #Per rig, candidates best first, for refilling time that a move frees up
+    options = {rig: [] for rig in capacity}
+    order = []
+    for c, rig_rates in enumerate(rates):
+        ranked = sorted(rig_rates.values(), reverse=True)
+        regret = ranked[0] - ranked[1] if len(ranked) > 1 else ranked[0] if ranked else 0.0
+        for rig, rate in rig_rates.items():
+            order.append((-rate, -regret, c, rig))
+            options[rig].append((rate, c, limits[c]))
+    for rig in options:
+        options[rig].sort(key=lambda option: (-option[0], option[1]))
+
+    order.sort()
+    for _, _, c, rig in order:
+        if used[c] <= 0:
+            continue
+        share = min(limits[c], left[rig])
+        if share >= MIN_HOURS:
+            assigned[(c, rig)] = share
+            used[c] -= 1
+            left[rig] -= share
+
+    #Move a target to another rig when the time it frees holds more than the move loses
+    improved = True
+    while improved:
+        improved = False
+        for (c, rig), share in sorted(assigned.items()):
+            for other, rate in rates[c].items():
+                if other == rig or (c, other) in assigned:
+                    continue
+                moved = min(limits[c], left[other])
+                if moved < MIN_HOURS:
+                    continue
+                before, _ = refill(rig, left[rig], options, used, assigned)
+                after, picked = refill(rig, left[rig] + share, options, used, assigned, c)
+                gain = moved * rate - share * rates[c][rig] + after - before
+                if gain <= EPSILON:
+                    continue
+                del assigned[(c, rig)]
+                left[rig] += share
+                assigned[(c, other)] = moved
+                left[other] -= moved
+                for filler, hours in picked:
+                    assigned[(filler, rig)] = hours
+                    used[filler] -= 1
+                    left[rig] -= hours
+                improved = True
+                break
+            if improved:
+                break
+    return assigned
+
+def load_pool(path) -> dict:
+    with Path(path).open("r", encoding="utf-8") as f:
+        pool = json.load(f)
+    if not isinstance(pool, dict) or "targets" not in pool:
+        raise ssp_plan.PlanError("malformed pool: it needs a targets list")
+    return pool
+
+def share_night(pool, rigs) -> tuple:
+    #({rig: the Plan it gets}, names no rig could take)
+    hours = float(pool.get("hours", 8))
+    temperature = int(pool.get("temperature", 100))
+    overrides = pool.get("rigs", {})
+    profiles = [
+        RigProfile(rig, float(overrides.get(rig, {}).get("hours", hours)), int(overrides.get(rig, {}).get("temperature", temperature)))
+        for rig in rigs
+    ]
+    try:
+        candidates = merge_aliases([Candidate.from_dict(data) for data in pool["targets"]])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ssp_plan.PlanError("malformed pool target: " + str(e))
+    for candidate in candidates:
+        candidate.coords = ssp_plan.resolve_coords(candidate)
+
+    site = start = None
+    limits = [candidate.hours for candidate in candidates]
+    if pool.get("site") and pool.get("date") and pool.get("start"):
+        import ssp_horizon
+        import ssp_meridian
+        import ssp_projects
+        site = ssp_horizon.load_site(pool["site"])
+        start = ssp_meridian.night_start(pool["date"], pool["start"], site)
+        clear = ssp_projects.visible_hours(candidates, site, start, max(profile.hours for profile in profiles), float(pool.get("min_alt", 30)))
+        limits = [min(limit, hours) for limit, hours in zip(limits, clear)]
+
+    sizes = ssp_aliases.read_sizes()
+    rates = []
+    filters = []
+    for candidate in candidates:
+        size = target_size(candidate, sizes)
+        rig_rates = {}
+        rig_filters = {}
+        for profile in profiles:
+            filter_name = profile.filter_for(candidate.filter_name)
+            if candidate.filter_name == ssp_plan.AUTO_FILTER:
+                if start is None:
+                    raise ssp_plan.PlanError("target " + candidate.name + " has filter AUTO but the pool has no site, date and start")
+                import ssp_moon
+                ra, dec = ssp_astro.coords_to_degrees(candidate.coords)
+                filter_name = ssp_moon.auto_filter(profile.module, ra, dec, site, start, profile.hours)
+            if filter_name is None:
+                continue
+            rig_rates[profile.rig] = useful_rate(profile, filter_name, size)
+            rig_filters[profile.rig] = filter_name
+        rates.append(rig_rates)
+        filters.append(rig_filters)
+
+    assigned = solve(rates, limits, [candidate.copies for candidate in candidates], {profile.rig: profile.hours for profile in profiles})
+
+    plans = {}
+    for profile in profiles:
+        chosen = sorted(c for c, rig in assigned if rig == profile.rig)
+        if site is not None:
+            #Targets setting soonest go first
+            lst = ssp_astro.local_sidereal_time(start, site.longitude)
+            chosen.sort(key=lambda c: -ssp_astro.hour_angle(ssp_astro.coords_to_degrees(candidates[c].coords)[0], lst))
+        targets = [
+            ssp_plan.PlanTarget(candidates[c].name, filters[c][profile.rig], round(assigned[(c, profile.rig)], 2), candidates[c].coords)
+            for c in chosen
+        ]
+        plans[profile.rig] = ssp_plan.Plan(
+            profile.rig, targets, profile.temperature, pool.get("start"), pool.get("dithers_per_hour"), pool.get("site"), pool.get("date")
+        )
+    unplaced = [candidate.name for c, candidate in enumerate(candidates) if not any(key[0] == c for key in assigned)]
+    return plans, unplaced
+
+def write_sequence(plan, path) -> str:
+    #Runs in a worker process, one per rig
+    ssp_plan.generate_file(plan, path)
+    ssp_manifest.write_manifest(path, plan.rig)
+    return str(path)
+
+def write_sequences(plans, prefix) -> list:
+    paths = []
+    for rig, plan in plans.items():
+        path = Path(str(prefix) + "_" + rig + ".scs")
+        ssp_plan.save_plan(plan, path.with_suffix(".json"))
+        paths.append(path)
+    with ProcessPoolExecutor(max_workers=max(1, len(plans))) as pool:
+        return list(pool.map(write_sequence, plans.values(), paths))
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Share one night's targets between the rigs and write a sequence for each")
+    parser.add_argument("pool", help="pool file (.json)")
+    parser.add_argument("-o", "--output", required=True, help="prefix for the plans and sequences, _<rig>.scs is added")
+    parser.add_argument("--rig", action="append", choices=sorted(ssp_plan.RIGS), help="rigs taking part (default: all of them)")
+    args = parser.parse_args(argv)
+
+    try:
+        plans, unplaced = share_night(load_pool(args.pool), args.rig or list(ssp_plan.RIGS))
+        for rig, plan in plans.items():
+            print(rig + ":")
+            for target in plan.targets:
+                print("  " + target.name.ljust(16) + target.filter_name.ljust(10) + str(target.hours) + " h")
+        if unplaced:
+            print("Not placed: " + ", ".join(unplaced))
+        for path in write_sequences(plans, args.output):
+            print("Sequence written to " + path)
+    except ssp_plan.PlanError as e:
+        print("Plan error: " + str(e))
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+# Plan files for generating sequences without the interactive prompts
+#
+# A plan is a JSON file naming the rig, the session settings and the targets in order:
+#     {
+#         "rig": "carbonstar",
+#         "temperature": -10,
+#         "start": "21:30",
+#         "dithers_per_hour": 4,
+#         "site": "backyard",
+#         "date": "2026-10-19",
+#         "targets": [
+#             {"name": "m101", "filter": "RGB", "hours": 3, "focus": 5000},
+#             {"name": "my_comet", "filter": "LUMINANCE", "hours": 1,
+#              "coords": ["12", "30", "0", "45", "0", "0"]}
+#         ]
+#     }
+# Filters use the names of the rig's Filters enum, "temperature" 100 (or missing) leaves the
+# cooler off and targets without "coords" are looked up in the catalog by name.
+# "dithers_per_hour" is optional, it replaces the rig's DITHER table with a cadence worked
+# out from the rig's dither settle time (see ssp_budget.py).
+# "site" (a site in sites/, see ssp_horizon.py) and "date", the night the plan starts on,
+# are optional together with "start". With all three the generator predicts meridian
+# crossings and splits the captures around a flip (see ssp_meridian.py). They also let a
+# target use the filter "AUTO", narrowband or broadband depending on the Moon (see ssp_moon.py).
+#
+# generate() can take a BlockCache, it then renders each target block once and reuses the
+# text while the block's inputs are unchanged, so editing one target of a long plan only
+# renders that target again (and any later block whose settle delays or cooler state
+# moved with it).
+
+import io
+import json
+import hashlib
+import importlib
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import ssp_astro
+import ssp_profile
+import ssp_catalog
+
+RIGS = {
+    "towa": "ssp_towa",
+    "c6h": "ssp_c6h",
+    "carbonstar": "ssp_carbonstar"
+}
+
+class PlanError(Exception):
+    pass
+
+#Filter name for a target left to the Moon
+AUTO_FILTER = "AUTO"
+
+def rig_module(rig):
+    if rig not in RIGS:
+        raise PlanError("unknown rig " + str(rig) + ", use " + ", ".join(RIGS))
+    return importlib.import_module(RIGS[rig])
+
+class PlanTarget:
+    def __init__(self, name, filter_name, hours, coords=None, focus=-1):
+        self.name = name
+        self.filter_name = filter_name
+        self.hours = hours
+        self.coords = coords
+        self.focus = focus
+
+    @classmethod
+    def from_dict(cls, data):
+        coords = data.get("coords")
+        if coords is not None:
+            coords = tuple(str(value) for value in coords)
+            if len(coords) != 6:
+                raise PlanError("target " + str(data.get("name")) + " coords need 6 values (ra h m s, dec d m s), not " + str(len(coords)))
+        return cls(data["name"], data["filter"], float(data["hours"]), coords, int(data.get("focus", -1)))
+
+    def as_dict(self) -> dict:
+        data = {"name": self.name, "filter": self.filter_name, "hours": self.hours}
+        if self.coords is not None:
+            data["coords"] = list(self.coords)
+        if self.focus != -1:
+            data["focus"] = self.focus
+        return data
+
+def check_start(start):
+    #HH:MM as generate() and ssp_meridian read it, None for a plan that starts straight away
+    if start is None:
+        return None
+    try:
+        datetime.strptime(str(start), "%H:%M")
+    except ValueError:
+        raise PlanError("start must be a time as HH:MM, not " + str(start))
+    return str(start)
+
+def check_date(date):
+    if date is None:
+        return None
+    try:
+        datetime.strptime(str(date), "%Y-%m-%d")
+    except ValueError:
+        raise PlanError("date must be a night as YYYY-MM-DD, not " + str(date))
+    return str(date)
+
+class Plan:
+    def __init__(self, rig, targets, temperature=100, start=None, dithers_per_hour=None, site=None, date=None):
+        self.rig = rig
+        self.targets = targets
+        self.temperature = temperature
+        self.start = start
+        self.dithers_per_hour = dithers_per_hour
+        self.site = site
+        self.date = date
+
+    @classmethod
+    def from_dict(cls, data):
+        try:
+            targets = [PlanTarget.from_dict(target) for target in data["targets"]]
+            dithers_per_hour = data.get("dithers_per_hour")
+            if dithers_per_hour is not None:
+                dithers_per_hour = float(dithers_per_hour)
+            start = check_start(data.get("start"))
+            date = check_date(data.get("date"))
+            return cls(data["rig"], targets, int(data.get("temperature", 100)), start, dithers_per_hour, data.get("site"), date)
+        except (KeyError, TypeError, ValueError) as e:
+            raise PlanError("malformed plan: " + str(e))
+
+    def as_dict(self) -> dict:
+        data = {"rig": self.rig, "temperature": self.temperature}
+        if self.start is not None:
+            data["start"] = self.start
+        if self.dithers_per_hour is not None:
+            data["dithers_per_hour"] = self.dithers_per_hour
+        if self.site is not None:
+            data["site"] = self.site
+        if self.date is not None:
+            data["date"] = self.date
+        data["targets"] = [target.as_dict() for target in self.targets]
+        return data
+
+def load_plan(path) -> Plan:
+    with Path(path).open("r", encoding="utf-8") as f:
+        return Plan.from_dict(json.load(f))
+
+def save_plan(plan, path) -> None:
+    with Path(path).open("w", encoding="utf-8") as f:
+        json.dump(plan.as_dict(), f, indent=2)
+
+def resolve_coords(target, catalog=ssp_catalog.master_catalog) -> tuple:
+    if target.coords is not None:
+        return target.coords
+    #A single run is quicker against the sorted index, bulk runs against the in memory one
+    if catalog == ssp_catalog.master_catalog and ssp_catalog.index_is_fresh():
+        coords = ssp_catalog.find(target.name)
+    else:
+        coords = ssp_catalog.lookup(target.name, catalog)
+    if coords is None:
+        raise PlanError("target " + target.name + " is not in the catalog and has no coords")
+    return coords
+
+#Session state one target block hands on to the next
+CARRIED_STATE = ("mount_coords", "wheel_slot", "cooler_temp", "cooler_settled")
+
+def carried_state(session) -> tuple:
+    return tuple(getattr(session, name) for name in CARRIED_STATE)
+
+class BlockCache:
+    #Rendered target blocks with the session state they leave behind, least recently used
+    #blocks are dropped past the limit
+    def __init__(self, limit=4096):
+        self.limit = limit
+        self.blocks = {}
+
+    def get(self, key):
+        block = self.blocks.pop(key, None)
+        if block is not None:
+            self.blocks[key] = block
+        return block
+
+    def put(self, key, block) -> None:
+        self.blocks[key] = block
+        while len(self.blocks) > self.limit:
+            del self.blocks[next(iter(self.blocks))]
+
+    @classmethod
+    def load(cls, path, limit=4096):
+        cache = cls(limit)
+        try:
+            with Path(path).open("r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return cache
+        try:
+            for key, (text, state) in data.items():
+                #JSON turned the mount coords tuple into a list
+                cache.put(key, (text, tuple(tuple(value) if isinstance(value, list) else value for value in state)))
+        except (TypeError, ValueError):
+            #Written by an older version, start again
+            return cls(limit)
+        return cache
+
+    def save(self, path) -> None:
+        with Path(path).open("w", encoding="utf-8") as f:
+            json.dump(self.blocks, f)
+
+def session_key(module, plan, session) -> str:
+    #The part of every block key shared by the whole plan: rig script, settings and settle model
+    settle = sorted((operation.value, rule.base, rule.per_unit, rule.minimum) for operation, rule in session.settle.rules.items())
+    return repr((plan.rig, Path(module.__file__).stat().st_mtime_ns, session.temperature, session.dithers_per_hour, settle))
+
+def block_key(prefix, target, coords, session) -> str:
+    #The target itself, where the previous block left the mount, wheel and cooler and any flip
+    inputs = (target.name, target.filter_name, tuple(coords), target.hours, target.focus, carried_state(session), session.meridian_flip)
+    return hashlib.sha256((prefix + repr(inputs)).encode("utf-8")).hexdigest()
+
+def render_target(session, target, coords) -> str:
+    outfile = session.outfile
+    session.outfile = io.StringIO()
+    try:
+        with ssp_profile.stage("target_emission"):
+            session.write_plan_target(target.name, target.filter_name, coords, str(target.hours), target.focus)
+        return session.outfile.getvalue()
+    finally:
+        session.outfile = outfile
+
+def render_block(session, target, coords, cache, prefix) -> str:
+    #Text of a target block, from the cache when its inputs are unchanged, leaving the session
+    #in the state the block hands on
+    if cache is None:
+        return render_target(session, target, coords)
+    key = block_key(prefix, target, coords, session)
+    block = cache.get(key)
+    if block is None:
+        ssp_profile.count("block_cache_misses")
+        block = (render_target(session, target, coords), carried_state(session))
+        cache.put(key, block)
+    else:
+        ssp_profile.count("block_cache_hits")
+    text, state = block
+    for name, value in zip(CARRIED_STATE, state):
+        setattr(session, name, value)
+    return text
+
+def generate(plan, outfile, catalog=ssp_catalog.master_catalog, cache=None) -> None:
+    #Drive the rig's Session the same way its interactive main() does
+    module = rig_module(plan.rig)
+    session = module.open_session(outfile)
+    filters = [target.filter_name for target in plan.targets]
+    for filter_name in filters:
+        if filter_name not in module.Filters.__members__ and filter_name != AUTO_FILTER:
+            raise PlanError("rig " + plan.rig + " has no filter " + filter_name)
+
+    if plan.start is None:
+        session.write_start_time(None, None)
+    else:
+        hour, minute = plan.start.split(":")
+        session.write_start_time(str(int(hour)), str(int(minute)))
+    session.temperature = str(plan.temperature)
+    session.dithers_per_hour = plan.dithers_per_hour
+    session.unpark()
+
+    prefix = session_key(module, plan, session) if cache is not None else None
+    clock = None
+    if plan.site is not None and plan.date is not None and plan.start is not None:
+        import ssp_horizon
+        import ssp_meridian
+        try:
+            site = ssp_horizon.load_site(plan.site)
+            clock = ssp_meridian.night_start(plan.date, plan.start, site)
+        except FileNotFoundError:
+            raise PlanError("no site " + plan.site + " in " + str(ssp_horizon.site_dir))
+        except (KeyError, ValueError) as e:
+            raise PlanError("can't place the plan at site " + plan.site + " on " + plan.date + ": " + str(e))
+    if clock is None and AUTO_FILTER in filters:
+        raise PlanError("filter " + AUTO_FILTER + " needs the plan's site, date and start")
+
+    for target in plan.targets:
+        coords = resolve_coords(target, catalog)
+        if target.filter_name == AUTO_FILTER:
+            import ssp_moon
+            ra, dec = ssp_astro.coords_to_degrees(coords)
+            filter_name = ssp_moon.auto_filter(module, ra, dec, site, clock, target.hours)
+            target = PlanTarget(target.name, filter_name, target.hours, target.coords, target.focus)
+        session.meridian_flip = None
+        if cache is None and clock is None:
+            with ssp_profile.stage("target_emission"):
+                session.write_plan_target(target.name, target.filter_name, coords, str(target.hours), target.focus)
+            continue
+        state = carried_state(session)
+        text = render_block(session, target, coords, cache, prefix)
+        if clock is not None:
+            #Render again split around the flip when a capture runs across the meridian
+            flip = ssp_meridian.find_flip(text, plan.rig, coords, site, clock)
+            if flip is not None:
+                for name, value in zip(CARRIED_STATE, state):
+                    setattr(session, name, value)
+                session.meridian_flip = flip
+                text = render_block(session, target, coords, cache, prefix)
+            clock += timedelta(seconds=ssp_meridian.block_seconds(text, plan.rig))
+        outfile.write(text)
+
+    session.shutdown()
+
+class SequenceBuffer(io.StringIO):
+    #Session.shutdown() closes its file, keep the text for generating in memory
+    def close(self) -> None:
+        self.text = self.getvalue()
+        super().close()
+
+def generate_file(plan, path, catalog=ssp_catalog.master_catalog, cache=None) -> None:
+    with Path(path).open("w") as outfile:
+        generate(plan, outfile, catalog, cache)
@@ -0,0 +1,161 @@
+# Timing and allocation instrumentation for the sequence generators
+#
+# The generators wrap their work in ssp_profile.stage("name") blocks, which cost nothing
+# until a Profiler is enabled, either from the command line:
+#     ssp_towa.py --profile report.json --cprofile run.prof --tracemalloc
+# or from code:
+#     profiler = ssp_profile.enable(allocations=True)
+#     ...
+#     ssp_profile.disable().write("report.csv")
+#
+# Stage times are wall clock and inclusive, so nested stages are also counted in their parents.
+
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+#cProfile, tracemalloc, csv and json are imported when first needed, the catalog lookup
+#path imports this module and has to start quickly
+
+class StageStats:
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.allocated = 0
+
+class Profiler:
+    def __init__(self, allocations=False, cprofile=False):
+        self.allocations = allocations
+        self.stages = {}
+        self.counts = {}
+        self.started = None
+        self.seconds = 0.0
+        self.cprofile = None
+        if cprofile:
+            import cProfile
+            self.cprofile = cProfile.Profile()
+
+    def start(self) -> None:
+        if self.allocations:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        self.started = time.perf_counter()
+
+    def stop(self) -> None:
+        self.seconds = time.perf_counter() - self.started
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        if self.allocations:
+            import tracemalloc
+            tracemalloc.stop()
+
+    @contextmanager
+    def stage(self, name):
+        stats = self.stages.setdefault(name, StageStats())
+        if self.allocations:
+            import tracemalloc
+            before = tracemalloc.get_traced_memory()[0]
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            stats.seconds += time.perf_counter() - began
+            stats.calls += 1
+            if self.allocations:
+                stats.allocated += tracemalloc.get_traced_memory()[0] - before
+
+    def count(self, name, n=1) -> None:
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def report(self) -> dict:
+        return {
+            "total_seconds": round(self.seconds, 6),
+            "stages": {
+                name: {
+                    "calls": stats.calls,
+                    "seconds": round(stats.seconds, 6),
+                    "allocated_bytes": stats.allocated if self.allocations else None
+                }
+                for name, stats in self.stages.items()
+            },
+            "counts": dict(self.counts)
+        }
+
+    def write(self, path) -> None:
+        #JSON unless the report path ends in .csv
+        import csv
+        import json
+        path = Path(path)
+        report = self.report()
+        if path.suffix.lower() == ".csv":
+            with path.open("w", encoding="utf-8", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["kind", "name", "calls", "seconds", "allocated_bytes"])
+                writer.writerow(["total", "run", 1, report["total_seconds"], ""])
+                for name, stats in report["stages"].items():
+                    allocated = "" if stats["allocated_bytes"] is None else stats["allocated_bytes"]
+                    writer.writerow(["stage", name, stats["calls"], stats["seconds"], allocated])
+                for name, n in report["counts"].items():
+                    writer.writerow(["count", name, n, "", ""])
+        else:
+            with path.open("w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    def dump_cprofile(self, path) -> None:
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(str(path))
+
+#Profiler receiving the stage() and count() calls, None when profiling is off
+active = None
+
+def enable(allocations=False, cprofile=False) -> Profiler:
+    global active
+    active = Profiler(allocations, cprofile)
+    active.start()
+    return active
+
+def disable() -> Profiler:
+    global active
+    profiler = active
+    active = None
+    if profiler is not None:
+        profiler.stop()
+    return profiler
+
+@contextmanager
+def stage(name):
+    if active is None:
+        yield
+    else:
+        with active.stage(name):
+            yield
+
+def count(name, n=1) -> None:
+    if active is not None:
+        active.count(name, n)
+
+def add_arguments(parser) -> None:
+    parser.add_argument("--profile", metavar="REPORT", help="write per stage timings to a .json or .csv report")
+    parser.add_argument("--cprofile", metavar="PATH", help="also dump cProfile stats for the run")
+    parser.add_argument("--tracemalloc", action="store_true", help="also record allocations per stage")
+
+def check_arguments(parser, args) -> None:
+    #Allocations only go in the --profile report, without one they'd be measured and dropped
+    if args.tracemalloc and not args.profile:
+        parser.error("--tracemalloc needs --profile to report the allocations in")
+
+def start_from_args(args) -> None:
+    if args.profile or args.cprofile:
+        enable(args.tracemalloc, args.cprofile is not None)
+
+def finish_from_args(args) -> None:
+    profiler = disable()
+    if profiler is None:
+        return
+    if args.profile:
+        profiler.write(args.profile)
+    if args.cprofile:
+        profiler.dump_cprofile(args.cprofile)
@@ -0,0 +1,319 @@
+# Multi-night projects: integration wanted per target and filter, what has been captured
+# towards it, and tonight's plan from whatever is furthest behind
+#   ssp_projects.py add m31 --rig carbonstar --filter HA --hours 20 --due 2026-12-31
+#   ssp_projects.py ingest night.manifest.jsonl D:/SharpCap/Captures/2026-10-19
+#   ssp_projects.py scan D:/SharpCap/Captures --rig towa
+#   ssp_projects.py status
+#   ssp_projects.py tonight --rig carbonstar --site backyard --date 2026-10-20 --start 21:00 --hours 8 -o tonight.json
+#
+# Everything lives in one SQLite file (projects.sqlite unless --db says otherwise). A project
+# is a target, filter and rig with a goal in hours, an optional due date and a priority weight.
+# Each light frame counted towards a project is kept once by path, so ingesting the same
+# folder again adds nothing, and the project's running total is updated with it so the queue
+# never has to sum years of frames.
+#
+# Targets are stored without the _h, _r, _lpro style suffixes the rigs add to TARGETNAME and
+# under their canonical name (see ssp_aliases.py), so frames of ngc1976 count towards m42. An
+# RGB project counts its rig's RED, GREEN and BLUE frames.
+#
+# How far behind a project is: the hours it should have by today (all of them without a due
+# date, a straight line from when it was added to its due date with one) less the hours it
+# has, as a share of the goal and times its priority. tonight keeps the projects that clear
+# the site's horizon and min altitude for at least MIN_HOURS of the night, takes them off a
+# heap most behind first and fills the night, then writes a plan ready for ssp.py generate.
+
+import json
+import heapq
+import sqlite3
+import argparse
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import ssp_fits
+import ssp_plan
+import ssp_astro
+import ssp_aliases
+import ssp_manifest
+
+projects_db = Path("projects.sqlite")
+
+#Suffixes the rig scripts add to TARGETNAME for the filter
+TARGET_SUFFIXES = ("l", "r", "g", "b", "s", "h", "o", "uvir", "lpro", "lenh", "d1", "d2")
+#Shortest stretch of a night worth slewing to a target for
+MIN_HOURS = 0.5
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    target TEXT NOT NULL,
+    filter TEXT NOT NULL,
+    rig TEXT NOT NULL,
+    coords TEXT NOT NULL,
+    goal_seconds REAL NOT NULL,
+    done_seconds REAL NOT NULL DEFAULT 0,
+    priority REAL NOT NULL DEFAULT 1,
+    created TEXT NOT NULL,
+    due TEXT,
+    UNIQUE (rig, target, filter)
+);
+CREATE TABLE IF NOT EXISTS frames (
+    path TEXT PRIMARY KEY,
+    project INTEGER NOT NULL REFERENCES projects (id),
+    seconds REAL NOT NULL,
+    night TEXT
+);
+CREATE INDEX IF NOT EXISTS frames_project ON frames (project, night);
+"""
+
+class Project:
+    def __init__(self, row):
+        self.id, self.target, self.filter_name, self.rig, coords, self.goal_seconds, self.done_seconds, self.priority, created, due = row
+        self.coords = tuple(json.loads(coords))
+        self.created = date.fromisoformat(created)
+        self.due = None if due is None else date.fromisoformat(due)
+
+    def expected_seconds(self, today) -> float:
+        if self.due is None or self.due <= self.created:
+            return self.goal_seconds
+        share = (today - self.created).days / (self.due - self.created).days
+        return self.goal_seconds * min(1.0, max(0.0, share))
+
+    def behind(self, today) -> float:
+        return self.priority * (self.expected_seconds(today) - self.done_seconds) / self.goal_seconds
+
+    def remaining_hours(self) -> float:
+        return max(0.0, self.goal_seconds - self.done_seconds) / 3600
+
+def connect(path=projects_db):
+    db = sqlite3.connect(str(path))
+    db.executescript(SCHEMA)
+    return db
+
+def base_target(name) -> str:
+    #m31_h to m31, names without a filter suffix are left alone
+    if "_" in name:
+        stem, suffix = name.rsplit("_", 1)
+        if suffix.lower() in TARGET_SUFFIXES:
+            return stem
+    return name
+
+def add_project(db, target, filter_name, rig, hours, coords, priority=1.0, due=None, today=None) -> None:
+    module = ssp_plan.rig_module(rig)
+    if filter_name not in module.Filters.__members__:
+        raise ssp_plan.PlanError("rig " + rig + " has no filter " + filter_name)
+    #behind() divides by the goal, and a negative priority would put a project last forever
+    if hours <= 0:
+        raise ssp_plan.PlanError("a project needs more than 0 hours, not " + str(hours))
+    if priority < 0:
+        raise ssp_plan.PlanError("priority can't be negative, not " + str(priority))
+    #Project() parses due on every load, a bad one would break the whole database
+    if due is not None:
+        try:
+            due = date.fromisoformat(str(due)).isoformat()
+        except ValueError:
+            raise ssp_plan.PlanError("due must be a date as YYYY-MM-DD, not " + str(due))
+    today = today or date.today()
+    target = ssp_aliases.canonical(target.lower())
+    with db:
+        db.execute(
+            "INSERT INTO projects (target, filter, rig, coords, goal_seconds, priority, created, due) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (rig, target, filter) DO UPDATE SET goal_seconds = excluded.goal_seconds, priority = excluded.priority, due = excluded.due",
+            (target, filter_name, rig, json.dumps(list(coords)), hours * 3600, priority, today.isoformat(), due)
+        )
+
+def load_projects(db, rig=None) -> list:
+    columns = "id, target, filter, rig, coords, goal_seconds, done_seconds, priority, created, due"
+    if rig is None:
+        rows = db.execute("SELECT " + columns + " FROM projects ORDER BY rig, target, filter")
+    else:
+        rows = db.execute("SELECT " + columns + " FROM projects WHERE rig = ? ORDER BY target, filter", (rig,))
+    return [Project(row) for row in rows]
+
+def find_project(projects, rig, target, filter_name):
+    #The project a frame counts towards, RED, GREEN and BLUE frames also count for RGB
+    if target is None or filter_name is None:
+        return None
+    key = (rig, ssp_aliases.canonical(base_target(target).lower()))
+    project = projects.get(key + (filter_name,))
+    if project is None and filter_name in getattr(ssp_plan.rig_module(rig), "RGB_FILTERS", ()):
+        project = projects.get(key + ("RGB",))
+    return project
+
+def night_of(when):
+    #Frames after midnight belong to the night that started the evening before
+    return None if when is None else (when - timedelta(hours=12)).date().isoformat()
+
+def record_frames(db, frames) -> int:
+    #frames are (path, project, seconds, night), returns how many were new
+    added = 0
+    with db:
+        for path, project, seconds, night in frames:
+            cursor = db.execute("INSERT OR IGNORE INTO frames (path, project, seconds, night) VALUES (?, ?, ?, ?)", (path, project.id, seconds, night))
+            if cursor.rowcount:
+                db.execute("UPDATE projects SET done_seconds = done_seconds + ? WHERE id = ?", (seconds, project.id))
+                added += 1
+    return added
+
+def project_index(db) -> dict:
+    return {(project.rig, project.target.lower(), project.filter_name): project for project in load_projects(db)}
+
+def ingest_manifest(db, manifest, fits_paths) -> int:
+    #Frames matched to the blocks of a sequence's manifest, see ssp_manifest.py
+    sequence, blocks = ssp_manifest.read_manifest(manifest)
+    rig = sequence["rig"]
+    projects = project_index(db)
+    frames = []
+    for path in ssp_fits.fits_files(fits_paths):
+        try:
+            header = ssp_fits.read_header(path)
+        except (OSError, ValueError):
+            continue
+        if not ssp_fits.is_light(header, path):
+            continue
+        block = ssp_manifest.match_block(blocks, header, path)
+        if block is None:
+            continue
+        project = find_project(projects, rig, block["target"], block["filter"])
+        if project is not None:
+            seconds = ssp_fits.exposure_of(header) or block["exposure"] or 0
+            frames.append((str(Path(path).resolve()), project, seconds, night_of(ssp_fits.observed_at(header))))
+    return record_frames(db, frames)
+
+def scan_frames(db, fits_paths, rig) -> int:
+    #Frames from their FITS headers alone: OBJECT (or a folder named after a project) and FILTER
+    module = ssp_plan.rig_module(rig)
+    projects = project_index(db)
+    targets = {project.target.lower() for project in projects.values() if project.rig == rig}
+    frames = []
+    for path in ssp_fits.fits_files(fits_paths):
+        try:
+            header = ssp_fits.read_header(path)
+        except (OSError, ValueError):
+            continue
+        if not ssp_fits.is_light(header, path):
+            continue
+        target = header.get("OBJECT")
+        if not isinstance(target, str):
+            target = next((part for part in reversed(Path(path).parts[:-1]) if ssp_aliases.canonical(base_target(part).lower()) in targets), None)
+        filter_name = header.get("FILTER")
+        if isinstance(filter_name, str):
+            filter_name = filter_name.strip().upper()
+            if filter_name not in module.Filters.__members__:
+                filter_name = None
+        elif target is not None:
+            filter_name = ssp_manifest.filter_name(module, None, target)
+        project = find_project(projects, rig, target, filter_name)
+        if project is not None:
+            frames.append((str(Path(path).resolve()), project, ssp_fits.exposure_of(header) or 0, night_of(ssp_fits.observed_at(header))))
+    return record_frames(db, frames)
+
+def visible_hours(projects, site, start, hours, min_alt) -> list:
+    #Hours each project spends clear of the horizon and above min_alt, from start for hours
+    import ssp_moon
+    import ssp_horizon
+    times = ssp_moon.night_grid(start, hours)
+    step = hours / (len(times) - 1)
+    positions = [ssp_astro.coords_to_degrees(project.coords) for project in projects]
+    clear_hours = [0.0] * len(projects)
+    for when in times[:-1]:
+        alts, azs = ssp_horizon.catalog_alt_az(positions, site.latitude, ssp_astro.local_sidereal_time(when, site.longitude))
+        for n, clear in enumerate(site.horizon.mask(alts, azs, min_alt)):
+            if clear:
+                clear_hours[n] += step
+    return clear_hours
+
+def tonight(db, rig, site, start, hours, min_alt=30.0, today=None) -> list:
+    #(project, hours) for the night, most behind first while there's time left
+    today = today or start.date()
+    projects = [project for project in load_projects(db, rig) if project.remaining_hours() > 0]
+    if not projects:
+        return []
+    queue = []
+    for project, clear in zip(projects, visible_hours(projects, site, start, hours, min_alt)):
+        if clear >= MIN_HOURS:
+            heapq.heappush(queue, (-project.behind(today), project.id, project, clear))
+    chosen = []
+    left = hours
+    while queue and left >= MIN_HOURS:
+        _, _, project, clear = heapq.heappop(queue)
+        share = min(project.remaining_hours(), clear, left)
+        if share >= MIN_HOURS:
+            chosen.append((project, round(share, 2)))
+            left -= share
+    #Targets setting soonest go first
+    lst = ssp_astro.local_sidereal_time(start, site.longitude)
+    chosen.sort(key=lambda item: -ssp_astro.hour_angle(ssp_astro.coords_to_degrees(item[0].coords)[0], lst))
+    return chosen
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Track integration across nights and plan tonight from what is most behind")
+    parser.add_argument("--db", type=Path, default=projects_db)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="add a project or change its goal")
+    add.add_argument("name")
+    add.add_argument("--rig", choices=sorted(ssp_plan.RIGS), required=True)
+    add.add_argument("--filter", required=True)
+    add.add_argument("--hours", type=float, required=True, help="total integration wanted")
+    add.add_argument("--priority", type=float, default=1.0)
+    add.add_argument("--due", help="date to have it by as YYYY-MM-DD")
+    add.add_argument("--coords", nargs=6, metavar=("RA_H", "RA_M", "RA_S", "DEC_D", "DEC_M", "DEC_S"))
+
+    ingest = commands.add_parser("ingest", help="count frames matched to a sequence manifest")
+    ingest.add_argument("manifest")
+    ingest.add_argument("fits", nargs="+")
+
+    scan = commands.add_parser("scan", help="count frames from their FITS headers")
+    scan.add_argument("fits", nargs="+")
+    scan.add_argument("--rig", choices=sorted(ssp_plan.RIGS), required=True)
+
+    commands.add_parser("status", help="list projects and their progress")
+
+    plan = commands.add_parser("tonight", help="write tonight's plan from the projects most behind")
+    plan.add_argument("--rig", choices=sorted(ssp_plan.RIGS), required=True)
+    plan.add_argument("--site", required=True)
+    plan.add_argument("--date", required=True, help="night as YYYY-MM-DD")
+    plan.add_argument("--start", required=True, help="local start time as HH:MM")
+    plan.add_argument("--hours", type=float, required=True)
+    plan.add_argument("--min-alt", type=float, default=30.0)
+    plan.add_argument("--temperature", type=int, default=100)
+    plan.add_argument("-o", "--output", required=True, help="plan file to write")
+
+    args = parser.parse_args(argv)
+    db = connect(args.db)
+
+    if args.command == "add":
+        #Resolve the name it will be tracked under, M42 and NGC1976 are one project
+        name = ssp_aliases.canonical(args.name.lower())
+        try:
+            coords = tuple(args.coords) if args.coords else ssp_plan.resolve_coords(ssp_plan.PlanTarget(name, args.filter, 0))
+            add_project(db, name, args.filter, args.rig, args.hours, coords, args.priority, args.due)
+        except ssp_plan.PlanError as e:
+            print("Plan error: " + str(e))
+            raise SystemExit(1)
+    elif args.command == "ingest":
+        print(str(ingest_manifest(db, args.manifest, args.fits)) + " new frames counted")
+    elif args.command == "scan":
+        print(str(scan_frames(db, args.fits, args.rig)) + " new frames counted")
+    elif args.command == "status":
+        today = date.today()
+        for project in load_projects(db):
+            print(
+                project.rig.ljust(11) + project.target.ljust(16) + project.filter_name.ljust(10)
+                + ("%.1f/%.1f h" % (project.done_seconds / 3600, project.goal_seconds / 3600)).rjust(14)
+                + "  behind " + "%.2f" % project.behind(today) + ("" if project.due is None else ", due " + project.due.isoformat())
+            )
+    else:
+        import ssp_horizon
+        import ssp_meridian
+        site = ssp_horizon.load_site(args.site)
+        start = ssp_meridian.night_start(args.date, args.start, site)
+        chosen = tonight(db, args.rig, site, start, args.hours, args.min_alt, datetime.strptime(args.date, "%Y-%m-%d").date())
+        targets = [ssp_plan.PlanTarget(project.target, project.filter_name, share, project.coords) for project, share in chosen]
+        ssp_plan.save_plan(ssp_plan.Plan(args.rig, targets, args.temperature, args.start, None, args.site, args.date), args.output)
+        for project, share in chosen:
+            print(project.target.ljust(16) + project.filter_name.ljust(10) + str(share) + " h")
+        print("Plan written to " + args.output)
+
+if __name__ == "__main__":
+    main()
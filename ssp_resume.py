@@ -0,0 +1,254 @@
+# Resume a sequence that stopped partway through the night
+#   ssp_resume.py night.scs D:/SharpCap/Captures --rig towa --start 1:30 --until 5:45
+#   ssp_resume.py plan.json D:/SharpCap/Captures -o rest.scs
+#
+# The lights already on disk are counted per TARGETNAME, from the folder or file name
+# SharpCap saved them under and, failing that, the OBJECT in the FITS header. Frames in
+# dark, flat and bias folders don't count. The captured frames come off the sequence's
+# CAPTURE commands in order, then:
+#   target blocks with nothing left to capture are dropped whole, acquisition included
+#   finished captures inside a block are dropped with any meridian flip that followed them,
+#     the block's own GOTO and solve already find the mount on the far side
+#   a COOL DOWN that waited in a dropped block moves to the next block that is kept
+#   the WAIT UNTIL becomes --start, or goes so the rest starts straight away
+# With --until the remaining captures are cut to what fits before then, using the manifest's
+# timing estimate (see ssp_manifest.py).
+#
+# A plan file is generated first and resumed the same way. Meridian flips are kept where the
+# original sequence put them.
+
+import math
+import argparse
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import ssp_scs
+import ssp_fits
+import ssp_plan
+import ssp_manifest
+
+class Section:
+    #One target block of a sequence, with the frames each of its captures still needs
+    def __init__(self, lines):
+        self.lines = lines
+        self.commands = ssp_scs.parse_sequence(lines)
+        self.captures = []
+        for command, state in ssp_scs.walk(self.commands):
+            if command.keyword == "CAPTURE" and state.frame_type.lower() == "light":
+                self.captures.append((command, state.target, ssp_scs.parse_capture(command.args) or 0))
+        self.remaining = [frames for _, _, frames in self.captures]
+
+def split_sequence(lines) -> tuple:
+    #(preamble lines, sections, shutdown lines), a target block starts at the DELAY 1 before
+    #its STILL MODE and the shutdown at the MOUNT PARK after the last block
+    commands = ssp_scs.parse_sequence(lines)
+    starts = []
+    for n, command in enumerate(commands):
+        if command.keyword == "STILL MODE":
+            previous = commands[n - 1] if n > 0 else None
+            if previous is not None and previous.keyword == "DELAY" and previous.line_no == command.line_no - 1:
+                starts.append(previous.line_no - 1)
+            else:
+                starts.append(command.line_no - 1)
+    if not starts:
+        raise ssp_plan.PlanError("the sequence has no target blocks")
+    end = len(lines)
+    for command in commands:
+        if command.keyword == "MOUNT PARK" and command.line_no - 1 > starts[-1]:
+            end = command.line_no - 1
+            break
+    bounds = starts + [end]
+    sections = [Section(lines[bounds[n]:bounds[n + 1]]) for n in range(len(starts))]
+    return lines[:starts[0]], sections, lines[end:]
+
+def frame_target(path, names):
+    #Target a light frame belongs to from its folders or file name, None when they don't say
+    parts = [part.lower() for part in path.parts[:-1]]
+    for part in reversed(parts):
+        if part in names:
+            return names[part]
+    stem = path.stem.lower()
+    found = None
+    for name, target in names.items():
+        if (stem == name or stem.startswith(name + "_")) and (found is None or len(name) > len(found)):
+            found = name
+    return None if found is None else names[found]
+
+def captured_frames(fits_paths, targets) -> dict:
+    names = {target.lower(): target for target in targets}
+    counts = dict.fromkeys(targets, 0)
+    for path in ssp_fits.fits_files(fits_paths):
+        if ssp_fits.in_calibration_folder(path):
+            continue
+        target = frame_target(path, names)
+        if target is None:
+            try:
+                header = ssp_fits.read_header(path)
+            except (OSError, ValueError):
+                continue
+            if not ssp_fits.is_light(header, path):
+                continue
+            target = names.get(str(header.get("OBJECT", "")).strip().lower())
+        if target is not None:
+            counts[target] += 1
+    return counts
+
+def localtime(hour, minute) -> str:
+    #The rigs' WAIT UNTIL format
+    if hour < 12:
+        return str(hour) + ":" + str(minute).zfill(2) + " AM"
+    return str(hour - 12) + ":" + str(minute).zfill(2) + " PM"
+
+def preserve_bounds(commands, index) -> tuple:
+    #Line indices of the PRESERVE block around commands[index], end exclusive
+    depth = commands[index].depth
+    start = index
+    while start > 0 and not (commands[start].keyword == "PRESERVE CAMERA SETTINGS" and commands[start].depth == depth - 1):
+        start -= 1
+    end = index
+    while end < len(commands) - 1 and not (commands[end].keyword == "END PRESERVE" and commands[end].depth == depth - 1):
+        end += 1
+    return commands[start].line_no - 1, commands[end].line_no
+
+def rewrite_section(section) -> list:
+    #The block's lines with finished captures and their flips taken out and counts updated
+    commands = section.commands
+    positions = {command.line_no: n for n, command in enumerate(commands)}
+    drop = set()
+    replace = {}
+    capture_lines = [command.line_no for command, _, _ in section.captures]
+    for (command, _, _), remaining in zip(section.captures, section.remaining):
+        if remaining > 0:
+            replace[command.line_no - 1] = section.lines[command.line_no - 1].replace(command.args, ssp_scs.CAPTURE_PATTERN.sub(str(remaining) + " FRAMES", command.args, 1), 1)
+            continue
+        if command.depth == 0:
+            drop.add(command.line_no - 1)
+            continue
+        start, end = preserve_bounds(commands, positions[command.line_no])
+        drop.update(range(start, end))
+        #A flip after the capture runs up to the PRESERVE of the next capture
+        later = [line_no for line_no in capture_lines if line_no > command.line_no]
+        if later:
+            next_start, _ = preserve_bounds(commands, positions[later[0]])
+            between = [other for other in commands if end < other.line_no <= next_start]
+            if any(other.keyword == "MOUNT GOTO" for other in between):
+                drop.update(range(end, next_start))
+    return [replace.get(n, line) for n, line in enumerate(section.lines) if n not in drop]
+
+def cooler_lines(section) -> list:
+    return [section.lines[command.line_no - 1] for command in section.commands if command.keyword == "COOL DOWN TO" and command.depth == 0]
+
+def insert_cooler(lines, cooler) -> list:
+    #Before the block's first top level SET EXPOSURE, so the wait still overlaps the slew
+    for command in ssp_scs.parse_sequence(lines):
+        if command.keyword == "SET EXPOSURE TO" and command.depth == 0:
+            n = command.line_no - 1
+            return lines[:n] + cooler + lines[n:]
+    return cooler + lines
+
+def fit_sections(preamble, sections, rig, seconds) -> None:
+    #Cut the remaining frames to what the estimate says fits in seconds from the start
+    clock = ssp_manifest.build_manifest(ssp_scs.parse_sequence(preamble), rig)[0]["seconds"]
+    for section in sections:
+        if not any(section.remaining):
+            continue
+        lines = rewrite_section(section)
+        header, *blocks = ssp_manifest.build_manifest(ssp_scs.parse_sequence(lines), rig)
+        kept = [n for n, remaining in enumerate(section.remaining) if remaining > 0]
+        for n, block in zip(kept, blocks):
+            left = seconds - clock - block["start"]
+            if left < block["end"] - block["start"]:
+                section.remaining[n] = max(0, math.floor(left / block["frame_seconds"])) if block["frame_seconds"] > 0 else 0
+                for later in range(n + 1, len(section.remaining)):
+                    section.remaining[later] = 0
+                break
+        clock += header["seconds"]
+
+def resume(lines, rig, fits_paths, start=None, until=None) -> tuple:
+    #(sequence text, report), start and until are (hour, minute) in local time
+    preamble, sections, shutdown = split_sequence(list(lines))
+    targets = sorted(set(target for section in sections for _, target, _ in section.captures if target is not None))
+    captured = captured_frames(fits_paths, targets)
+
+    report = {"rig": rig, "targets": {}, "dropped_blocks": 0, "trimmed_frames": 0}
+    left = dict(captured)
+    for section in sections:
+        for n, (_, target, frames) in enumerate(section.captures):
+            done = min(frames, left.get(target, 0))
+            if target is not None:
+                left[target] -= done
+                entry = report["targets"].setdefault(target, {"planned": 0, "captured": captured[target], "remaining": 0})
+                entry["planned"] += frames
+                entry["remaining"] += frames - done
+            section.remaining[n] = frames - done
+
+    preamble = [line for line in preamble if not line.strip().upper().startswith("WAIT UNTIL LOCALTIME")]
+    if start is not None:
+        preamble = preamble[:1] + ["    WAIT UNTIL LOCALTIME \"" + localtime(*start) + "\"\n"] + preamble[1:]
+    if until is not None:
+        begin = datetime.now().replace(second=0, microsecond=0)
+        if start is not None:
+            begin = begin.replace(hour=start[0], minute=start[1])
+        end = begin.replace(hour=until[0], minute=until[1])
+        if end <= begin:
+            end += timedelta(days=1)
+        before = sum(sum(section.remaining) for section in sections)
+        fit_sections(preamble, sections, rig, (end - begin).total_seconds())
+        report["trimmed_frames"] = before - sum(sum(section.remaining) for section in sections)
+
+    out = list(preamble)
+    cooler = []
+    for section in sections:
+        if not any(section.remaining):
+            report["dropped_blocks"] += 1
+            cooler += cooler_lines(section)
+            continue
+        lines = rewrite_section(section)
+        if cooler and not cooler_lines(section):
+            lines = insert_cooler(lines, cooler)
+        cooler = []
+        out += lines
+    out += shutdown
+    return "".join(out), report
+
+def sequence_lines(source, rig=None) -> tuple:
+    #(lines, rig) of a .scs file, or of the sequence a plan file generates
+    source = Path(source)
+    if source.suffix.lower() == ".json":
+        plan = ssp_plan.load_plan(source)
+        buffer = ssp_plan.SequenceBuffer()
+        ssp_plan.generate(plan, buffer)
+        return buffer.text.splitlines(keepends=True), plan.rig
+    if rig is None:
+        raise ssp_plan.PlanError("resuming a .scs file needs --rig")
+    with source.open("r", encoding="utf-8", errors="replace") as f:
+        return f.readlines(), rig
+
+def clock_time(text):
+    hour, minute = text.split(":")
+    return int(hour), int(minute)
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Write the rest of a sequence that stopped partway")
+    parser.add_argument("source", help="the original .scs or plan .json")
+    parser.add_argument("fits", nargs="+", help="FITS files or directories captured so far")
+    parser.add_argument("--rig", choices=sorted(ssp_plan.RIGS), help="rig of a .scs source")
+    parser.add_argument("-o", "--output", help="sequence to write (default: source name with _resume.scs)")
+    parser.add_argument("--start", type=clock_time, help="local time to start the rest as HH:MM (default: straight away)")
+    parser.add_argument("--until", type=clock_time, help="local time the night ends as HH:MM, frames that don't fit are cut")
+    args = parser.parse_args(argv)
+
+    lines, rig = sequence_lines(args.source, args.rig)
+    text, report = resume(lines, rig, args.fits, args.start, args.until)
+    output = Path(args.output) if args.output else Path(args.source).with_name(Path(args.source).stem + "_resume.scs")
+    with output.open("w", encoding="utf-8") as f:
+        f.write(text)
+    ssp_manifest.write_manifest(output, rig)
+
+    for target, entry in report["targets"].items():
+        print(target.ljust(20) + (str(entry["captured"]) + "/" + str(entry["planned"])).rjust(10) + " captured, " + str(entry["remaining"]) + " left")
+    print(str(report["dropped_blocks"]) + " target blocks dropped" + (", " + str(report["trimmed_frames"]) + " frames cut to fit" if args.until else ""))
+    print("Sequence written to " + str(output))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# Reader for sharpcap sequence (.scs) files
+#
+# read_sequence() turns a file into a flat list of Command objects and walk() replays them,
+# keeping track of the camera, cooler, wheel and mount settings in force at each step.
+
+import re
+from pathlib import Path
+
+#Multi word commands, longest first so "END PRESERVE" wins over "END"
+KEYWORDS = [
+    "PRESERVE CAMERA SETTINGS",
+    "GUIDING DITHER EVERY STOP",
+    "GUIDING DITHER EVERY",
+    "GUIDING CONNECT ABORT",
+    "WAIT UNTIL LOCALTIME",
+    "SET COLOUR SPACE TO",
+    "SET OUTPUT FORMAT TO",
+    "MOUNT SOLVEANDSYNC",
+    "GUIDING DISCONNECT",
+    "SET EXPOSURE TO",
+    "SET COOLER OFF",
+    "MOUNT CONNECT",
+    "MOUNT UNPARK",
+    "GUIDING START",
+    "GUIDING STOP",
+    "SET GAIN TO",
+    "WHEEL MOVE TO",
+    "END PRESERVE",
+    "END SEQUENCE",
+    "LOAD PROFILE",
+    "COOL DOWN TO",
+    "MOUNT GOTO",
+    "MOUNT PARK",
+    "STILL MODE",
+    "TARGETNAME",
+    "FRAMETYPE",
+    "AUTOFOCUS",
+    "SEQUENCE",
+    "CAPTURE",
+    "DELAY",
+]
+
+COOL_PATTERN = re.compile(r"(-?\d+(?:\.\d+)?)(?:\s+RATE\s+(\d+(?:\.\d+)?))?(?:\s+TOLERANCE\s+(\d+(?:\.\d+)?))?", re.IGNORECASE)
+CAPTURE_PATTERN = re.compile(r"(-?\d+)\s+FRAMES?", re.IGNORECASE)
+
+class Command:
+    def __init__(self, line_no, keyword, args, depth):
+        self.line_no = line_no
+        self.keyword = keyword
+        self.args = args
+        self.depth = depth
+
+    def text(self) -> str:
+        if self.args:
+            return self.keyword + " " + self.args
+        return self.keyword
+
+def unquote(text) -> str:
+    text = text.strip()
+    if len(text) >= 2 and text[0] == "\"" and text[-1] == "\"":
+        return text[1:-1]
+    return text
+
+def parse_line(text):
+    #Split a line into its keyword and argument text, unknown commands keep their first word
+    text = text.strip()
+    upper = text.upper()
+    for keyword in KEYWORDS:
+        if upper == keyword or upper.startswith(keyword + " "):
+            return keyword, text[len(keyword):].strip()
+    parts = text.split(None, 1)
+    return parts[0].upper(), parts[1] if len(parts) > 1 else ""
+
+def parse_sequence(lines) -> list:
+    commands = []
+    depth = 0
+    for line_no, line in enumerate(lines, 1):
+        if line.strip() == "":
+            continue
+        keyword, args = parse_line(line)
+        if keyword == "END PRESERVE":
+            depth -= 1
+        commands.append(Command(line_no, keyword, args, depth))
+        if keyword == "PRESERVE CAMERA SETTINGS":
+            depth += 1
+    return commands
+
+def read_sequence(path) -> list:
+    with Path(path).open("r", encoding="utf-8", errors="replace") as f:
+        return parse_sequence(f)
+
+def sequence_files(paths) -> list:
+    #Expand any directories into the .scs files they hold
+    found = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            found += sorted(path.rglob("*.scs"))
+        else:
+            found.append(path)
+    return found
+
+def number(args):
+    try:
+        return float(args)
+    except ValueError:
+        return None
+
+def format_number(value) -> str:
+    if value == int(value):
+        return str(int(value))
+    return str(value)
+
+def parse_cool_down(args):
+    match = COOL_PATTERN.match(args.strip())
+    if match is None:
+        return None, None
+    rate = float(match.group(2)) if match.group(2) else None
+    return float(match.group(1)), rate
+
+def parse_capture(args):
+    match = CAPTURE_PATTERN.match(args.strip())
+    if match is None:
+        return None
+    return int(match.group(1))
+
+class SequenceState:
+    #Camera settings are saved and restored by PRESERVE blocks, everything else is global
+    CAMERA = ["exposure", "gain", "frame_type", "dither"]
+
+    def __init__(self):
+        self.exposure = None
+        self.gain = None
+        self.frame_type = "Light"
+        self.dither = None
+        self.profile = None
+        self.colour_space = None
+        self.temperature = None
+        self.cool_rate = None
+        self.wheel_slot = None
+        self.target = None
+        self.coords = None
+        self.preserved = []
+
+    def apply(self, command) -> None:
+        keyword = command.keyword
+        if keyword == "PRESERVE CAMERA SETTINGS":
+            self.preserved.append({name: getattr(self, name) for name in self.CAMERA})
+        elif keyword == "END PRESERVE":
+            if self.preserved:
+                for name, value in self.preserved.pop().items():
+                    setattr(self, name, value)
+        elif keyword == "SET EXPOSURE TO":
+            self.exposure = number(command.args)
+        elif keyword == "SET GAIN TO":
+            self.gain = number(command.args)
+        elif keyword == "FRAMETYPE":
+            self.frame_type = command.args
+        elif keyword == "GUIDING DITHER EVERY":
+            self.dither = parse_capture(command.args)
+        elif keyword == "GUIDING DITHER EVERY STOP":
+            self.dither = None
+        elif keyword == "LOAD PROFILE":
+            self.profile = unquote(command.args)
+        elif keyword == "SET COLOUR SPACE TO":
+            self.colour_space = command.args
+        elif keyword == "COOL DOWN TO":
+            self.temperature, self.cool_rate = parse_cool_down(command.args)
+        elif keyword == "SET COOLER OFF":
+            self.temperature = None
+        elif keyword == "WHEEL MOVE TO":
+            slot = number(command.args)
+            self.wheel_slot = None if slot is None else int(slot)
+        elif keyword == "TARGETNAME":
+            self.target = unquote(command.args)
+        elif keyword == "MOUNT GOTO":
+            self.coords = unquote(command.args)
+
+def walk(commands):
+    #Yield each command with the state in force when it runs
+    state = SequenceState()
+    for command in commands:
+        state.apply(command)
+        yield command, state
@@ -0,0 +1,340 @@
+# Local plan server keeping the catalog and rig modules loaded between requests
+#   ssp_server.py --port 8765 --lat 52.0 --lon -1.5
+#   ssp_server.py --port 8765 --site backyard          site and horizon from sites/ (ssp_horizon.py)
+#
+# A small JSON over HTTP API bound to localhost only:
+#   GET  /lookup?name=m101&name=ngc7000            with each name's aliases, canonical first
+#   GET  /search?text=ngc70&limit=20
+#   GET  /near?ra=210.8&dec=54.3&radius=1          cone search, degrees
+#   GET  /visibility?name=m101&time=2026-10-19T21:00:00Z&min_alt=30&lat=52&lon=-1.5
+#   GET  /visibility?name=m101&site=backyard       objects behind the site's horizon aren't visible
+#   GET  /visible?time=2026-10-19T21:00:00Z&min_alt=30&limit=100    whole catalog, highest first
+#   GET  /budget?rig=carbonstar&filter=RED&filter=GREEN&filter=BLUE&hours=3&autofocus=1
+#   GET  /budget?rig=towa&filter=LUMINANCE&hours=2&dithers_per_hour=4&dither_seconds=12
+#   POST /generate                                 body is a plan (see ssp_plan.py), answers
+#                                                  with the sequence and its manifest
+# Every response is a JSON object, errors are {"error": "..."} with a 4xx status.
+#
+# The catalog and its sky grid are loaded once and rebuilt in a worker thread when
+# master.csv changes, requests keep using the previous copy until the new one is ready.
+
+import sys
+import json
+import asyncio
+import argparse
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit, parse_qs
+
+import ssp_plan
+import ssp_astro
+import ssp_scs
+import ssp_budget
+import ssp_manifest
+import ssp_catalog
+import ssp_aliases
+import ssp_horizon
+
+HOST = "127.0.0.1"
+PORT = 8765
+RELOAD_INTERVAL = 2.0
+MAX_BODY = 1 << 20
+#Routes with enough work to hold up every other client, run off the event loop
+OFFLOADED = ("/generate", "/visible")
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class CatalogState:
+    #One loaded version of the catalog, replaced whole on reload
+    def __init__(self, mtime, index):
+        self.mtime = mtime
+        self.index = index
+        self.names = sorted(index)
+        self.grid = ssp_catalog.sky_grid(index)
+        #Every object with usable coords as parallel lists, for masking the whole catalog
+        self.positions = [(name, ra, dec) for cell in self.grid.cells.values() for name, ra, dec in cell]
+
+def load_catalog(path) -> CatalogState:
+    mtime = path.stat().st_mtime_ns
+    return CatalogState(mtime, ssp_catalog.read_catalog(path))
+
+class PlanServer:
+    def __init__(self, catalog=ssp_catalog.master_catalog, latitude=0.0, longitude=0.0, site=None):
+        self.catalog_path = catalog
+        #Without a site file the horizon is flat at the given position
+        self.site = site if site is not None else ssp_horizon.Site(None, latitude, longitude)
+        self.sites = {} if site is None else {site.name: site}
+        self.catalog = None
+        #Shared by every generate request, so previews of an edited plan reuse the unchanged blocks
+        self.blocks = ssp_plan.BlockCache()
+        #Generates run one at a time on their own thread, so the shared block cache only ever
+        #has one writer
+        self.generator = ThreadPoolExecutor(max_workers=1)
+        self.routes = {
+            ("GET", "/lookup"): self.lookup,
+            ("GET", "/search"): self.search,
+            ("GET", "/near"): self.near,
+            ("GET", "/visibility"): self.visibility,
+            ("GET", "/visible"): self.visible,
+            ("GET", "/budget"): self.budget,
+            ("POST", "/generate"): self.generate,
+        }
+
+    async def start(self, host=HOST, port=PORT):
+        loop = asyncio.get_running_loop()
+        self.catalog = await loop.run_in_executor(None, load_catalog, self.catalog_path)
+        #Rig modules are imported up front so the first generate isn't slower than the rest
+        for rig in ssp_plan.RIGS:
+            ssp_plan.rig_module(rig)
+        self.watcher = asyncio.ensure_future(self.watch_catalog())
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def watch_catalog(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(RELOAD_INTERVAL)
+            try:
+                changed = self.catalog_path.stat().st_mtime_ns != self.catalog.mtime
+                if changed:
+                    self.catalog = await loop.run_in_executor(None, load_catalog, self.catalog_path)
+                    print("Reloaded " + str(self.catalog_path) + " (" + str(len(self.catalog.index)) + " objects)")
+            except OSError as e:
+                #Mid save or briefly missing, keep serving the old copy and try again
+                print("Catalog reload failed: " + str(e))
+
+    async def handle(self, reader, writer) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", "0") or "0")
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, {"error": "request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload = await self.dispatch(request_line.decode("latin-1"), body)
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}.get(status, "Error")
+        head = (
+            "HTTP/1.1 " + str(status) + " " + reason + "\r\n"
+            "Content-Type: application/json\r\n"
+            "Content-Length: " + str(len(body)) + "\r\n"
+            "Connection: " + ("keep-alive" if keep_alive else "close") + "\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def dispatch(self, request_line, body) -> tuple:
+        try:
+            method, target, _ = request_line.split(" ", 2)
+            url = urlsplit(target)
+            route = self.routes.get((method, url.path))
+            if route is None:
+                if any(path == url.path for _, path in self.routes):
+                    raise RequestError(405, "method " + method + " not allowed on " + url.path)
+                raise RequestError(404, "no endpoint " + url.path)
+            if url.path in OFFLOADED:
+                executor = self.generator if url.path == "/generate" else None
+                result = await asyncio.get_running_loop().run_in_executor(executor, route, parse_qs(url.query), body)
+                return 200, result
+            return 200, route(parse_qs(url.query), body)
+        except RequestError as e:
+            return e.status, {"error": str(e)}
+        except ssp_plan.PlanError as e:
+            return 400, {"error": str(e)}
+        except ValueError as e:
+            return 400, {"error": "bad request: " + str(e)}
+        except Exception as e:
+            #Anything else is a bug, but the client still gets an answer and the connection lives
+            return 500, {"error": "internal error: " + type(e).__name__ + ": " + str(e)}
+
+    def position(self, name) -> tuple:
+        coords = self.catalog.index.get(name)
+        if coords is None:
+            raise RequestError(404, name + " is not in the catalog")
+        return coords
+
+    def lookup(self, query, body) -> dict:
+        names = query.get("name", [])
+        if not names:
+            raise RequestError(400, "lookup needs at least one name")
+        groups = ssp_aliases.load_aliases(source=self.catalog_path)
+        return {
+            "objects": {name: self.catalog.index.get(name) for name in names},
+            "aliases": {name: list(ssp_aliases.aliases(name, groups)) for name in names},
+        }
+
+    def search(self, query, body) -> dict:
+        text = first(query, "text")
+        limit = int(first(query, "limit", "20"))
+        names = self.catalog.names
+        found = []
+        n = bisect_left(names, text)
+        while n < len(names) and len(found) < limit and names[n].startswith(text):
+            found.append({"name": names[n], "coords": self.catalog.index[names[n]]})
+            n += 1
+        return {"objects": found}
+
+    def near(self, query, body) -> dict:
+        ra = float(first(query, "ra"))
+        dec = float(first(query, "dec"))
+        radius = float(first(query, "radius", "1"))
+        limit = int(first(query, "limit", "50"))
+        found = self.catalog.grid.near(ra, dec, radius)[:limit]
+        return {"objects": [{"name": name, "separation": round(distance, 5), "coords": self.catalog.index[name]} for name, distance in found]}
+
+    def site_for(self, query) -> ssp_horizon.Site:
+        #The named site, or the server's site moved to any lat and lon given, keeping its horizon
+        name = first(query, "site", "")
+        if name:
+            site = self.sites.get(name)
+            if site is None:
+                try:
+                    site = ssp_horizon.load_site(name)
+                except FileNotFoundError:
+                    raise RequestError(404, "no site " + name + " in " + str(ssp_horizon.site_dir))
+                except (KeyError, json.JSONDecodeError) as e:
+                    raise RequestError(400, "site " + name + " is unreadable: " + str(e))
+                self.sites[name] = site
+            return site
+        if "lat" in query or "lon" in query:
+            site = self.site
+            return ssp_horizon.Site(site.name, float(first(query, "lat", str(site.latitude))), float(first(query, "lon", str(site.longitude))), site.horizon)
+        return self.site
+
+    def visibility(self, query, body) -> dict:
+        site = self.site_for(query)
+        min_alt = float(first(query, "min_alt", "30"))
+        when = request_time(query)
+        lst = ssp_astro.local_sidereal_time(when, site.longitude)
+
+        objects = {}
+        for name in query.get("name", []):
+            ra, dec = ssp_astro.coords_to_degrees(self.position(name))
+            alt, az = ssp_astro.alt_az(ra, dec, site.latitude, lst)
+            objects[name] = {
+                "altitude": round(alt, 3),
+                "azimuth": round(az, 3),
+                "hour_angle": round(ssp_astro.hour_angle(ra, lst), 4),
+                "transit_altitude": round(90 - abs(site.latitude - dec), 3),
+                "horizon_altitude": round(site.horizon.altitude(az), 3),
+                "visible": site.horizon.clear(alt, az, min_alt)
+            }
+        return {"time": when.isoformat(), "site": site.name, "latitude": site.latitude, "longitude": site.longitude, "objects": objects}
+
+    def visible(self, query, body) -> dict:
+        site = self.site_for(query)
+        min_alt = float(first(query, "min_alt", "30"))
+        limit = int(first(query, "limit", "100"))
+        when = request_time(query)
+        positions = self.catalog.positions
+        alts, azs = ssp_horizon.catalog_alt_az(((ra, dec) for _, ra, dec in positions), site.latitude, ssp_astro.local_sidereal_time(when, site.longitude))
+        clear = site.horizon.mask(alts, azs, min_alt)
+        found = sorted((n for n in range(len(positions)) if clear[n]), key=lambda n: -alts[n])
+        return {
+            "time": when.isoformat(),
+            "site": site.name,
+            "count": len(found),
+            "objects": [{"name": positions[n][0], "altitude": round(alts[n], 3), "azimuth": round(azs[n], 3)} for n in found[:limit]]
+        }
+
+    def budget(self, query, body) -> dict:
+        filters = query.get("filter", [])
+        rig = first(query, "rig")
+        dither_every = first(query, "dither_every", "")
+        dither_every = int(dither_every) if dither_every else None
+        dither_seconds = first(query, "dither_seconds", "")
+        dither_seconds = float(dither_seconds) if dither_seconds else None
+        dithers_per_hour = first(query, "dithers_per_hour", "")
+        if dithers_per_hour:
+            #Charge the calibrated dither the generator would
+            if dither_seconds is None:
+                dither_seconds = ssp_budget.settled_dither(ssp_plan.rig_module(rig))
+            dither_every = tuple((name, ssp_budget.dither_interval(rig, name, float(dithers_per_hour), dither_seconds)) for name in filters)
+        budget = ssp_budget.budget(
+            rig, tuple(filters), float(first(query, "hours")),
+            first(query, "autofocus", "0") not in ("0", "false", ""),
+            dither_every, dither_seconds, int(first(query, "interleave", "0"))
+        )
+        return budget.as_dict()
+
+    def generate(self, query, body) -> dict:
+        try:
+            plan = ssp_plan.Plan.from_dict(json.loads(body.decode("utf-8")))
+        except json.JSONDecodeError as e:
+            raise RequestError(400, "plan is not valid JSON: " + str(e))
+        #Resolve names here so generation never goes back to the catalog file
+        for target in plan.targets:
+            if target.coords is None:
+                target.coords = self.catalog.index.get(target.name)
+                if target.coords is None:
+                    raise ssp_plan.PlanError("target " + target.name + " is not in the catalog and has no coords")
+        outfile = ssp_plan.SequenceBuffer()
+        ssp_plan.generate(plan, outfile, cache=self.blocks)
+        manifest = ssp_manifest.build_manifest(ssp_scs.parse_sequence(outfile.text.splitlines()), plan.rig)
+        return {"sequence": outfile.text, "manifest": manifest}
+
+def request_time(query) -> datetime:
+    #time= as ISO 8601, UTC when it has no offset, now when missing
+    when = query.get("time")
+    if not when:
+        return datetime.now(timezone.utc)
+    when = datetime.fromisoformat(when[0].replace("Z", "+00:00"))
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when
+
+def first(query, name, default=None) -> str:
+    values = query.get(name)
+    if values:
+        return values[0]
+    if default is None:
+        raise RequestError(400, "missing parameter " + name)
+    return default
+
+async def serve(server, host, port) -> None:
+    listener = await server.start(host, port)
+    print("Serving on http://" + host + ":" + str(port) + " (" + str(len(server.catalog.index)) + " catalog objects)")
+    async with listener:
+        await listener.serve_forever()
+
+def add_arguments(parser) -> None:
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--lat", type=float, default=0.0, help="site latitude for visibility, north positive")
+    parser.add_argument("--lon", type=float, default=0.0, help="site longitude for visibility, east positive")
+    parser.add_argument("--site", help="site in " + str(ssp_horizon.site_dir) + " to use instead of --lat and --lon, with its horizon")
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description="Serve catalog lookups and sequence generation on localhost")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    try:
+        site = ssp_horizon.load_site(args.site) if args.site else None
+        asyncio.run(serve(PlanServer(latitude=args.lat, longitude=args.lon, site=site), HOST, args.port))
+    except KeyboardInterrupt:
+        sys.exit(0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+# Settle time model for the sharpcap sequence parsers
+#
+# Each rig can keep a calibration file in settle/<rig>.csv with one row per operation:
+#     operation,base,per_unit,minimum
+# The emitted delay is max(minimum, base + per_unit * units) rounded up to whole seconds,
+# where units are degrees slewed for a goto and slots travelled for a wheel move.
+# The dither row isn't written as a DELAY, SharpCap waits for it during the capture, it
+# sets the dither cadence when a plan asks for a number of dithers per hour (see ssp_budget.py).
+# Rigs without a calibration file fall back to the fixed delays in their SETTLE table.
+#
+# Running this file derives a calibration file from SharpCap logs:
+#     ssp_settle.py towa SharpCap_Log_1.log SharpCap_Log_2.log
+
+import sys
+import math
+import csv
+import re
+from enum import Enum
+from pathlib import Path
+
+import ssp_astro
+
+class Operation(Enum):
+    GOTO = "goto"
+    WHEEL = "wheel"
+    SOLVE = "solve"
+    GUIDE_STOP = "guide_stop"
+    GUIDE_START = "guide_start"
+    DITHER = "dither"
+
+settle_dir = Path("settle")
+
+#Log lines that mark an operation as settled, matched case insensitively
+SETTLED_PATTERNS = {
+    Operation.GOTO: re.compile(r"slew(ing)? (complete|finished|ended)|mount.*settled", re.IGNORECASE),
+    Operation.WHEEL: re.compile(r"wheel.*(arrived|complete|finished|stopped)|filter.*(arrived|in position)", re.IGNORECASE),
+    #The guider logs "settled" after starting and after each dither, tell them apart by what it names
+    Operation.GUIDE_START: re.compile(r"\bguid\w*\b(?!.*dither).*settl(ed|e done|ing complete)", re.IGNORECASE),
+    Operation.DITHER: re.compile(r"\bdither\w*\b.*settl(ed|e done|ing complete)", re.IGNORECASE),
+}
+COMMAND_PATTERNS = {
+    Operation.GOTO: re.compile(r"MOUNT GOTO \"([^\"]+)\""),
+    Operation.WHEEL: re.compile(r"WHEEL MOVE TO (\d+)"),
+    Operation.GUIDE_START: re.compile(r"GUIDING START"),
+    #A dither the guider performs, not the GUIDING DITHER EVERY command that schedules them
+    Operation.DITHER: re.compile(r"\bdither(ing|ed)?\b(?!\s+every)", re.IGNORECASE),
+}
+TIMESTAMP_PATTERN = re.compile(r"(\d{1,2}):(\d{2}):(\d{2}(?:\.\d+)?)")
+
+class SettleRule:
+    def __init__(self, base, per_unit, minimum):
+        self.base = base
+        self.per_unit = per_unit
+        self.minimum = minimum
+
+    def delay(self, units) -> int:
+        return math.ceil(max(self.minimum, self.base + self.per_unit * units))
+
+class SettleModel:
+    def __init__(self, rules):
+        self.rules = rules
+
+    def delay(self, operation, units=0.0) -> int:
+        return self.rules[operation].delay(units)
+
+    def write(self, path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["operation", "base", "per_unit", "minimum"])
+            for operation, rule in self.rules.items():
+                writer.writerow([operation.value, round(rule.base, 3), round(rule.per_unit, 4), round(rule.minimum, 3)])
+
+def load_settle_model(rig, defaults) -> SettleModel:
+    #Start from the rig's fixed delays and override with any calibrated rows
+    rules = {}
+    for operation in Operation:
+        rules[operation] = SettleRule(defaults.get(operation, 0), 0, 0)
+
+    path = settle_dir / (rig + ".csv")
+    try:
+        with path.open(mode="r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                try:
+                    operation = Operation(row["operation"].strip())
+                except ValueError:
+                    continue
+                rules[operation] = SettleRule(float(row["base"]), float(row["per_unit"]), float(row["minimum"]))
+    except FileNotFoundError:
+        pass
+
+    return SettleModel(rules)
+
+def slew_distance(from_coords, to_coords) -> float:
+    #Degrees between two coordinate tuples, a parked mount is assumed to point at the pole
+    to_ra, to_dec = ssp_astro.coords_to_degrees(to_coords)
+    if from_coords is None:
+        return 90 - abs(to_dec)
+    from_ra, from_dec = ssp_astro.coords_to_degrees(from_coords)
+    return ssp_astro.separation(from_ra, from_dec, to_ra, to_dec)
+
+def wheel_distance(from_slot, to_slot, slots) -> int:
+    #Slots travelled on a circular wheel, an unknown position is treated as the worst case
+    if from_slot is None:
+        return slots // 2
+    steps = abs(to_slot - from_slot) % slots
+    return min(steps, slots - steps)
+
+def parse_goto_coords(text) -> tuple:
+    ra, dec = text.split(",")
+    return tuple(ra.split()) + tuple(dec.split())
+
+def log_seconds(line):
+    match = TIMESTAMP_PATTERN.search(line)
+    if match is None:
+        return None
+    return int(match.group(1)) * 3600 + int(match.group(2)) * 60 + float(match.group(3))
+
+def read_log_samples(lines, slots) -> dict:
+    #Collect (units, seconds) samples from the time a command is logged until its settled message
+    samples = {operation: [] for operation in SETTLED_PATTERNS}
+    pending = {}
+    mount_coords = None
+    wheel_slot = None
+
+    for line in lines:
+        seconds = log_seconds(line)
+        if seconds is None:
+            continue
+
+        settled = False
+        for operation, pattern in SETTLED_PATTERNS.items():
+            if pattern.search(line):
+                settled = True
+                if operation in pending:
+                    started, units = pending.pop(operation)
+                    elapsed = seconds - started
+                    if elapsed < 0:
+                        elapsed += 86400
+                    samples[operation].append((units, elapsed))
+        #"Dither settled" ends a dither, it doesn't start another one
+        if settled:
+            continue
+
+        for operation, pattern in COMMAND_PATTERNS.items():
+            match = pattern.search(line)
+            if match is None:
+                continue
+            if operation == Operation.GOTO:
+                coords = parse_goto_coords(match.group(1))
+                units = slew_distance(mount_coords, coords)
+                mount_coords = coords
+            elif operation == Operation.WHEEL:
+                slot = int(match.group(1))
+                units = wheel_distance(wheel_slot, slot, slots)
+                wheel_slot = slot
+            else:
+                units = 0
+            pending[operation] = (seconds, units)
+
+    return samples
+
+def fit_rule(samples) -> SettleRule:
+    #Least squares line through the samples, raised so every observed settle time is covered
+    n = len(samples)
+    mean_units = sum(units for units, _ in samples) / n
+    mean_seconds = sum(seconds for _, seconds in samples) / n
+    spread = sum((units - mean_units) ** 2 for units, _ in samples)
+    per_unit = 0.0
+    if spread > 0:
+        per_unit = sum((units - mean_units) * (seconds - mean_seconds) for units, seconds in samples) / spread
+        per_unit = max(0.0, per_unit)
+    base = max(seconds - per_unit * units for units, seconds in samples)
+    return SettleRule(base, per_unit, 1)
+
+def derive_settle_model(rig, defaults, log_paths, slots=8) -> SettleModel:
+    model = load_settle_model(rig, defaults)
+    samples = {operation: [] for operation in SETTLED_PATTERNS}
+    for log_path in log_paths:
+        with Path(log_path).open("r", encoding="utf-8", errors="replace") as f:
+            for operation, found in read_log_samples(f, slots).items():
+                samples[operation] += found
+
+    for operation, found in samples.items():
+        if len(found) > 0:
+            model.rules[operation] = fit_rule(found)
+    return model
+
+def main() -> None:
+    if len(sys.argv) < 3:
+        print('Formatting error!')
+        print('Example: ssp_settle.py towa SharpCap_Log.log')
+        quit()
+
+    #Fixed delays of each rig, used for operations the logs don't cover
+    if sys.argv[1] == "towa":
+        import ssp_towa as rig_module
+    elif sys.argv[1] == "c6h":
+        import ssp_c6h as rig_module
+    elif sys.argv[1] == "carbonstar":
+        import ssp_carbonstar as rig_module
+    else:
+        print("Unknown rig, use towa, c6h or carbonstar")
+        quit()
+
+    #The rig module imports its own copy of Operation, so rebuild its keys here
+    defaults = {Operation(operation.value): seconds for operation, seconds in rig_module.SETTLE[rig_module.RIG_TELESCOPE].items()}
+    model = derive_settle_model(sys.argv[1], defaults, sys.argv[2:], rig_module.WHEEL_SLOTS)
+    path = settle_dir / (sys.argv[1] + ".csv")
+    model.write(path)
+    print("Settle calibration written to " + str(path) + "\n")
+
+if __name__ == "__main__":
+    main()